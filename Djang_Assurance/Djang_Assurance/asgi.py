@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Djang_Assurance.settings")
 
 application = get_asgi_application()
+
+# Préchauffage en arrière-plan des nouvelles versions des modèles (app/rollout.py)
+from app.rollout import start_prewarm_watcher  # noqa: E402
+
+start_prewarm_watcher()
@@ -96,11 +96,41 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.getenv("DATABASE_NAME", os.path.join(BASE_DIR, "db.sqlite3")),
+        # Base de test sur fichier, et non en mémoire : avec SQLite en mémoire, les
+        # threads de `ConcurrentBookingTests` (meetings/tests.py) partageraient une
+        # seule connexion et ne se concurrenceraient pas réellement. Chaque thread
+        # ouvre ici sa propre connexion sur le fichier, supprimé en fin de tests
+        # (ignoré par git).
+        "TEST": {"NAME": os.path.join(BASE_DIR, "test_db.sqlite3")},
     }
 
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    # Cache local à chaque processus : fragments rendus (clés calculées à partir de
+    # la base) et compteurs de limite de requêtes
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "djang-assurance",
+        # Fragments d'agenda et versions : une entrée par conseiller et par semaine
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+    # Cache en base, partagé par tous les processus serveur (WEB_CONCURRENCY) et les
+    # commandes : numéros de version de l'index des créneaux et mises en attente
+    # (voir meetings/slots.py et meetings/holds.py). Table créée par
+    # `manage.py createcachetable` (build.sh).
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -164,3 +194,60 @@ MESSAGE_TAGS = {
     messages.SUCCESS: "alert-success",  # Classe CSS pour les messages de succès
 }
 
+
+# API JSON de devis pour les partenaires
+QUOTE_API_RATE_LIMIT = (60, 60)  # 60 requêtes par fenêtre de 60 secondes et par client
+QUOTE_API_MAX_BATCH = 10000  # Nombre maximum de profils par requête
+QUOTE_API_CHUNK_SIZE = 500  # Taille des lots transmis aux modèles en streaming NDJSON
+
+# Disjoncteurs des modèles de régression (voir app/health.py)
+REG_MODEL_CIRCUIT_BREAKER = {
+    "failure_threshold": 3,  # Échecs consécutifs avant ouverture du circuit
+    "latency_threshold": 2.0,  # Durée (s) au-delà de laquelle un appel compte comme un échec
+    "cooldown": 60,  # Durée (s) pendant laquelle un modèle en échec est ignoré
+}
+
+# Fil de préchauffage des versions de modèle, lancé par asgi.py et wsgi.py dans chaque
+# processus serveur (voir app/rollout.py). Activé par MODEL_PREWARM_WATCHER=1
+# (render.yaml) : les autres outils qui importent ces modules ne le lancent pas
+MODEL_PREWARM_WATCHER = os.getenv("MODEL_PREWARM_WATCHER") == "1"
+# Intervalle (s) entre deux passages du fil de préchauffage
+MODEL_PREWARM_INTERVAL = 5
+
+# Nombre de fils du pool dédié aux prédictions des vues asynchrones (voir app/inference.py)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", os.cpu_count() or 2))
+
+# Durée des créneaux de rendez-vous, en minutes (15, 30 ou 60), utilisée par l'index
+# des créneaux libres (meetings/slots.py). Après modification : manage.py rebuild_slot_index
+MEETINGS_SLOT_MINUTES = 60
+
+# Durée (s) pendant laquelle un créneau choisi reste réservé au client avant
+# confirmation (meetings/holds.py)
+MEETINGS_SLOT_HOLD_SECONDS = 300
+
+# Durées de rendez-vous proposées aux clients, en minutes
+MEETINGS_APPOINTMENT_DURATIONS = [30, 60, 90, 120]
+
+# Nombre de jours de rendez-vous passés inclus dans les flux iCalendar (meetings/ics.py)
+MEETINGS_FEED_PAST_DAYS = 90
+
+# Agenda en direct (meetings/live.py) : délai (s) de relecture du journal des
+# modifications faites par les autres processus, durée maximale (s) d'une connexion,
+# et durée (s) de conservation des entrées du journal
+MEETINGS_LIVE_POLL_SECONDS = 5
+MEETINGS_LIVE_MAX_SECONDS = 600
+MEETINGS_LIVE_EVENT_RETENTION = 24 * 3600
+
+# Délai (heures) avant un rendez-vous pendant lequel son rappel par e-mail est
+# envoyé (manage.py send_reminders, voir meetings/reminders.py)
+MEETINGS_REMINDER_HOURS = 24
+
+# Durée (s) de conservation en cache de l'occupation d'une semaine (rapport
+# d'occupation, voir meetings/utilization.py) : la clé change avec les données
+MEETINGS_UTILIZATION_CACHE_SECONDS = 24 * 3600
+
+# Archivage des prédictions et rendez-vous anciens en fichiers JSONL compressés
+# (manage.py archive_records, voir app/archive.py) : répertoire des archives et
+# ancienneté (jours) au-delà de laquelle une ligne est archivée
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", BASE_DIR / "archives"))
+ARCHIVE_RETENTION_DAYS = 730
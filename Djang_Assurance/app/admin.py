@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Prediction, Reg_model
+from .models import ArchivedRecord, Prediction, Reg_model, ModelVersion
 
 admin.site.register(Prediction)
 admin.site.register(Reg_model)
+admin.site.register(ModelVersion)
+admin.site.register(ArchivedRecord)
@@ -0,0 +1,172 @@
+"""
+Archivage des prédictions et des rendez-vous anciens en fichiers JSONL compressés.
+
+Une exécution (`manage.py archive_records`) parcourt les lignes plus anciennes que la
+date limite par lots, dans l'ordre des clés. Pour chaque lot :
+
+1. les lignes sont ajoutées au fichier d'archive de l'exécution
+   (`settings.ARCHIVE_DIR/<type>-<horodatage>.jsonl.gz`, une ligne JSON par ligne
+   de la table), puis le fichier est vidé sur disque ;
+2. dans une transaction, une trace (`ArchivedRecord`) est créée par ligne, par une
+   insertion groupée, et les lignes sont supprimées par une requête `DELETE` groupée,
+   sans charger les objets ni déclencher de signaux.
+
+Une exécution interrompue entre les deux étapes laisse ses lignes en place : elles
+sont archivées de nouveau à l'exécution suivante, et leur trace désigne le fichier le
+plus récent. Les vues en cache qui dépendent des rendez-vous (agenda d'équipe,
+rapport d'occupation) ont des clés calculées à partir de la base : elles reflètent
+l'archivage sans invalidation. Les tables consultées au quotidien ne contiennent ainsi que l'historique
+récent ; les archives sont relues à la demande (`read_archived`).
+"""
+
+import gzip
+import json
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import DateTimeField
+from django.utils import timezone
+from meetings.models import Appointment, BookedSlotMask, ReminderLog
+from .models import ArchivedRecord, Prediction
+
+# Types archivés : modèle, champ de la date limite, champ de l'utilisateur concerné
+ARCHIVES = {
+    "prediction": {"model": Prediction, "date": "updated_at", "user": "user_id_id"},
+    "appointment": {"model": Appointment, "date": "date", "user": "user_id"},
+}
+
+
+def archive_cutoff(days=None):
+    """
+    Retourne la date limite d'archivage : aujourd'hui moins `days` jours (par défaut
+    `settings.ARCHIVE_RETENTION_DAYS`).
+    """
+    days = settings.ARCHIVE_RETENTION_DAYS if days is None else days
+    return timezone.localdate() - timedelta(days=days)
+
+
+def archive_queryset(kind, before):
+    """
+    Lignes d'un type à archiver : celles dont la date est antérieure à `before`.
+    """
+    spec = ARCHIVES[kind]
+    model = spec["model"]
+    if isinstance(model._meta.get_field(spec["date"]), DateTimeField):
+        before = timezone.make_aware(datetime.combine(before, time.min))
+    return model.objects.filter(**{f"{spec['date']}__lt": before})
+
+
+def _record_date(value):
+    return timezone.localdate(value) if isinstance(value, datetime) else value
+
+
+def _delete_rows(kind, pks):
+    """
+    Supprime un lot de lignes archivées, et les lignes qui en dépendent.
+
+    Les prédictions n'ont ni signal ni dépendance : `delete` les supprime en une
+    requête. Les rendez-vous sont supprimés par une requête SQL directe, sans les
+    signaux de `meetings.signals` : un archivage n'est pas une annulation (aucun
+    événement d'agenda), et l'index des créneaux réservés est nettoyé en une fois
+    par `archive_records`.
+    """
+    model = ARCHIVES[kind]["model"]
+    if kind == "prediction":
+        model.objects.filter(pk__in=pks).delete()
+        return
+    ReminderLog.objects.filter(appointment_id__in=pks).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)} "
+            f"WHERE id IN ({', '.join(['%s'] * len(pks))})",
+            pks,
+        )
+
+
+def archive_records(kind, before, batch_size=1000):
+    """
+    Archive les lignes d'un type antérieures à une date.
+
+    Paramètres :
+    ------------
+    kind : str
+        Type de lignes ("prediction" ou "appointment").
+    before : date
+        Date limite (exclue).
+    batch_size : int
+        Nombre de lignes lues, écrites et supprimées à la fois.
+
+    Retourne :
+    ---------
+    tuple
+        (nombre de lignes archivées, nom du fichier d'archive ou None).
+    """
+    spec = ARCHIVES[kind]
+    queryset = archive_queryset(kind, before).order_by("pk")
+    rows = list(queryset.values()[:batch_size])
+    if not rows:
+        return 0, None
+
+    settings.ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{kind}-{timezone.now():%Y%m%d-%H%M%S-%f}.jsonl.gz"
+    archived = 0
+    with gzip.open(settings.ARCHIVE_DIR / name, "wt", encoding="utf-8") as archive:
+        while rows:
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+            archive.flush()
+
+            pks = [row["id"] for row in rows]
+            with transaction.atomic():
+                ArchivedRecord.objects.bulk_create(
+                    [
+                        ArchivedRecord(
+                            kind=kind,
+                            object_id=row["id"],
+                            user_id=row[spec["user"]],
+                            date=_record_date(row[spec["date"]]),
+                            archive=name,
+                        )
+                        for row in rows
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["kind", "object_id"],
+                    update_fields=["archive", "archived_at"],
+                )
+                _delete_rows(kind, pks)
+            archived += len(rows)
+            rows = list(queryset.filter(pk__gt=pks[-1]).values()[:batch_size])
+
+    if kind == "appointment":
+        # Index des créneaux réservés des journées archivées (voir `meetings.slots`)
+        BookedSlotMask.objects.filter(date__lt=before).delete()
+    return archived, name
+
+
+def read_archived(record):
+    """
+    Relit une ligne archivée dans son fichier d'archive.
+
+    Paramètres :
+    ------------
+    record : ArchivedRecord
+        Trace de la ligne.
+
+    Retourne :
+    ---------
+    dict ou None
+        Les champs de la ligne, ou None si elle ne figure pas dans le fichier.
+
+    Exceptions :
+    ------------
+    FileNotFoundError :
+        Si le fichier d'archive a été déplacé ou supprimé.
+    """
+    path = settings.ARCHIVE_DIR / record.archive
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            row = json.loads(line)
+            if row["id"] == record.object_id:
+                return row
+    return None
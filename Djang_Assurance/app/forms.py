@@ -15,7 +15,7 @@ class PredictionForm(forms.ModelForm):
     class Meta:
         model = Prediction
         fields = "__all__"
-        exclude = ["result", "made_by_staff", "made_by"]
+        exclude = ["result", "made_by_staff", "made_by", "contributing_models"]
 
     def clean(self):
         """
@@ -54,7 +54,14 @@ class UserPredictionForm(forms.ModelForm):
     class Meta:
         model = Prediction
         fields = "__all__"
-        exclude = ["result", "made_by_staff", "reg_model", "user_id", "made_by"]
+        exclude = [
+            "result",
+            "made_by_staff",
+            "reg_model",
+            "user_id",
+            "made_by",
+            "contributing_models",
+        ]
 
     def clean(self):
         """
@@ -168,3 +175,16 @@ class PredictionFilterForm(forms.Form):
         choices=[("asc", "Ascendant"), ("desc", "Descendant")],
         label="Ordre",
     )
+
+
+class QuoteForm(forms.ModelForm):
+    """
+    Formulaire de validation d'un profil reçu par l'API JSON de devis.
+
+    Les bornes appliquées sont celles des validateurs des champs du modèle Prediction.
+    Les valeurs de 'sex', 'smoker' et 'region' sont attendues en anglais.
+    """
+
+    class Meta:
+        model = Prediction
+        fields = ["age", "sex", "weight", "size", "children", "smoker", "region"]
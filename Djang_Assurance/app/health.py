@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailable(Exception):
+    """
+    Levée lorsqu'un modèle de régression ne peut pas fournir de prédiction :
+    circuit ouvert, fichier illisible ou erreur pendant la prédiction.
+    """
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur associé à un modèle de régression.
+
+    Après `failure_threshold` échecs consécutifs (erreurs ou appels plus lents que
+    `latency_threshold` secondes), le circuit s'ouvre : le modèle est ignoré pendant
+    `cooldown` secondes. À l'issue de ce délai, le circuit est semi-ouvert : un seul
+    appel d'essai est autorisé, les autres restent refusés jusqu'à son résultat. Un
+    succès referme le circuit, un nouvel échec le rouvre immédiatement. Un essai sans
+    résultat au bout de `cooldown` secondes est abandonné : un autre est autorisé.
+
+    Attributs :
+    -----------
+    name : str
+        Nom du modèle surveillé.
+    failures : int
+        Nombre d'échecs consécutifs.
+    opened_until : float
+        Instant (horloge monotone) jusqu'auquel le circuit reste ouvert.
+    last_error : str
+        Description du dernier échec.
+    last_latency : float
+        Durée du dernier appel, en secondes.
+    trial_started : float ou None
+        Instant (horloge monotone) du début de l'appel d'essai en cours.
+    """
+
+    def __init__(self, name, failure_threshold, latency_threshold, cooldown):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self.last_error = None
+        self.last_latency = None
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return time.monotonic() < self.opened_until
+
+    @property
+    def status(self):
+        """
+        État du circuit : "closed", "open" ou "half-open".
+        """
+        if self.failures < self.failure_threshold:
+            return "closed"
+        return "open" if self.is_open else "half-open"
+
+    def allow(self):
+        """
+        Indique si le modèle peut être appelé : toujours si le circuit est fermé,
+        jamais s'il est ouvert, et pour un seul appel d'essai s'il est semi-ouvert.
+        """
+        with self._lock:
+            status = self.status
+            if status != "half-open":
+                return status == "closed"
+            now = time.monotonic()
+            if self.trial_started and now - self.trial_started < self.cooldown:
+                return False  # Un essai est déjà en cours
+            self.trial_started = now
+            return True
+
+    def record_success(self, latency):
+        """
+        Enregistre un appel réussi. Un appel trop lent compte comme un échec.
+        """
+        self.last_latency = latency
+        if latency > self.latency_threshold:
+            self.record_failure(f"appel trop lent ({latency:.3f} s)")
+            return
+        with self._lock:
+            if self.failures >= self.failure_threshold:
+                logger.info("Circuit du modèle '%s' refermé.", self.name)
+            self.failures = 0
+            self.opened_until = 0.0
+            self.trial_started = None
+
+    def record_failure(self, error):
+        """
+        Enregistre un échec et ouvre le circuit si le seuil est atteint.
+        """
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self.trial_started = None
+            if self.failures >= self.failure_threshold:
+                self.opened_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    "Circuit du modèle '%s' ouvert pour %s s après %s échec(s) : %s",
+                    self.name,
+                    self.cooldown,
+                    self.failures,
+                    self.last_error,
+                )
+
+    def state(self):
+        """
+        Retourne l'état du disjoncteur sous forme de dictionnaire sérialisable.
+        """
+        return {
+            "name": self.name,
+            "open": self.is_open,
+            "state": self.status,
+            "failures": self.failures,
+            "retry_in": max(round(self.opened_until - time.monotonic(), 1), 0),
+            "last_error": self.last_error,
+            "last_latency": self.last_latency,
+        }
+
+
+# Disjoncteurs du processus, indexés par clé primaire du modèle de régression
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(reg_model):
+    """
+    Retourne le disjoncteur associé à un modèle de régression, en le créant au besoin.
+    """
+    breaker = _BREAKERS.get(reg_model.pk)
+    if breaker is None:
+        with _BREAKERS_LOCK:
+            breaker = _BREAKERS.setdefault(
+                reg_model.pk,
+                CircuitBreaker(reg_model.name, **settings.REG_MODEL_CIRCUIT_BREAKER),
+            )
+    return breaker
+
+
+def breaker_states():
+    """
+    Retourne l'état de tous les disjoncteurs connus du processus.
+    """
+    return [breaker.state() for breaker in _BREAKERS.values()]
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from django.conf import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def inference_executor():
+    """
+    Retourne le pool de fils dédié aux prédictions des modèles de régression.
+
+    Les prédictions (scikit-learn, pandas) sont des calculs bloquants : exécutées
+    dans ce pool de `settings.INFERENCE_WORKERS` fils, elles n'occupent ni la boucle
+    d'événements des vues asynchrones, ni le fil partagé de `sync_to_async` qui
+    exécute les requêtes SQL. Le pool est créé à la première utilisation.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INFERENCE_WORKERS,
+                thread_name_prefix="inference",
+            )
+    return _executor
+
+
+async def run_inference(function, *args, **kwargs):
+    """
+    Exécute une fonction de prédiction dans le pool dédié et attend son résultat
+    sans bloquer la boucle d'événements.
+
+    La fonction ne doit pas interroger la base : les objets nécessaires (modèles de
+    régression, profils) sont chargés par la vue avec l'ORM asynchrone.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        inference_executor(), partial(function, *args, **kwargs)
+    )
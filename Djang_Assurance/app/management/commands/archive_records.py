@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from app.archive import ARCHIVES, archive_cutoff, archive_records
+
+
+class Command(BaseCommand):
+    """
+    Archive les prédictions et les rendez-vous anciens en fichiers JSONL compressés.
+
+    À lancer périodiquement (par exemple chaque nuit, via cron) : les lignes plus
+    anciennes que `--days` jours sont déplacées vers `settings.ARCHIVE_DIR` et
+    remplacées par une trace (voir `app.archive`).
+    """
+
+    help = "Archive les prédictions et les rendez-vous anciens."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "kinds",
+            nargs="*",
+            choices=list(ARCHIVES),
+            help="Types à archiver (défaut : tous).",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Ancienneté minimale, en jours (défaut : ARCHIVE_RETENTION_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = archive_cutoff(options["days"])
+        for kind in options["kinds"] or ARCHIVES:
+            archived, name = archive_records(kind, before, options["batch_size"])
+            destination = f" dans {name}" if name else ""
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{kind} : {archived} lignes antérieures au "
+                    f"{before:%d/%m/%Y} archivées{destination}."
+                )
+            )
@@ -0,0 +1,267 @@
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from app.models import Prediction
+from app.synthetic import FIRST_NAMES, LAST_NAMES, synthetic_profiles
+from meetings.agenda import week_start
+from meetings.models import Appointment, BookedSlotMask
+from meetings.provisioning import TEMPLATES, apply_availability_template
+from meetings.slots import booking_mask, bump_directory_version, slot_minutes
+from user.models import CustomUser, StaffUser
+
+
+class Command(BaseCommand):
+    """
+    Remplit la base de données synthétiques, en volumes réalistes, pour mesurer les
+    listes, agendas et réservations à taille réelle.
+
+    Sont créés, par insertions groupées (`bulk_create`) en lots de `--chunk-size` :
+
+    - des clients, chacun avec sa prédiction, dont les caractéristiques suivent les
+      distributions du jeu de données d'assurance (voir `app.synthetic`) ;
+    - des conseillers, avec des disponibilités tirées parmi les modèles de
+      `meetings.provisioning` ;
+    - des rendez-vous sur les semaines passées et à venir, une part `--occupancy` des
+      créneaux disponibles étant réservée, ainsi que l'index des créneaux réservés
+      (`bulk_create` ne déclenche pas les signaux).
+
+    Les tirages dépendent seulement de `--seed` : deux bases remplies avec les mêmes
+    options contiennent les mêmes données. Tous les comptes partagent le mot de passe
+    `--password` (haché une seule fois), pour `manage.py load_test --username`.
+    """
+
+    help = "Génère des clients, prédictions, conseillers et rendez-vous synthétiques."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--staff", type=int, default=100)
+        parser.add_argument("--past-weeks", type=int, default=12)
+        parser.add_argument("--future-weeks", type=int, default=4)
+        parser.add_argument(
+            "--occupancy",
+            type=float,
+            default=0.6,
+            help="Part des créneaux disponibles réservés (entre 0 et 1).",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--prefix",
+            default="synth-",
+            help="Préfixe des noms d'utilisateur créés (doit être inutilisé).",
+        )
+        parser.add_argument("--password", default="password")
+
+    def create_users(self, rng, rows, usernames, password, is_staff=False, ages=None):
+        """
+        Crée des comptes en une insertion groupée.
+
+        Retourne :
+        ---------
+        list
+            Les comptes créés, avec leur clé.
+        """
+        first_names = rng.choice(FIRST_NAMES, rows)
+        last_names = rng.choice(LAST_NAMES, rows)
+        return CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    username=username,
+                    prenom=first_names[index],
+                    nom=last_names[index],
+                    email=f"{username}@example.com",
+                    password=password,
+                    is_staff=is_staff,
+                    age=None if ages is None else int(ages[index]),
+                )
+                for index, username in enumerate(usernames)
+            ]
+        )
+
+    def create_customers(self, rng, options, password):
+        """
+        Crée les clients et leurs prédictions, lot par lot.
+
+        Retourne :
+        ---------
+        ndarray
+            Les clés des clients créés.
+        """
+        customer_ids = []
+        prefix, chunk_size = options["prefix"], options["chunk_size"]
+        for offset in range(0, options["users"], chunk_size):
+            rows = min(chunk_size, options["users"] - offset)
+            profiles = synthetic_profiles(rows, rng)
+            with transaction.atomic():
+                users = self.create_users(
+                    rng,
+                    rows,
+                    [f"{prefix}{offset + index}" for index in range(rows)],
+                    password,
+                    ages=profiles["age"],
+                )
+                predictions = []
+                for user, profile in zip(users, profiles.itertuples(index=False)):
+                    prediction = Prediction(
+                        user_id=user,
+                        made_by=user,
+                        age=profile.age,
+                        sex=profile.sex,
+                        weight=profile.weight,
+                        size=profile.size,
+                        children=profile.children,
+                        smoker=profile.smoker,
+                        region=profile.region,
+                        result=profile.result,
+                    )
+                    prediction.fr_transform()  # Les champs sont stockés en français
+                    predictions.append(prediction)
+                Prediction.objects.bulk_create(predictions)
+            customer_ids.extend(user.pk for user in users)
+            self.stdout.write(f"  {offset + rows} clients")
+        return np.array(customer_ids)
+
+    def create_staff(self, rng, options, password):
+        """
+        Crée les conseillers et leurs disponibilités.
+
+        Retourne :
+        ---------
+        dict
+            Le modèle de disponibilités de chaque conseiller, par clé.
+        """
+        prefix, rows = options["prefix"], options["staff"]
+        template_names = rng.choice(list(TEMPLATES), rows)
+        with transaction.atomic():
+            users = self.create_users(
+                rng,
+                rows,
+                [f"{prefix}conseiller-{index}" for index in range(rows)],
+                password,
+                is_staff=True,
+            )
+            StaffUser.objects.bulk_create(
+                StaffUser(
+                    user=user,
+                    title=f"Conseiller en Assurance - {user.prenom} {user.nom}",
+                    description="Conseiller généré pour les tests de charge.",
+                )
+                for user in users
+            )
+            for name in TEMPLATES:
+                apply_availability_template(
+                    [
+                        user.pk
+                        for user, template in zip(users, template_names)
+                        if template == name
+                    ],
+                    TEMPLATES[name],
+                )
+        return {
+            user.pk: TEMPLATES[template]
+            for user, template in zip(users, template_names)
+        }
+
+    def create_appointments(self, rng, options, templates, customer_ids):
+        """
+        Réserve une part des créneaux disponibles de chaque conseiller, et construit
+        l'index des créneaux réservés correspondant.
+
+        Retourne :
+        ---------
+        int
+            Nombre de rendez-vous créés.
+        """
+        slot = timedelta(minutes=slot_minutes())
+        first_day = week_start(timezone.localdate()) - timedelta(
+            weeks=options["past_weeks"]
+        )
+        days = [
+            first_day + timedelta(days=offset)
+            for offset in range(7 * (options["past_weeks"] + options["future_weeks"]))
+        ]
+        created = 0
+        appointments, masks = [], {}
+
+        def flush():
+            with transaction.atomic():
+                Appointment.objects.bulk_create(appointments)
+                BookedSlotMask.objects.bulk_create(
+                    BookedSlotMask(
+                        staff_user_id=staff_user_id, date=date, mask=format(mask, "x")
+                    )
+                    for (staff_user_id, date), mask in masks.items()
+                )
+            appointments.clear()
+            masks.clear()
+
+        for staff_user_id, template in templates.items():
+            for date in days:
+                for day_of_week, start_time, end_time in template:
+                    if day_of_week != date.weekday():
+                        continue
+                    start = datetime.combine(date, start_time)
+                    while start + slot <= datetime.combine(date, end_time):
+                        if rng.random() < options["occupancy"]:
+                            end = start + slot
+                            appointments.append(
+                                Appointment(
+                                    user_id=int(rng.choice(customer_ids)),
+                                    staff_user_id=staff_user_id,
+                                    date=date,
+                                    start_time=start.time(),
+                                    end_time=end.time(),
+                                )
+                            )
+                            key = (staff_user_id, date)
+                            masks[key] = masks.get(key, 0) | booking_mask(
+                                start.time(), end.time()
+                            )
+                        start += slot
+            # Un conseiller à la fois : ses masques sont complets à chaque écriture
+            if len(appointments) >= options["chunk_size"]:
+                created += len(appointments)
+                flush()
+        created += len(appointments)
+        flush()
+        return created
+
+    def handle(self, *args, **options):
+        if CustomUser.objects.filter(username__startswith=options["prefix"]).exists():
+            raise CommandError(
+                f"Des comptes commencent déjà par « {options['prefix']} » : "
+                "choisir un autre --prefix."
+            )
+        rng = np.random.default_rng(options["seed"])
+        password = make_password(options["password"])
+        start = time.perf_counter()
+
+        self.stdout.write(f"Création de {options['users']} clients et prédictions...")
+        customer_ids = self.create_customers(rng, options, password)
+        customers = len(customer_ids)
+        if not customers:
+            customer_ids = np.array(
+                CustomUser.objects.filter(is_staff=False).values_list("pk", flat=True)
+            )
+
+        self.stdout.write(f"Création de {options['staff']} conseillers...")
+        templates = self.create_staff(rng, options, password)
+
+        appointments = 0
+        if len(customer_ids):
+            self.stdout.write("Création des rendez-vous...")
+            appointments = self.create_appointments(
+                rng, options, templates, customer_ids
+            )
+        transaction.on_commit(bump_directory_version)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{customers} clients, {len(templates)} conseillers et "
+                f"{appointments} rendez-vous en {time.perf_counter() - start:.1f} s."
+            )
+        )
@@ -0,0 +1,124 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+
+class Command(BaseCommand):
+    """
+    Test de charge des pages à travers l'application ASGI, dans le processus courant.
+
+    Les requêtes sont envoyées directement à `Djang_Assurance.asgi`, sans serveur ni
+    réseau, par `--concurrency` clients simultanés. On mesure donc le coût des vues
+    elles-mêmes, et leur capacité à traiter des requêtes en parallèle dans une seule
+    boucle d'événements, comme un processus uvicorn.
+
+    Pour comparer deux versions du code, lancer la même commande sur chacune, avec
+    la même base et les mêmes options.
+    """
+
+    help = "Mesure le débit et les latences de pages servies par l'application ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "urls", nargs="+", help="Chemins à tester (ex. : /meetings/user/)."
+        )
+        parser.add_argument(
+            "--username", help="Utilisateur connecté pendant le test (session)."
+        )
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Nombre de requêtes par chemin."
+        )
+
+    def session_cookie(self, username):
+        if not username:
+            return ""
+        try:
+            user = get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable : {username}")
+        client = Client()
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return f"{settings.SESSION_COOKIE_NAME}={session}"
+
+    async def request(self, application, url, cookie):
+        """
+        Envoie une requête GET à l'application ASGI.
+
+        Retourne :
+        ---------
+        tuple
+            (code de statut, durée en millisecondes).
+        """
+        parts = urlsplit(url)
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost"
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "headers": [(b"host", host.encode()), (b"cookie", cookie.encode())],
+            "client": ("127.0.0.1", 50000),
+            "server": (host, 80),
+        }
+        received = asyncio.Event()
+        status = []
+
+        async def receive():
+            if not received.is_set():
+                received.set()
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Future()  # Le client ne se déconnecte pas
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        start = time.perf_counter()
+        await application(scope, receive, send)
+        return status[0], (time.perf_counter() - start) * 1000
+
+    async def run(self, application, url, cookie, concurrency, total):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await self.request(application, url, cookie)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        return results, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        cookie = self.session_cookie(options["username"])
+        application = get_asgi_application()
+        concurrency, total = options["concurrency"], options["requests"]
+
+        self.stdout.write(
+            f"{total} requêtes par chemin, {concurrency} clients simultanés :"
+        )
+        for url in options["urls"]:
+            asyncio.run(self.run(application, url, cookie, concurrency, 5))  # Chauffe
+            results, elapsed = asyncio.run(
+                self.run(application, url, cookie, concurrency, total)
+            )
+            statuses = [status for status, _ in results]
+            timings = sorted(timing for _, timing in results)
+            errors = sum(1 for status in statuses if status >= 400)
+            self.stdout.write(
+                f"  {url:<40} {total / elapsed:8.1f} req/s  "
+                f"p50 {statistics.median(timings):7.1f} ms  "
+                f"p95 {timings[int(len(timings) * 0.95)]:7.1f} ms  "
+                f"erreurs {errors}  statuts {sorted(set(statuses))}"
+            )
@@ -0,0 +1,178 @@
+import json
+import os
+import time
+import tracemalloc
+import cloudpickle
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from app.models import Reg_model, FEATURE_COLUMNS
+from app.synthetic import synthetic_holdout
+
+
+class Command(BaseCommand):
+    """
+    Compare tous les modèles de régression sur un jeu de test : erreurs, latence,
+    débit, taille en mémoire et temps de chargement.
+
+    Le classement inclut la stratégie utilisée pour les clients (la prime la plus
+    élevée de tous les modèles) et, pour chaque modèle, la part des profils où il
+    fixe cette prime.
+    """
+
+    help = "Évalue précision, latence et mémoire de chaque modèle de régression."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset",
+            help="CSV de test (colonnes age, sex, bmi, children, smoker, region, charges).",
+        )
+        parser.add_argument(
+            "--rows", type=int, default=1000, help="Taille du jeu synthétique."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=200,
+            help="Nombre d'appels unitaires pour mesurer la latence.",
+        )
+        parser.add_argument("--json", help="Fichier où écrire le rapport JSON.")
+
+    def load_dataset(self, options):
+        if not options["dataset"]:
+            return synthetic_holdout(options["rows"], options["seed"])
+        try:
+            data = pd.read_csv(options["dataset"])
+            return data[FEATURE_COLUMNS], data["charges"].to_numpy()
+        except (OSError, KeyError) as error:
+            raise CommandError(f"Jeu de test illisible : {error}")
+
+    def measure(self, reg_model, features, target, repeat):
+        """
+        Mesure un modèle. Retourne le rapport et les prédictions sur tout le jeu.
+        """
+        # Premier chargement non mesuré : importe les modules nécessaires au modèle
+        with open(reg_model.path, "rb") as f:
+            cloudpickle.load(f)
+        start = time.perf_counter()
+        with open(reg_model.path, "rb") as f:
+            estimator = cloudpickle.load(f)
+        load_time = time.perf_counter() - start
+
+        # Mémoire occupée par le modèle désérialisé (mesurée à part : tracemalloc
+        # ralentit). La copie reste référencée pendant la mesure, puis est libérée.
+        tracemalloc.start()
+        with open(reg_model.path, "rb") as f:
+            copy = cloudpickle.load(f)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del copy
+
+        predictions = estimator.predict(features)  # Premier appel : préchauffage
+
+        latencies = []
+        for index in range(repeat):
+            row = features.iloc[[index % len(features)]]
+            start = time.perf_counter()
+            estimator.predict(row)
+            latencies.append(time.perf_counter() - start)
+
+        batch_times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            estimator.predict(features)
+            batch_times.append(time.perf_counter() - start)
+
+        report = {
+            "model": reg_model.name,
+            "path": reg_model.path,
+            "file_kb": round(os.path.getsize(reg_model.path) / 1024, 1),
+            "memory_kb": round(memory / 1024, 1),
+            "load_ms": round(load_time * 1000, 2),
+            "p50_ms": round(np.percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(np.percentile(latencies, 99) * 1000, 3),
+            "rows_per_s": round(len(features) / min(batch_times)),
+        }
+        report.update(self.errors(target, predictions))
+        return report, predictions
+
+    def errors(self, target, predictions):
+        return {
+            "mae": round(mean_absolute_error(target, predictions), 2),
+            "rmse": round(mean_squared_error(target, predictions) ** 0.5, 2),
+            "r2": round(r2_score(target, predictions), 4),
+        }
+
+    def handle(self, *args, **options):
+        features, target = self.load_dataset(options)
+        reports = []
+        all_predictions = {}
+        for reg_model in Reg_model.objects.order_by("pk"):
+            try:
+                report, predictions = self.measure(
+                    reg_model, features, target, options["repeat"]
+                )
+            except Exception as error:
+                reports.append({"model": reg_model.name, "error": str(error)})
+                continue
+            reports.append(report)
+            all_predictions[reg_model.name] = predictions
+
+        ensemble = {}
+        if all_predictions:
+            stacked = np.vstack(list(all_predictions.values()))
+            ensemble = {"model": "maximum (prime client)"}
+            ensemble.update(self.errors(target, stacked.max(axis=0)))
+            winners = stacked.argmax(axis=0)
+            for index, name in enumerate(all_predictions):
+                report = next(r for r in reports if r["model"] == name)
+                report["max_share"] = round(float(np.mean(winners == index)), 3)
+
+        self.write_table(reports, ensemble)
+        result = {
+            "dataset": options["dataset"] or f"synthétique ({len(features)} lignes)",
+            "models": reports,
+            "ensemble": ensemble,
+        }
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=4, ensure_ascii=False)
+            self.stdout.write(f"Rapport JSON écrit dans {options['json']}.")
+
+    def write_table(self, reports, ensemble):
+        columns = [
+            "model",
+            "mae",
+            "rmse",
+            "r2",
+            "max_share",
+            "p50_ms",
+            "p99_ms",
+            "rows_per_s",
+            "memory_kb",
+            "file_kb",
+            "load_ms",
+        ]
+        rows = [
+            [str(report.get(column, "")) for column in columns]
+            for report in reports + ([ensemble] if ensemble else [])
+            if "error" not in report
+        ]
+        widths = [
+            max(len(column), *(len(row[i]) for row in rows)) if rows else len(column)
+            for i, column in enumerate(columns)
+        ]
+        self.stdout.write(
+            "  ".join(column.ljust(width) for column, width in zip(columns, widths))
+        )
+        for row in rows:
+            self.stdout.write(
+                "  ".join(value.ljust(width) for value, width in zip(row, widths))
+            )
+        for report in reports:
+            if "error" in report:
+                self.stdout.write(
+                    self.style.WARNING(f"{report['model']} : {report['error']}")
+                )
@@ -0,0 +1,107 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from app.models import Reg_model
+from app.rollout import RolloutError, register_version, promote, rollback, cancel
+
+
+class Command(BaseCommand):
+    """
+    Commande de déploiement sans interruption des versions d'un modèle de régression.
+
+    Étapes :
+    --------
+    register <modèle> <fichier> :
+        Valide le fichier sur le jeu de référence et le met en préchauffage.
+    promote <modèle> :
+        Bascule le trafic sur la version préchauffée par tous les processus.
+    rollback <modèle> :
+        Revient immédiatement à la version précédente.
+    cancel <modèle> :
+        Abandonne la version en préchauffage.
+    status :
+        Affiche les versions active, en préchauffage et précédente de chaque modèle.
+
+    Le modèle est désigné par sa clé primaire ou par son nom.
+    """
+
+    help = "Déploie, active ou annule une version d'un modèle de régression."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="action", required=True)
+
+        register_parser = subparsers.add_parser("register")
+        register_parser.add_argument("reg_model")
+        register_parser.add_argument("path")
+        register_parser.add_argument(
+            "--max-drift",
+            type=float,
+            default=0.5,
+            help="Écart relatif médian maximal avec la version active (défaut : 0.5).",
+        )
+
+        promote_parser = subparsers.add_parser("promote")
+        promote_parser.add_argument("reg_model")
+        promote_parser.add_argument(
+            "--workers",
+            type=int,
+            default=int(os.getenv("WEB_CONCURRENCY", 1)),
+            help="Nombre de processus devant avoir préchauffé la version.",
+        )
+        promote_parser.add_argument(
+            "--timeout",
+            type=float,
+            default=120,
+            help="Délai maximal d'attente du préchauffage, en secondes.",
+        )
+
+        for action in ("rollback", "cancel"):
+            subparsers.add_parser(action).add_argument("reg_model")
+        subparsers.add_parser("status")
+
+    def get_reg_model(self, identifier):
+        lookup = {"pk": identifier} if identifier.isdigit() else {"name": identifier}
+        try:
+            return Reg_model.objects.get(**lookup)
+        except Reg_model.DoesNotExist:
+            raise CommandError(f"Modèle de régression introuvable : {identifier}")
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        if action == "status":
+            for reg_model in Reg_model.objects.order_by("pk"):
+                self.stdout.write(
+                    f"{reg_model.pk} {reg_model.name} (v{reg_model.version}) : "
+                    f"active={reg_model.path} "
+                    f"préchauffage={reg_model.staged_path or '-'} "
+                    f"précédente={reg_model.previous_path or '-'}"
+                )
+            return
+
+        reg_model = self.get_reg_model(options["reg_model"])
+        try:
+            if action == "register":
+                version = register_version(
+                    reg_model, options["path"], options["max_drift"]
+                )
+                self.stdout.write(
+                    f"Version {version.path} validée et en préchauffage pour '{reg_model}'."
+                )
+            elif action == "promote":
+                version = promote(reg_model, options["workers"], options["timeout"])
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"'{reg_model}' utilise désormais {version.path}."
+                    )
+                )
+            elif action == "rollback":
+                rollback(reg_model)
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"'{reg_model}' utilise de nouveau {reg_model.previous_path}."
+                    )
+                )
+            elif action == "cancel":
+                cancel(reg_model)
+                self.stdout.write(f"Préchauffage annulé pour '{reg_model}'.")
+        except RolloutError as error:
+            raise CommandError(str(error))
@@ -1,8 +1,22 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from user.models import CustomUser
 from django.core.validators import MinValueValidator, MaxValueValidator
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+import numpy as np
 import pandas as pd
 import cloudpickle
+from .health import ModelUnavailable, get_breaker
+
+logger = logging.getLogger(__name__)
 
 # Définition des choix pour les champs de type `CharField`
 SEX_CHOICES = (("female", "Femme"), ("male", "Homme"))
@@ -16,6 +30,97 @@ REGION_CHOICES = (
     ("northwest", "Nord Ouest"),
 )
 
+# Colonnes attendues par les pipelines de régression sérialisés
+FEATURE_COLUMNS = ["age", "sex", "bmi", "children", "smoker", "region"]
+
+# Cache des modèles désérialisés, indexé par (chemin, date de modification du fichier)
+_ESTIMATORS = {}
+
+# Jeu de profils de référence utilisé pour valider et préchauffer les nouveaux modèles
+GOLDEN_INPUTS_PATH = "app/regression/golden_inputs.json"
+
+# Versions en préchauffage dans ce processus, sous la forme (clé du modèle, version)
+_WARMING = set()
+_WARMING_LOCK = threading.Lock()
+
+# Identifiant de démarrage du processus courant, sous la forme (pid, identifiant)
+_BOOT = (None, None)
+
+
+def build_features(profiles):
+    """
+    Construit la matrice de caractéristiques attendue par les modèles de régression.
+
+    Le calcul de l'IMC est vectorisé sur l'ensemble des profils afin qu'un lot
+    complet soit transmis en un seul appel à `predict`.
+
+    Paramètres :
+    ------------
+    profiles : list[dict]
+        Profils contenant les clés 'age', 'sex', 'weight', 'size', 'children',
+        'smoker' et 'region'.
+
+    Retourne :
+    ---------
+    DataFrame
+        Les caractéristiques dans l'ordre de `FEATURE_COLUMNS`.
+    """
+    data = pd.DataFrame.from_records(
+        profiles,
+        columns=["age", "sex", "weight", "size", "children", "smoker", "region"],
+    )
+    # Calcul de l'IMC (Indice de Masse Corporelle) sur toute la colonne
+    data["bmi"] = data["weight"] / (data["size"] / 100) ** 2
+    return data[FEATURE_COLUMNS]
+
+
+def build_feature_grid(profile, column, values):
+    """
+    Construit une matrice de caractéristiques où une seule colonne varie.
+
+    La ligne du profil est répétée autant de fois qu'il y a de valeurs, puis la
+    colonne étudiée est remplacée en une seule affectation vectorisée.
+
+    Paramètres :
+    ------------
+    profile : dict
+        Profil de référence, au format attendu par `build_features`.
+    column : str
+        Colonne de `FEATURE_COLUMNS` à faire varier (ex. : 'age', 'bmi', 'smoker').
+    values : array-like
+        Valeurs successives prises par la colonne.
+
+    Retourne :
+    ---------
+    DataFrame
+        Une ligne par valeur, dans l'ordre de `values`.
+    """
+    base = build_features([profile])
+    grid = base.iloc[np.zeros(len(values), dtype=int)].reset_index(drop=True)
+    grid[column] = values
+    return grid
+
+
+def worker_identity():
+    """
+    Retourne (nom de l'hôte, identifiant de démarrage) du processus courant.
+
+    L'identifiant est tiré au premier appel, et de nouveau dans un processus issu
+    d'un fork (pid différent).
+    """
+    global _BOOT
+    if _BOOT[0] != os.getpid():
+        _BOOT = (os.getpid(), uuid.uuid4().hex)
+    return socket.gethostname(), _BOOT[1]
+
+
+def golden_features():
+    """
+    Retourne les caractéristiques du jeu de profils de référence.
+    """
+    with open(GOLDEN_INPUTS_PATH, encoding="utf-8") as f:
+        return build_features(json.load(f))
+
 
 class Reg_model(models.Model):
     """
@@ -27,6 +132,13 @@ class Reg_model(models.Model):
         Nom du modèle de régression (exemple : 'Lasso Regression Model').
     path : FilePathField
         Chemin vers le fichier sérialisé contenant le modèle de régression.
+    staged_path : str
+        Chemin d'une nouvelle version en cours de préchauffage (vide sinon).
+    previous_path : str
+        Chemin de la version précédente, conservé pour un retour arrière immédiat.
+    version : int
+        Compteur incrémenté à chaque changement de version. Partagé par tous les
+        processus via la base de données, il leur signale qu'une version est à préchauffer.
     """
 
     name = models.CharField(
@@ -37,6 +149,129 @@ class Reg_model(models.Model):
         path="app/regression/models/",
         help_text="Le chemin vers le fichier sérialisé du modèle de régression.",
     )
+    staged_path = models.CharField(max_length=255, blank=True, default="")
+    previous_path = models.CharField(max_length=255, blank=True, default="")
+    version = models.PositiveIntegerField(default=0)
+
+    def load_estimator(self, path=None):
+        """
+        Charge le modèle sérialisé, en le conservant en mémoire entre les requêtes.
+
+        Le cache est indexé par la date de modification du fichier : un fichier
+        `.pkl` remplacé est rechargé à la prochaine utilisation, et l'ancienne
+        version du même fichier est retirée du cache.
+
+        Paramètres :
+        ------------
+        path : str, optionnel
+            Fichier à charger (par défaut : la version active, `self.path`).
+
+        Retourne :
+        ---------
+        object
+            Le pipeline scikit-learn désérialisé.
+        """
+        path = path or self.path
+        key = (path, os.stat(path).st_mtime_ns)
+        estimator = _ESTIMATORS.get(key)
+        if estimator is None:
+            with open(path, "rb") as f:
+                estimator = cloudpickle.load(f)
+            for stale in [item for item in list(_ESTIMATORS) if item[0] == path]:
+                _ESTIMATORS.pop(stale, None)
+            _ESTIMATORS[key] = estimator
+        return estimator
+
+    def calcul_predictions(self, features):
+        """
+        Calcule les primes d'assurance d'un lot de profils en un seul appel au modèle.
+
+        Paramètres :
+        ------------
+        features : DataFrame
+            Caractéristiques construites par `build_features`.
+
+        Retourne :
+        ---------
+        ndarray
+            Les primes prédites, dans l'ordre des lignes de `features`.
+
+        Exceptions :
+        ------------
+        ModelUnavailable :
+            Si le circuit du modèle est ouvert, ou si le chargement ou la prédiction échoue.
+        """
+        breaker = get_breaker(self)
+        if not breaker.allow():
+            raise ModelUnavailable(f"Circuit ouvert pour le modèle '{self.name}'.")
+        try:
+            estimator = self.load_estimator()
+            # Seule la prédiction est chronométrée : un premier chargement lent du
+            # fichier ne compte pas comme un appel trop lent
+            start = time.perf_counter()
+            prediction = estimator.predict(features)
+            latency = time.perf_counter() - start
+        except Exception as error:
+            breaker.record_failure(error)
+            raise ModelUnavailable(
+                f"Modèle '{self.name}' indisponible : {error}"
+            ) from error
+        breaker.record_success(latency)
+        return prediction
+
+    def prewarm_staged(self):
+        """
+        Préchauffe la version en attente de ce modèle dans le processus courant.
+
+        Le fichier est chargé puis appelé une première fois sur le jeu de référence
+        (une seule fois par processus et par version). Le processus signale ensuite
+        qu'il est prêt en enregistrant, ou en rafraîchissant à chaque appel, sa ligne
+        `WarmedWorker` (hôte et identifiant de démarrage du processus). Appelée en
+        arrière-plan par `app.rollout.start_prewarm_watcher`, jamais pendant une
+        requête.
+
+        Retourne :
+        ---------
+        bool
+            True si la version vient d'être préchauffée par ce processus.
+        """
+        if not self.staged_path:
+            return False
+        key = (self.pk, self.version)
+        with _WARMING_LOCK:
+            warmed = key in _WARMING
+            _WARMING.add(key)
+        if not warmed:
+            try:
+                self.load_estimator(self.staged_path).predict(golden_features())
+            except Exception:
+                logger.exception(
+                    "Échec du préchauffage de '%s' (%s).", self.name, self.staged_path
+                )
+                with _WARMING_LOCK:
+                    _WARMING.discard(key)
+                return False
+
+        host, boot_id = worker_identity()
+        now = timezone.now()
+        WarmedWorker.objects.bulk_create(
+            [
+                WarmedWorker(
+                    version=version,
+                    host=host,
+                    boot_id=boot_id,
+                    pid=os.getpid(),
+                    warmed_at=now,
+                )
+                for version in ModelVersion.objects.filter(
+                    reg_model_id=self.pk, path=self.staged_path, status="staged"
+                )
+            ],
+            update_conflicts=True,
+            unique_fields=["version", "host", "boot_id"],
+            update_fields=["warmed_at"],
+        )
+        return not warmed
 
     def calcul_prediction(self, age, sex, weight, size, children, smoker, region):
         """
@@ -64,26 +299,141 @@ class Reg_model(models.Model):
         float
             La prime d'assurance prédite.
         """
-        # Calcul de l'IMC (Indice de Masse Corporelle)
-        bmi = weight / pow(size / 100, 2)
-        # Création d'un DataFrame avec les données utilisateur
-        data = pd.DataFrame(
-            data=[[age, sex, bmi, children, smoker, region]],
-            columns=["age", "sex", "bmi", "children", "smoker", "region"],
+        data = build_features(
+            [
+                {
+                    "age": age,
+                    "sex": sex,
+                    "weight": weight,
+                    "size": size,
+                    "children": children,
+                    "smoker": smoker,
+                    "region": region,
+                }
+            ]
         )
-        print(data)
-        print(data.dtypes)
-        # Chargement du modèle sérialisé
-        with open(self.path, "rb") as f:
-            reg = cloudpickle.load(f)
-        # Prédiction à l'aide du modèle
-        prediction = reg.predict(data)
-        return prediction
+        return self.calcul_predictions(data)
+
+    @classmethod
+    def ensemble_predictions(cls, features, models=None):
+        """
+        Calcule les primes d'un lot de profils avec tous les modèles de régression.
+
+        Chaque modèle est appelé une seule fois pour l'ensemble du lot. Les modèles
+        indisponibles (circuit ouvert, fichier illisible, erreur) sont ignorés.
+
+        Paramètres :
+        ------------
+        features : DataFrame
+            Caractéristiques construites par `build_features`.
+        models : list, optionnel
+            Modèles déjà chargés (par défaut : tous les modèles, lus en base). Sans
+            requête SQL, le calcul peut être confié au pool de `app.inference`.
+
+        Retourne :
+        ---------
+        dict
+            Les primes prédites par nom de modèle, pour les seuls modèles ayant répondu.
+        """
+        premiums = {}
+        for model in cls.objects.all() if models is None else models:
+            try:
+                premiums[model.name] = model.calcul_predictions(features)
+            except ModelUnavailable as error:
+                logger.warning("Modèle ignoré pour le devis : %s", error)
+        return premiums
 
     def __str__(self):
         return self.name
 
 
+class ModelVersion(models.Model):
+    """
+    Historique des versions déployées d'un modèle de régression.
+
+    Attributs :
+    -----------
+    reg_model : ForeignKey
+        Modèle de régression concerné.
+    path : str
+        Chemin vers le fichier sérialisé de cette version.
+    status : str
+        'staged' (en préchauffage), 'active', 'retired' (remplacée) ou 'rejected'.
+    created_at : DateTimeField
+        Date d'enregistrement de la version.
+    activated_at : DateTimeField
+        Date de la dernière mise en service (nullable).
+    """
+
+    STATUS_CHOICES = (
+        ("staged", "En préchauffage"),
+        ("active", "Active"),
+        ("retired", "Retirée"),
+        ("rejected", "Rejetée"),
+    )
+
+    reg_model = models.ForeignKey(
+        Reg_model, on_delete=models.CASCADE, related_name="versions"
+    )
+    path = models.CharField(max_length=255)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default="staged")
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.reg_model} - {self.path} ({self.status})"
+
+    @property
+    def warmed_workers(self):
+        """
+        Nombre de processus serveur distincts ayant préchargé cette version et
+        toujours en vie : seules comptent les lignes rafraîchies depuis moins de deux
+        intervalles du fil de préchauffage (`settings.MODEL_PREWARM_INTERVAL`, un
+        passage en retard près). Un processus arrêté cesse donc d'être compté.
+        """
+        since = timezone.now() - timedelta(seconds=2 * settings.MODEL_PREWARM_INTERVAL)
+        return self.warmed.filter(warmed_at__gte=since).count()
+
+
+class WarmedWorker(models.Model):
+    """
+    Processus serveur ayant préchargé une version de modèle.
+
+    Attributs :
+    -----------
+    version : ForeignKey
+        Version préchargée.
+    host : str
+        Nom de l'hôte du processus (plusieurs instances peuvent réutiliser les
+        mêmes pid).
+    boot_id : str
+        Identifiant tiré au démarrage du processus : un processus redémarré qui
+        obtient un ancien pid n'hérite pas de la ligne de son prédécesseur.
+    pid : int
+        Identifiant système du processus, à titre indicatif.
+    warmed_at : DateTimeField
+        Date du dernier signalement du processus.
+    """
+
+    version = models.ForeignKey(
+        ModelVersion, on_delete=models.CASCADE, related_name="warmed"
+    )
+    host = models.CharField(max_length=255)
+    boot_id = models.CharField(max_length=32)
+    pid = models.PositiveIntegerField()
+    warmed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["version", "host", "boot_id"], name="unique_warmed_worker"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.version} - {self.host} pid {self.pid}"
+
+
 class Prediction(models.Model):
     """
     Représente une demande de prédiction d'un utilisateur et son résultat.
@@ -114,6 +464,10 @@ class Prediction(models.Model):
         Référence à l'utilisateur ayant effectué la prédiction.
     made_by_staff : bool
         Indique si la prédiction a été effectuée par un membre du personnel.
+    contributing_models : list
+        Noms des modèles de régression ayant contribué au résultat.
+    updated_at : DateTimeField
+        Date de dernière modification (voir `app.archive`).
     """
 
     age = models.IntegerField(
@@ -138,6 +492,10 @@ class Prediction(models.Model):
     reg_model = models.ForeignKey(Reg_model, on_delete=models.SET_NULL, null=True)
     made_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     made_by_staff = models.BooleanField(default=False)
+    contributing_models = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(
+        auto_now=True, db_index=True
+    )  # Date de dernière modification (archivage des prédictions anciennes).
 
     def __str__(self):
         return f"Prédiction de l'utilisateur : {self.user_id} avec un résultat de : {self.result}"
@@ -149,7 +507,13 @@ class Prediction(models.Model):
 
         Retourne :
         ---------
-        None : Le résultat est stocké dans l'attribut `result`.
+        None : Le résultat est stocké dans l'attribut `result`, et les modèles
+        utilisés dans `contributing_models`.
+
+        Exceptions :
+        ------------
+        ModelUnavailable :
+            Si le modèle spécifié, ou tous les modèles, sont indisponibles.
         """
         if self.made_by_staff:
             # Utilisation du modèle de régression spécifié
@@ -162,26 +526,32 @@ class Prediction(models.Model):
                 self.smoker,
                 self.region,
             )[0]
+            self.contributing_models = [self.reg_model.name]
         else:
             # Si aucun modèle spécifique n'est choisi, on utilise la prédiction la plus coûteuse
-            reg_models = Reg_model.objects.all()
-            pred_list = []
-            for model in reg_models:
-                pred_list.append(
-                    model.calcul_prediction(
-                        self.age,
-                        self.sex,
-                        self.weight,
-                        self.size,
-                        self.children,
-                        self.smoker,
-                        self.region,
-                    )[0]
-                )
-            pred_list.sort()
-            pred = pred_list[-1]  # Choisir la prédiction la plus élevée
+            features = build_features([self.profile()])
+            premiums = Reg_model.ensemble_predictions(features)
+            if not premiums:
+                raise ModelUnavailable("Aucun modèle de régression disponible.")
+            pred = max(values[0] for values in premiums.values())
+            self.contributing_models = list(premiums)
         self.result = round(pred, 2)
 
+    def profile(self):
+        """
+        Retourne les caractéristiques de la prédiction sous forme de dictionnaire,
+        au format attendu par `build_features`.
+        """
+        return {
+            "age": self.age,
+            "sex": self.sex,
+            "weight": self.weight,
+            "size": self.size,
+            "children": self.children,
+            "smoker": self.smoker,
+            "region": self.region,
+        }
+
     def fr_transform(self):
         """
         Transforme les champs de la prédiction en leur équivalent français pour un affichage utilisateur.
@@ -239,3 +609,55 @@ class Prediction(models.Model):
                 self.region = "northeast"
             case "Nord Ouest":
                 self.region = "northwest"
+
+
+class ArchivedRecord(models.Model):
+    """
+    Trace d'une prédiction ou d'un rendez-vous archivé (voir `app.archive`).
+
+    La ligne complète est conservée dans un fichier JSONL compressé ; la trace
+    permet de retrouver ce fichier à partir de la clé d'origine, ou de lister les
+    archives d'un utilisateur, sans le relire.
+
+    Attributs :
+    -----------
+    kind : str
+        'prediction' ou 'appointment'.
+    object_id : int
+        Clé de la ligne d'origine.
+    user : ForeignKey
+        Utilisateur concerné (client de la prédiction ou du rendez-vous, nullable).
+    date : DateField
+        Date du rendez-vous, ou de dernière modification de la prédiction.
+    archive : str
+        Nom du fichier d'archive, relatif à `settings.ARCHIVE_DIR`.
+    archived_at : DateTimeField
+        Date de l'archivage.
+    """
+
+    KIND_CHOICES = (("prediction", "Prédiction"), ("appointment", "Rendez-vous"))
+
+    kind = models.CharField(max_length=11, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="archived_records",
+    )
+    date = models.DateField()
+    archive = models.CharField(max_length=255)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id"], name="unique_archived_record"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "kind", "date"], name="archived_user_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id} ({self.archive})"
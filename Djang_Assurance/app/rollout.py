@@ -0,0 +1,315 @@
+import logging
+import os
+import threading
+import time
+import cloudpickle
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.connection import ConnectionProxy
+from .models import Reg_model, ModelVersion, golden_features
+
+logger = logging.getLogger(__name__)
+
+# Cache partagé par tous les processus (voir `settings.CACHES`) : indique s'il existe
+# une version en préchauffage, pour que les fils de préchauffage n'interrogent pas
+# les modèles à chaque passage
+shared_cache = ConnectionProxy(caches, "shared")
+ROLLOUT_KEY = "app:staged-models"
+# Durée (s) de validité d'une absence de version en préchauffage dans le cache
+ROLLOUT_RECHECK_SECONDS = 60
+
+# Fil de préchauffage du processus courant (voir `start_prewarm_watcher`)
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+
+
+class RolloutError(Exception):
+    """
+    Levée lorsqu'une étape du déploiement d'une version de modèle échoue.
+    """
+
+
+def validate_artifact(reg_model, path, max_drift):
+    """
+    Vérifie qu'un fichier de modèle produit des primes exploitables sur le jeu de référence.
+
+    Paramètres :
+    ------------
+    reg_model : Reg_model
+        Modèle de régression dont le fichier est une nouvelle version.
+    path : str
+        Chemin du nouveau fichier sérialisé.
+    max_drift : float ou None
+        Écart relatif médian maximal toléré avec la version active (None : pas de contrôle).
+
+    Retourne :
+    ---------
+    ndarray
+        Les primes prédites par la nouvelle version sur le jeu de référence.
+
+    Exceptions :
+    ------------
+    RolloutError :
+        Si le fichier est illisible, si les primes sont invalides ou trop éloignées
+        de celles de la version active.
+    """
+    features = golden_features()
+    try:
+        with open(path, "rb") as f:
+            estimator = cloudpickle.load(f)
+        candidate = np.asarray(estimator.predict(features), dtype=float)
+    except Exception as error:
+        raise RolloutError(f"Le modèle '{path}' est inutilisable : {error}") from error
+
+    if candidate.shape != (len(features),):
+        raise RolloutError(f"Le modèle '{path}' ne renvoie pas une prime par profil.")
+    if not np.all(np.isfinite(candidate)) or np.any(candidate < 0):
+        raise RolloutError(f"Le modèle '{path}' renvoie des primes invalides.")
+
+    if max_drift is not None:
+        try:
+            current = np.asarray(reg_model.load_estimator().predict(features))
+        except Exception:
+            # Pas de version active exploitable : aucune référence de comparaison
+            return candidate
+        drift = np.median(np.abs(candidate - current) / np.maximum(np.abs(current), 1))
+        if drift > max_drift:
+            raise RolloutError(
+                f"Écart médian de {drift:.0%} avec la version active "
+                f"(maximum toléré : {max_drift:.0%})."
+            )
+    return candidate
+
+
+def register_version(reg_model, path, max_drift=0.5):
+    """
+    Valide une nouvelle version d'un modèle et la met en préchauffage.
+
+    L'incrément de `Reg_model.version` signale à tous les processus serveur qu'ils
+    doivent précharger la version : leur fil de préchauffage (`start_prewarm_watcher`)
+    le fait en arrière-plan, sans attendre de requête ni affecter le trafic.
+
+    Retourne :
+    ---------
+    ModelVersion
+        La version enregistrée, au statut 'staged'.
+    """
+    if not os.path.isfile(path):
+        raise RolloutError(f"Le fichier '{path}' n'existe pas.")
+    if reg_model.staged_path:
+        raise RolloutError(
+            f"Une version est déjà en préchauffage pour '{reg_model}' : "
+            f"{reg_model.staged_path}."
+        )
+    try:
+        validate_artifact(reg_model, path, max_drift)
+    except RolloutError:
+        ModelVersion.objects.create(reg_model=reg_model, path=path, status="rejected")
+        raise
+
+    with transaction.atomic():
+        version = ModelVersion.objects.create(reg_model=reg_model, path=path)
+        Reg_model.objects.filter(pk=reg_model.pk).update(
+            staged_path=path, version=F("version") + 1
+        )
+        transaction.on_commit(publish_rollouts)
+    return version
+
+
+def promote(reg_model, workers=1, timeout=120, poll_interval=0.5):
+    """
+    Met en service la version en préchauffage une fois chargée par `workers` processus.
+
+    La bascule est une seule mise à jour en base : chaque processus lit le nouveau
+    chemin à sa requête suivante et trouve le modèle déjà en mémoire.
+
+    Exceptions :
+    ------------
+    RolloutError :
+        S'il n'y a pas de version en préchauffage, ou si le préchauffage n'est pas
+        terminé avant `timeout` secondes (la version active reste alors en service).
+    """
+    if not reg_model.staged_path:
+        raise RolloutError(f"Aucune version en préchauffage pour '{reg_model}'.")
+    version = ModelVersion.objects.filter(
+        reg_model=reg_model, path=reg_model.staged_path, status="staged"
+    ).latest("created_at")
+
+    deadline = time.monotonic() + timeout
+    while (warmed := version.warmed_workers) < workers:
+        if time.monotonic() > deadline:
+            raise RolloutError(
+                f"Préchauffage incomplet : {warmed}/{workers} "
+                "processus prêts. La version active reste en service."
+            )
+        time.sleep(poll_interval)
+
+    with transaction.atomic():
+        updated = Reg_model.objects.filter(
+            pk=reg_model.pk, staged_path=version.path
+        ).update(
+            path=version.path,
+            previous_path=F("path"),
+            staged_path="",
+            version=F("version") + 1,
+        )
+        if not updated:
+            raise RolloutError("La version en préchauffage a changé entre-temps.")
+        ModelVersion.objects.filter(reg_model=reg_model, status="active").update(
+            status="retired"
+        )
+        version.status = "active"
+        version.activated_at = timezone.now()
+        version.save(update_fields=["status", "activated_at"])
+        transaction.on_commit(publish_rollouts)
+    return version
+
+
+def rollback(reg_model):
+    """
+    Revient immédiatement à la version précédente d'un modèle.
+
+    Les processus ont conservé la version précédente en mémoire : le retour arrière
+    ne provoque aucun rechargement.
+    """
+    if not reg_model.previous_path:
+        raise RolloutError(f"Aucune version précédente pour '{reg_model}'.")
+    with transaction.atomic():
+        Reg_model.objects.filter(pk=reg_model.pk).update(
+            path=F("previous_path"),
+            previous_path=F("path"),
+            version=F("version") + 1,
+        )
+        # Le même fichier a pu être déployé plusieurs fois : seule sa dernière mise
+        # en service est réactivée
+        previous = list(
+            ModelVersion.objects.filter(
+                reg_model=reg_model, path=reg_model.previous_path, status="retired"
+            )
+            .order_by("-activated_at")
+            .values_list("pk", flat=True)[:1]
+        )
+        ModelVersion.objects.filter(reg_model=reg_model, status="active").update(
+            status="retired"
+        )
+        ModelVersion.objects.filter(pk__in=previous).update(
+            status="active", activated_at=timezone.now()
+        )
+
+
+def cancel(reg_model):
+    """
+    Abandonne la version en préchauffage d'un modèle.
+    """
+    if not reg_model.staged_path:
+        raise RolloutError(f"Aucune version en préchauffage pour '{reg_model}'.")
+    with transaction.atomic():
+        ModelVersion.objects.filter(
+            reg_model=reg_model, path=reg_model.staged_path, status="staged"
+        ).update(status="rejected")
+        Reg_model.objects.filter(pk=reg_model.pk).update(
+            staged_path="", version=F("version") + 1
+        )
+        transaction.on_commit(publish_rollouts)
+
+
+def publish_rollouts():
+    """
+    Indique dans le cache partagé s'il existe une version en préchauffage.
+
+    Appelée après chaque enregistrement, mise en service ou abandon d'une version.
+    L'absence de version n'est conservée que `ROLLOUT_RECHECK_SECONDS` secondes : un
+    signalement perdu (deux déploiements simultanés) se corrige de lui-même.
+
+    Retourne :
+    ---------
+    bool
+        True s'il existe une version en préchauffage.
+    """
+    staged = Reg_model.objects.exclude(staged_path="").exists()
+    shared_cache.set(ROLLOUT_KEY, staged, None if staged else ROLLOUT_RECHECK_SECONDS)
+    return staged
+
+
+def prewarm_staged_versions():
+    """
+    Préchauffe dans le processus courant les versions en attente de tous les modèles.
+
+    Retourne :
+    ---------
+    int
+        Nombre de versions préchauffées par cet appel.
+    """
+    return sum(
+        reg_model.prewarm_staged()
+        for reg_model in Reg_model.objects.exclude(staged_path="")
+    )
+
+
+def poll_staged_versions():
+    """
+    Un passage du fil de préchauffage.
+
+    Les modèles ne sont interrogés que si le cache partagé signale une version en
+    préchauffage : hors déploiement, un passage se limite à une lecture du cache.
+
+    Retourne :
+    ---------
+    int
+        Nombre de versions préchauffées par cet appel.
+    """
+    staged = shared_cache.get(ROLLOUT_KEY)
+    if staged is None:
+        staged = Reg_model.objects.exclude(staged_path="").exists()
+        shared_cache.add(
+            ROLLOUT_KEY, staged, None if staged else ROLLOUT_RECHECK_SECONDS
+        )
+    if not staged:
+        return 0
+    return prewarm_staged_versions()
+
+
+def _watch(interval):
+    while True:
+        try:
+            poll_staged_versions()
+        except Exception:
+            logger.exception("Échec de la recherche des versions à préchauffer.")
+        finally:
+            close_old_connections()
+        time.sleep(interval)
+
+
+def start_prewarm_watcher(interval=None):
+    """
+    Démarre, une fois par processus, le fil qui préchauffe les versions en attente.
+
+    Le fil effectue un passage (`poll_staged_versions`) toutes les `interval`
+    secondes (par défaut `settings.MODEL_PREWARM_INTERVAL`). Il est lancé par les
+    points d'entrée du serveur (`asgi.py`, `wsgi.py`) lorsque
+    `settings.MODEL_PREWARM_WATCHER` est activé : seuls les processus qui servent le
+    trafic se déclarent prêts, et jamais les outils qui importent ces modules.
+
+    Retourne :
+    ---------
+    Thread ou None
+        Le fil de préchauffage, ou None s'il est désactivé.
+    """
+    global _WATCHER
+    if not settings.MODEL_PREWARM_WATCHER:
+        return None
+    with _WATCHER_LOCK:
+        if _WATCHER is not None and _WATCHER.is_alive():
+            return _WATCHER
+        _WATCHER = threading.Thread(
+            target=_watch,
+            args=(interval or settings.MODEL_PREWARM_INTERVAL,),
+            name="model-prewarm",
+            daemon=True,
+        )
+        _WATCHER.start()
+        return _WATCHER
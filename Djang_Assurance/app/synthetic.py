@@ -0,0 +1,86 @@
+"""
+Données synthétiques dont les distributions imitent le jeu de données d'assurance
+(âge 18-64, IMC centré sur 30, ~20 % de fumeurs).
+
+Elles servent à comparer les modèles (`manage.py model_leaderboard`) et à remplir la
+base pour les tests de charge (`manage.py generate_data`). Tous les tirages passent
+par le générateur fourni : à graine égale, les données sont identiques.
+"""
+
+import numpy as np
+import pandas as pd
+from .models import FEATURE_COLUMNS, SEX_CHOICES, REGION_CHOICES
+
+FIRST_NAMES = [
+    "Alice", "Camille", "Chloé", "Emma", "Inès", "Léa", "Louise", "Manon", "Sarah",
+    "Zoé", "Adam", "Arthur", "Gabriel", "Hugo", "Jules", "Louis", "Lucas", "Nathan",
+    "Paul", "Raphaël",
+]  # fmt: skip
+
+LAST_NAMES = [
+    "Bernard", "Bonnet", "Dubois", "Durand", "Fournier", "Garcia", "Girard",
+    "Lambert", "Laurent", "Lefebvre", "Leroy", "Martin", "Mercier", "Michel",
+    "Moreau", "Morel", "Petit", "Richard", "Robert", "Roux",
+]  # fmt: skip
+
+
+def synthetic_features(rows, rng):
+    """
+    Tire `rows` profils au format de `FEATURE_COLUMNS`.
+    """
+    data = pd.DataFrame(
+        {
+            "age": rng.integers(18, 65, rows),
+            "sex": rng.choice([value for value, _ in SEX_CHOICES], rows),
+            "bmi": np.clip(rng.normal(30.7, 6.1, rows), 16, 53).round(2),
+            "children": rng.choice(6, rows, p=[0.43, 0.24, 0.18, 0.12, 0.02, 0.01]),
+            "smoker": rng.choice(["yes", "no"], rows, p=[0.2, 0.8]),
+            "region": rng.choice([value for value, _ in REGION_CHOICES], rows),
+        }
+    )
+    return data[FEATURE_COLUMNS]
+
+
+def reference_charges(features, rng):
+    """
+    Primes de référence des profils : une approximation linéaire du jeu de données,
+    bruitée. Elles servent à comparer les modèles entre eux, pas à mesurer leur
+    précision absolue.
+    """
+    charges = (
+        -11938
+        + 257 * features["age"]
+        + 339 * features["bmi"]
+        + 475 * features["children"]
+        + 23848 * (features["smoker"] == "yes")
+        + rng.normal(0, 6000, len(features))
+    )
+    return np.maximum(charges, 1121).to_numpy()
+
+
+def synthetic_holdout(rows, seed):
+    """
+    Génère un jeu de test synthétique : (caractéristiques, primes de référence).
+    """
+    rng = np.random.default_rng(seed)
+    features = synthetic_features(rows, rng)
+    return features, reference_charges(features, rng)
+
+
+def synthetic_profiles(rows, rng):
+    """
+    Génère des profils au format de `Prediction` : la taille est tirée selon le
+    sexe, le poids est déduit de l'IMC, et la prime (`result`) est la prime de
+    référence.
+
+    Retourne :
+    ---------
+    DataFrame
+        Colonnes `FEATURE_COLUMNS`, plus `size`, `weight` et `result`.
+    """
+    data = synthetic_features(rows, rng).copy()
+    data["result"] = reference_charges(data, rng).round(2)
+    mean_size = np.where(data["sex"] == "male", 176, 163)
+    data["size"] = np.clip(rng.normal(mean_size, 7), 140, 210).round()
+    data["weight"] = (data["bmi"] * (data["size"] / 100) ** 2).round(1)
+    return data
@@ -1,3 +1,495 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time as clock
+from io import StringIO
+from datetime import date, time, timedelta
+from pathlib import Path
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from meetings.models import AgendaEvent, Appointment, BookedSlotMask, ReminderLog
+from meetings.utilization import utilization_report
+from user.models import ApiToken, CustomUser, StaffUser
+from .archive import archive_records, read_archived
+from .health import _BREAKERS, CircuitBreaker, get_breaker
+from .models import (
+    _ESTIMATORS,
+    _WARMING,
+    ArchivedRecord,
+    ModelVersion,
+    Prediction,
+    Reg_model,
+    WarmedWorker,
+    build_features,
+    worker_identity,
+)
+from .rollout import (
+    RolloutError,
+    cancel,
+    poll_staged_versions,
+    prewarm_staged_versions,
+    promote,
+    publish_rollouts,
+    register_version,
+    rollback,
+    start_prewarm_watcher,
+)
 
-# Create your tests here.
+
+class ArchiveTests(TestCase):
+    """
+    Archivage des rendez-vous anciens et relecture à la demande.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.enterContext(override_settings(ARCHIVE_DIR=Path(self.directory.name)))
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller", is_staff=True
+        )
+        self.staff_user = StaffUser.objects.get(user=adviser)
+        self.customer = CustomUser.objects.create_user(username="client")
+        self.first_day = date(2020, 1, 6)  # Un lundi
+        Appointment.objects.bulk_create(
+            Appointment(
+                user=self.customer,
+                staff_user=self.staff_user,
+                date=self.first_day + timedelta(weeks=index),
+                start_time=time(13),
+                end_time=time(14),
+            )
+            for index in range(12)
+        )
+
+    def test_old_appointments_are_archived_in_batches(self):
+        first = self.staff_user.appointments_with_staff.order_by("pk").first()
+        ReminderLog.objects.create(appointment=first, kind="24h", batch="test")
+
+        archived, name = archive_records(
+            "appointment", self.first_day + timedelta(weeks=10), batch_size=4
+        )
+        self.assertEqual(archived, 10)
+        self.assertEqual(self.staff_user.appointments_with_staff.count(), 2)
+        self.assertFalse(ReminderLog.objects.filter(appointment_id=first.pk).exists())
+        self.assertEqual(
+            set(ArchivedRecord.objects.values_list("archive", flat=True)), {name}
+        )
+
+        client = Client()
+        client.force_login(self.staff_user.user)
+        response = client.get(f"/predictions/unicorn/archives/appointment/{first.pk}/")
+        self.assertEqual(response.context["fields"]["date"], "2020-01-06")
+        self.assertEqual(response.context["fields"]["user_id"], self.customer.pk)
+
+    def test_archiving_refreshes_cached_reports(self):
+        report = utilization_report([self.staff_user], self.first_day, 1)
+        self.assertEqual(report["rows"][0]["total"]["appointments"], 1)
+        events = AgendaEvent.objects.count()
+
+        archive_records("appointment", self.first_day + timedelta(weeks=1))
+        report = utilization_report([self.staff_user], self.first_day, 1)
+        self.assertEqual(report["rows"][0]["total"]["appointments"], 0)
+        self.assertEqual(AgendaEvent.objects.count(), events)  # Pas une annulation
+
+    def test_archived_prediction_is_read_back(self):
+        prediction = Prediction.objects.create(
+            user_id=self.customer, made_by=self.customer, result=1234.5
+        )
+        Prediction.objects.filter(pk=prediction.pk).update(
+            updated_at=timezone.now() - timedelta(days=30)
+        )
+        archive_records("prediction", timezone.localdate())
+        record = ArchivedRecord.objects.get(kind="prediction", object_id=prediction.pk)
+        self.assertEqual(read_archived(record)["result"], 1234.5)
+        self.assertFalse(Prediction.objects.filter(pk=prediction.pk).exists())
+
+    def test_nothing_to_archive_writes_no_file(self):
+        self.assertEqual(archive_records("appointment", self.first_day), (0, None))
+        self.assertFalse(any(Path(self.directory.name).iterdir()))
+
+
+class GenerateDataTests(TestCase):
+    """
+    Génération de données synthétiques pour les tests de charge.
+    """
+
+    def test_generated_data_is_consistent(self):
+        call_command(
+            "generate_data",
+            users=50,
+            staff=3,
+            past_weeks=1,
+            future_weeks=1,
+            chunk_size=20,
+            stdout=StringIO(),
+        )
+        customers = CustomUser.objects.filter(
+            username__startswith="synth-", is_staff=False
+        )
+        self.assertEqual(customers.count(), 50)
+        self.assertEqual(Prediction.objects.filter(made_by__in=customers).count(), 50)
+        advisers = StaffUser.objects.filter(user__username__startswith="synth-")
+        self.assertEqual(advisers.count(), 3)
+        self.assertTrue(all(adviser.availabilities.exists() for adviser in advisers))
+
+        appointments = Appointment.objects.filter(staff_user__in=advisers)
+        self.assertTrue(appointments.exists())
+        self.assertEqual(
+            BookedSlotMask.objects.filter(staff_user__in=advisers).count(),
+            appointments.values("staff_user", "date").distinct().count(),
+        )
+
+
+@override_settings(QUOTE_API_RATE_LIMIT=(3, 60), QUOTE_API_MAX_BATCH=3)
+class QuoteApiTests(TestCase):
+    """
+    API JSON de devis : authentification par jeton, limite de débit, taille des lots
+    et réponse NDJSON en streaming.
+    """
+
+    url = "/predictions/api/quote/"
+    profile = {
+        "age": 30,
+        "sex": "female",
+        "weight": 65,
+        "size": 170,
+        "children": 1,
+        "smoker": "no",
+        "region": "northeast",
+    }
+
+    def setUp(self):
+        cache.clear()
+        user = CustomUser.objects.create_user(username="courtier")
+        self.token = ApiToken.objects.create(user=user, name="Courtier")
+
+    def post(self, payload, token=None, **headers):
+        token = self.token.key if token is None else token
+        return self.client.post(
+            self.url,
+            json.dumps(payload),
+            content_type="application/json",
+            headers={"Authorization": f"Token {token}", **headers},
+        )
+
+    def test_token_is_required(self):
+        response = self.client.post(
+            self.url, json.dumps(self.profile), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.post(self.profile, token="inconnu").status_code, 401)
+
+        self.token.is_active = False
+        self.token.save()
+        self.assertEqual(self.post(self.profile).status_code, 401)
+
+    def test_single_profile_is_quoted(self):
+        response = self.post(self.profile)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result["premium"], max(result["premiums"].values()))
+
+    def test_rate_limit(self):
+        for _ in range(3):
+            self.assertEqual(self.post(self.profile).status_code, 200)
+        response = self.post(self.profile)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    def test_batch_size_is_limited(self):
+        self.assertEqual(self.post([self.profile] * 4).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        response = self.post([self.profile, {"age": -1}, "profil"])
+        results = response.json()["results"]
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        self.assertIn("premium", results[0])
+        self.assertIn("age", results[1]["errors"])
+        self.assertIn("__all__", results[2]["errors"])
+
+    def test_ndjson_streaming(self):
+        response = self.post([self.profile, {"age": -1}], Accept="application/x-ndjson")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["index"] for line in lines], [0, 1])
+
+
+class EstimatorCacheTests(TestCase):
+    """
+    Cache des modèles désérialisés : une seule version en mémoire par fichier.
+    """
+
+    def test_replaced_file_evicts_previous_version(self):
+        reg_model = Reg_model.objects.get(name="lasso model")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "model.pkl")
+        with open(reg_model.path, "rb") as source, open(path, "wb") as copy:
+            copy.write(source.read())
+
+        reg_model.load_estimator(path)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        reg_model.load_estimator(path)
+        self.assertEqual(len([key for key in _ESTIMATORS if key[0] == path]), 1)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """
+    Transitions du disjoncteur : fermé, ouvert, semi-ouvert (un seul appel d'essai).
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("app.health.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            "test", failure_threshold=2, latency_threshold=1.0, cooldown=60
+        )
+
+    def open_circuit(self):
+        self.breaker.record_failure("erreur")
+        self.assertTrue(self.breaker.allow())  # Sous le seuil : toujours fermé
+        self.breaker.record_failure("erreur")
+        self.assertEqual(self.breaker.status, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_a_single_trial_through(self):
+        self.open_circuit()
+        self.now += 61
+        self.assertEqual(self.breaker.status, "half-open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # Essai en cours
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.status, "closed")
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_or_slow_trial_reopens_the_circuit(self):
+        self.open_circuit()
+        self.now += 61
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success(5.0)  # Trop lent : compte comme un échec
+        self.assertEqual(self.breaker.status, "open")
+        self.assertFalse(self.breaker.allow())
+
+        self.now += 61
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure("erreur")
+        self.assertFalse(self.breaker.allow())
+
+    def test_abandoned_trial_is_replaced_after_the_cooldown(self):
+        self.open_circuit()
+        self.now += 61
+        self.assertTrue(self.breaker.allow())
+        self.now += 61
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(
+    REG_MODEL_CIRCUIT_BREAKER={
+        "failure_threshold": 1,
+        "latency_threshold": 0.05,
+        "cooldown": 60,
+    }
+)
+class PredictionLatencyTests(TestCase):
+    """
+    Seule la prédiction est chronométrée par le disjoncteur, pas le chargement.
+    """
+
+    def test_slow_load_does_not_trip_the_breaker(self):
+        reg_model = Reg_model.objects.get(name="lasso model")
+        _BREAKERS.pop(reg_model.pk, None)
+        self.addCleanup(_BREAKERS.pop, reg_model.pk, None)
+        estimator = reg_model.load_estimator()
+
+        def slow_load(*args, **kwargs):
+            clock.sleep(0.1)
+            return estimator
+
+        features = build_features([QuoteApiTests.profile])
+        with mock.patch.object(Reg_model, "load_estimator", slow_load):
+            reg_model.calcul_predictions(features)
+        self.assertEqual(get_breaker(reg_model).status, "closed")
+
+
+class RolloutTests(TestCase):
+    """
+    Cycle de vie d'une version de modèle : validation, préchauffage, mise en service,
+    retour arrière et abandon.
+    """
+
+    def setUp(self):
+        self.reg_model = Reg_model.objects.get(name="lasso model")
+        self.active_path = self.reg_model.path
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "candidate.pkl")
+        with open(self.active_path, "rb") as source, open(self.path, "wb") as copy:
+            copy.write(source.read())
+        _WARMING.clear()
+        self.addCleanup(_WARMING.clear)
+
+    def register(self):
+        version = register_version(self.reg_model, self.path)
+        self.reg_model.refresh_from_db()
+        return version
+
+    def test_invalid_artifact_is_rejected(self):
+        broken = os.path.join(os.path.dirname(self.path), "broken.pkl")
+        Path(broken).write_bytes(b"pas un modele")
+        with self.assertRaises(RolloutError):
+            register_version(self.reg_model, broken)
+        self.reg_model.refresh_from_db()
+        self.assertEqual(self.reg_model.staged_path, "")
+        self.assertEqual(
+            ModelVersion.objects.get(reg_model=self.reg_model, path=broken).status,
+            "rejected",
+        )
+
+    def test_register_stages_a_single_version(self):
+        previous_version = self.reg_model.version
+        version = self.register()
+        self.assertEqual(version.status, "staged")
+        self.assertEqual(self.reg_model.staged_path, self.path)
+        self.assertEqual(self.reg_model.version, previous_version + 1)
+        with self.assertRaises(RolloutError):
+            register_version(self.reg_model, self.path)
+
+    def test_each_worker_is_counted_once(self):
+        version = self.register()
+        self.assertEqual(prewarm_staged_versions(), 1)
+        self.assertEqual(prewarm_staged_versions(), 0)  # Déjà préchauffée ici
+        _WARMING.clear()
+        self.reg_model.prewarm_staged()  # Même processus : pas de doublon
+        self.assertEqual(version.warmed_workers, 1)
+        host, boot_id = worker_identity()
+        worker = WarmedWorker.objects.get(version=version)
+        self.assertEqual((worker.host, worker.boot_id), (host, boot_id))
+
+    def test_workers_are_told_apart_by_host_and_boot(self):
+        version = self.register()
+        prewarm_staged_versions()
+        host, boot_id = worker_identity()
+        now = timezone.now()
+        WarmedWorker.objects.bulk_create(
+            [
+                # Même pid sur une autre instance, et processus redémarré ici
+                WarmedWorker(
+                    version=version,
+                    host="autre-hote",
+                    boot_id=boot_id,
+                    pid=os.getpid(),
+                    warmed_at=now,
+                ),
+                WarmedWorker(
+                    version=version,
+                    host=host,
+                    boot_id="redemarre",
+                    pid=os.getpid(),
+                    warmed_at=now,
+                ),
+            ]
+        )
+        self.assertEqual(version.warmed_workers, 3)
+
+    @override_settings(MODEL_PREWARM_INTERVAL=5)
+    def test_silent_workers_are_not_counted(self):
+        version = self.register()
+        prewarm_staged_versions()
+        WarmedWorker.objects.filter(version=version).update(
+            warmed_at=timezone.now() - timedelta(seconds=11)
+        )
+        self.assertEqual(version.warmed_workers, 0)
+        prewarm_staged_versions()  # Le processus se signale de nouveau
+        self.assertEqual(version.warmed_workers, 1)
+
+    def test_promote_waits_for_the_workers(self):
+        self.register()
+        prewarm_staged_versions()
+        with self.assertRaises(RolloutError):
+            promote(self.reg_model, workers=2, timeout=0, poll_interval=0.01)
+        self.reg_model.refresh_from_db()
+        self.assertEqual(self.reg_model.path, self.active_path)
+
+        version = promote(self.reg_model, workers=1, timeout=0)
+        self.reg_model.refresh_from_db()
+        self.assertEqual(version.status, "active")
+        self.assertEqual(self.reg_model.path, self.path)
+        self.assertEqual(self.reg_model.previous_path, self.active_path)
+        self.assertEqual(self.reg_model.staged_path, "")
+
+    def test_rollback_restores_the_previous_version(self):
+        self.register()
+        prewarm_staged_versions()
+        promote(self.reg_model, workers=1, timeout=0)
+        self.reg_model.refresh_from_db()
+
+        rollback(self.reg_model)
+        self.reg_model.refresh_from_db()
+        self.assertEqual(self.reg_model.path, self.active_path)
+        self.assertEqual(self.reg_model.previous_path, self.path)
+        self.assertEqual(
+            ModelVersion.objects.get(reg_model=self.reg_model, path=self.path).status,
+            "retired",
+        )
+
+    def test_rollback_reactivates_a_single_version(self):
+        other = os.path.join(os.path.dirname(self.path), "other.pkl")
+        Path(other).write_bytes(Path(self.path).read_bytes())
+        for path in (self.path, other, self.path):  # Même fichier déployé deux fois
+            register_version(self.reg_model, path)
+            self.reg_model.refresh_from_db()
+            prewarm_staged_versions()
+            promote(self.reg_model, workers=1, timeout=0)
+            self.reg_model.refresh_from_db()
+
+        rollback(self.reg_model)
+        self.reg_model.refresh_from_db()
+        rollback(self.reg_model)
+        self.reg_model.refresh_from_db()
+        self.assertEqual(self.reg_model.path, self.path)
+        active = ModelVersion.objects.get(reg_model=self.reg_model, status="active")
+        self.assertEqual(active.path, self.path)
+        self.assertEqual(
+            ModelVersion.objects.filter(
+                reg_model=self.reg_model, path=self.path, status="retired"
+            ).count(),
+            1,
+        )
+
+    def test_watcher_skips_the_models_without_rollout(self):
+        self.assertFalse(publish_rollouts())
+        with self.assertNumQueries(1):  # Lecture du cache partagé uniquement
+            self.assertEqual(poll_staged_versions(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.register()
+        self.assertEqual(poll_staged_versions(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            promote(self.reg_model, workers=1, timeout=0)
+        with self.assertNumQueries(1):
+            self.assertEqual(poll_staged_versions(), 0)
+
+    @override_settings(MODEL_PREWARM_WATCHER=False)
+    def test_watcher_is_disabled_by_the_setting(self):
+        self.assertIsNone(start_prewarm_watcher())
+
+    def test_cancel_rejects_the_staged_version(self):
+        version = self.register()
+        cancel(self.reg_model)
+        self.reg_model.refresh_from_db()
+        version.refresh_from_db()
+        self.assertEqual(version.status, "rejected")
+        self.assertEqual(self.reg_model.staged_path, "")
+        self.assertEqual(prewarm_staged_versions(), 0)
+        with self.assertRaises(RolloutError):
+            promote(self.reg_model, timeout=0)
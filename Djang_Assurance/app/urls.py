@@ -9,6 +9,11 @@ from .views import (
     PredictionUpdateView,
     UserCreatePredictionView,
     UserPredictionUpdateView,
+    QuoteApiView,
+    UserWhatIfView,
+    ModelHealthView,
+    ArchivedRecordListView,
+    ArchivedRecordView,
 )
 
 urlpatterns = [
@@ -26,6 +31,13 @@ urlpatterns = [
         PredictionDeleteView.as_view(),
         name="prediction_delete",
     ),
+    path("unicorn/models/health/", ModelHealthView.as_view(), name="model_health"),
+    path("unicorn/archives/", ArchivedRecordListView.as_view(), name="archives"),
+    path(
+        "unicorn/archives/<str:kind>/<int:object_id>/",
+        ArchivedRecordView.as_view(),
+        name="archived_record",
+    ),
     # Routes pour les prédictions liées à l'utilisateur
     path("prediction/", UserPredictionView.as_view(), name="user_prediction"),
     path("prediction/create/", UserCreatePredictionView.as_view(), name="user_create"),
@@ -35,4 +47,11 @@ urlpatterns = [
         UserPredictionUpdateView.as_view(),
         name="user_update",
     ),
+    path(
+        "prediction/result/<int:pk>/what-if/",
+        UserWhatIfView.as_view(),
+        name="user_what_if",
+    ),
+    # Route de l'API JSON de devis pour les partenaires
+    path("api/quote/", QuoteApiView.as_view(), name="api_quote"),
 ]
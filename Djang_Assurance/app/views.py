@@ -1,5 +1,11 @@
-from django.shortcuts import redirect
+import json
+import numpy as np
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import (
     DeleteView,
     CreateView,
@@ -9,10 +15,25 @@ from django.views.generic import (
     FormView,
     View,
 )
-from .forms import PredictionForm, UserPredictionForm, PredictionFilterForm
+from .forms import PredictionForm, UserPredictionForm, PredictionFilterForm, QuoteForm
 from django.contrib.auth.mixins import LoginRequiredMixin
-from user.permissions import StaffRequiredMixin, UserRequiredMixin
-from .models import Prediction
+from user.permissions import (
+    AsyncUserMixin,
+    StaffRequiredMixin,
+    UserRequiredMixin,
+    ApiTokenRequiredMixin,
+    RateLimitMixin,
+)
+from .models import (
+    ArchivedRecord,
+    Prediction,
+    Reg_model,
+    build_features,
+    build_feature_grid,
+)
+from .archive import read_archived
+from .health import ModelUnavailable, breaker_states
+from .inference import run_inference
 
 # Team Unicorn : Vues pour gérer les prédictions
 
@@ -37,7 +58,11 @@ class PredictionView(LoginRequiredMixin, StaffRequiredMixin, CreateView):
         """
         self.object = form.save(commit=False)  # Enregistre l'objet sans le valider.
         self.object.made_by_staff = True
-        self.object.pred()  # Calcule le résultat de la prédiction.
+        try:
+            self.object.pred()  # Calcule le résultat de la prédiction.
+        except ModelUnavailable as error:
+            form.add_error(None, str(error))
+            return self.form_invalid(form)
         self.object.fr_transform()  # Localise certains champs (ex. : sexe, fumeur).
         self.object.made_by = self.request.user
         self.object.save()  # Enregistre l'objet dans la base de données.
@@ -67,7 +92,11 @@ class PredictionUpdateView(LoginRequiredMixin, StaffRequiredMixin, UpdateView):
         """
         self.object = form.save(commit=False)  # Enregistre l'objet sans le valider.
         self.object.made_by_staff = True
-        self.object.pred()  # Calcule le résultat de la prédiction.
+        try:
+            self.object.pred()  # Calcule le résultat de la prédiction.
+        except ModelUnavailable as error:
+            form.add_error(None, str(error))
+            return self.form_invalid(form)
         self.object.fr_transform()  # Localise certains champs (ex. : sexe, fumeur).
         self.object.made_by = self.request.user
         self.object.save()  # Enregistre l'objet dans la base de données.
@@ -179,6 +208,79 @@ class ResultView(LoginRequiredMixin, StaffRequiredMixin, DetailView):
     template_name = "app/result.html"
     context_object_name = "prediction"  # Utilise 'prediction' comme variable de contexte dans le template.
 
+    def get(self, request, *args, **kwargs):
+        """
+        Affiche la prédiction, ou sa version archivée si elle a été archivée.
+        """
+        try:
+            return super().get(request, *args, **kwargs)
+        except Http404:
+            if ArchivedRecord.objects.filter(
+                kind="prediction", object_id=kwargs["pk"]
+            ).exists():
+                return redirect(
+                    "archived_record", kind="prediction", object_id=kwargs["pk"]
+                )
+            raise
+
+
+class ArchivedRecordListView(LoginRequiredMixin, StaffRequiredMixin, ListView):
+    """
+    Liste les traces des lignes archivées (voir `app.archive`), filtrables par type
+    (`?kind=`) et par nom d'utilisateur (`?user=`).
+    """
+
+    model = ArchivedRecord
+    template_name = "app/archives.html"
+    context_object_name = "records"
+    paginate_by = 50
+
+    def get_queryset(self):
+        queryset = ArchivedRecord.objects.select_related("user").order_by(
+            "-date", "-object_id"
+        )
+        if kind := self.request.GET.get("kind"):
+            queryset = queryset.filter(kind=kind)
+        if user := self.request.GET.get("user"):
+            queryset = queryset.filter(user__username=user)
+        return queryset
+
+
+class ArchivedRecordView(LoginRequiredMixin, StaffRequiredMixin, DetailView):
+    """
+    Affiche une ligne archivée, relue à la demande dans son fichier d'archive.
+    """
+
+    template_name = "app/archived_record.html"
+    context_object_name = "record"
+
+    def get_object(self, queryset=None):
+        return get_object_or_404(
+            ArchivedRecord.objects.select_related("user"),
+            kind=self.kwargs["kind"],
+            object_id=self.kwargs["object_id"],
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            fields = read_archived(self.object)
+        except FileNotFoundError:
+            raise Http404("Fichier d'archive introuvable.")
+        if fields is None:
+            raise Http404("Ligne absente du fichier d'archive.")
+        context["fields"] = fields
+        return context
+
+
+class ModelHealthView(LoginRequiredMixin, StaffRequiredMixin, View):
+    """
+    Renvoie en JSON l'état des disjoncteurs des modèles de régression du processus.
+    """
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({"models": breaker_states()})
+
 
 # Vues pour les prédictions spécifiques aux utilisateurs
 
@@ -218,7 +320,11 @@ class UserCreatePredictionView(LoginRequiredMixin, UserRequiredMixin, CreateView
         - Enregistre l'objet et redirige vers la vue de résultat utilisateur.
         """
         self.object = form.save(commit=False)  # Enregistre l'objet sans le valider.
-        self.object.pred()  # Calcule le résultat de la prédiction.
+        try:
+            self.object.pred()  # Calcule le résultat de la prédiction.
+        except ModelUnavailable as error:
+            form.add_error(None, str(error))
+            return self.form_invalid(form)
         self.object.fr_transform()  # Localise certains champs (ex. : sexe, fumeur).
         self.object.user_id = self.request.user
         self.object.made_by = self.request.user
@@ -229,15 +335,69 @@ class UserCreatePredictionView(LoginRequiredMixin, UserRequiredMixin, CreateView
         )  # Redirige vers la page de résultat utilisateur.
 
 
-class UserResultView(LoginRequiredMixin, UserRequiredMixin, DetailView):
+class UserResultView(AsyncUserMixin, LoginRequiredMixin, UserRequiredMixin, DetailView):
     """
     Affiche les détails d'un objet Prediction créé par un utilisateur.
+
+    Vue asynchrone : la prédiction est lue avec l'ORM asynchrone.
     """
 
     model = Prediction
     template_name = "app/user_result.html"
     context_object_name = "prediction"  # Utilise 'prediction' comme variable de contexte dans le template.
 
+    async def get(self, request, *args, **kwargs):
+        self.object = await aget_object_or_404(self.get_queryset(), pk=kwargs["pk"])
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class UserWhatIfView(AsyncUserMixin, LoginRequiredMixin, UserRequiredMixin, DetailView):
+    """
+    Renvoie en JSON l'évolution de la prime de l'utilisateur lorsqu'un seul
+    paramètre de son profil varie (âge, IMC ou statut de fumeur).
+
+    Toute la grille est chiffrée en un seul appel `predict` par modèle de régression.
+    La prime retenue pour chaque point est, comme pour le devis, la plus élevée.
+
+    Vue asynchrone : la prédiction et les modèles sont lus avec l'ORM asynchrone, et
+    le calcul est confié au pool de prédiction (`app.inference`).
+    """
+
+    model = Prediction
+    grids = {
+        "age": np.arange(18, 81),
+        "bmi": np.arange(16, 45.5, 0.5),
+        "smoker": np.array(["no", "yes"], dtype=object),
+    }
+
+    def get_queryset(self):
+        # Un utilisateur ne peut explorer que ses propres prédictions
+        return super().get_queryset().filter(user_id=self.request.user)
+
+    async def get(self, request, *args, **kwargs):
+        parameter = request.GET.get("parameter", "age")
+        if parameter not in self.grids:
+            raise Http404("Paramètre inconnu.")
+        prediction = await aget_object_or_404(self.get_queryset(), pk=kwargs["pk"])
+        prediction.en_transform()  # Les champs sont stockés en français
+        models = [model async for model in Reg_model.objects.all()]
+
+        values = self.grids[parameter]
+        features = build_feature_grid(prediction.profile(), parameter, values)
+        premiums = await run_inference(Reg_model.ensemble_predictions, features, models)
+        curve = np.max(list(premiums.values()), axis=0) if premiums else values[:0]
+        return JsonResponse(
+            {
+                "parameter": parameter,
+                "values": values.tolist(),
+                "premiums": {
+                    name: np.round(model_premiums, 2).tolist()
+                    for name, model_premiums in premiums.items()
+                },
+                "premium": np.round(curve, 2).tolist(),
+            }
+        )
+
 
 class UserPredictionUpdateView(LoginRequiredMixin, UserRequiredMixin, UpdateView):
     """
@@ -258,7 +418,11 @@ class UserPredictionUpdateView(LoginRequiredMixin, UserRequiredMixin, UpdateView
         - Enregistre l'objet et redirige vers la vue de résultat utilisateur.
         """
         self.object = form.save(commit=False)  # Enregistre l'objet sans le valider.
-        self.object.pred()  # Calcule le résultat de la prédiction.
+        try:
+            self.object.pred()  # Calcule le résultat de la prédiction.
+        except ModelUnavailable as error:
+            form.add_error(None, str(error))
+            return self.form_invalid(form)
         self.object.fr_transform()  # Localise certains champs (ex. : sexe, fumeur).
         self.object.made_by = self.request.user
         self.object.user_id = self.request.user
@@ -267,3 +431,98 @@ class UserPredictionUpdateView(LoginRequiredMixin, UserRequiredMixin, UpdateView
         return redirect(
             "user_result", pk=prediction_id
         )  # Redirige vers la page de résultat utilisateur.
+
+
+# Vues de l'API JSON de devis pour les partenaires
+
+
+def quote_profiles(profiles, chunk_size):
+    """
+    Valide et chiffre une liste de profils, lot par lot.
+
+    Chaque lot est transmis en un seul appel `predict` à chaque modèle de régression.
+
+    Paramètres :
+    ------------
+    profiles : list
+        Profils reçus par l'API (dictionnaires).
+    chunk_size : int
+        Nombre de profils transmis aux modèles à chaque appel.
+
+    Retourne :
+    ---------
+    generator
+        Un résultat par profil, dans l'ordre de la requête : les primes par modèle
+        et la prime retenue (la plus élevée), ou les erreurs de validation.
+    """
+    for start in range(0, len(profiles), chunk_size):
+        results = []
+        valid = []
+        for index, profile in enumerate(profiles[start : start + chunk_size], start):
+            if not isinstance(profile, dict):
+                error = {
+                    "message": "Un profil doit être un objet JSON.",
+                    "code": "invalid",
+                }
+                results.append({"index": index, "errors": {"__all__": [error]}})
+                continue
+            form = QuoteForm(data=profile)
+            if form.is_valid():
+                result = {"index": index}
+                valid.append((result, form.cleaned_data))
+            else:
+                result = {"index": index, "errors": form.errors.get_json_data()}
+            results.append(result)
+
+        if valid:
+            features = build_features([cleaned_data for _, cleaned_data in valid])
+            premiums = Reg_model.ensemble_predictions(features)
+            for row, (result, _) in enumerate(valid):
+                result["premiums"] = {
+                    name: round(float(values[row]), 2)
+                    for name, values in premiums.items()
+                }
+                result["premium"] = max(result["premiums"].values(), default=None)
+        yield from results
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class QuoteApiView(ApiTokenRequiredMixin, RateLimitMixin, View):
+    """
+    API JSON permettant aux courtiers partenaires de chiffrer un ou plusieurs profils.
+
+    Le corps de la requête est soit un profil (objet JSON), soit un lot (tableau JSON).
+    Avec l'en-tête `Accept: application/x-ndjson`, les résultats sont renvoyés en
+    streaming, une ligne JSON par profil.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse(
+                {"error": "Le corps de la requête doit être du JSON."}, status=400
+            )
+
+        batch = isinstance(payload, list)
+        profiles = payload if batch else [payload]
+        if not profiles:
+            return JsonResponse({"error": "Aucun profil à chiffrer."}, status=400)
+        if len(profiles) > settings.QUOTE_API_MAX_BATCH:
+            return JsonResponse(
+                {
+                    "error": f"Un lot est limité à {settings.QUOTE_API_MAX_BATCH} profils."
+                },
+                status=400,
+            )
+
+        results = quote_profiles(profiles, settings.QUOTE_API_CHUNK_SIZE)
+        if "application/x-ndjson" in request.headers.get("Accept", ""):
+            return StreamingHttpResponse(
+                (json.dumps(result) + "\n" for result in results),
+                content_type="application/x-ndjson",
+            )
+        if batch:
+            return JsonResponse({"results": list(results)})
+        result = next(results)
+        return JsonResponse(result, status=400 if "errors" in result else 200)
@@ -9,4 +9,7 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 
 # Apply any outstanding database migrations
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+# Create the table of the "shared" cache (see CACHES in settings.py)
+python manage.py createcachetable
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+Agenda d'équipe : une semaine (ou plusieurs) de tous les conseillers côte à côte.
+
+Les données sont lues dans l'index de créneaux (`meetings.slots`) en deux requêtes,
+quel que soit le nombre de conseillers : masques hebdomadaires de tous les
+conseillers, puis masques réservés de la période. Elles sont rangées par colonnes
+(un tableau d'états horaires par conseiller et par jour).
+
+Chaque semaine d'un conseiller est rendue en un fragment HTML mis en cache sous une
+empreinte des masques dont il est issu : seul le fragment d'une semaine modifiée est
+recalculé, et une modification faite par un autre processus, une commande ou une
+insertion groupée est prise en compte dès la requête suivante.
+
+L'agenda personnel d'un conseiller est construit par `week_grid` : des lignes
+prêtes à afficher (en-têtes, libellés et classes CSS des cellules calculés une fois)
+que le template parcourt sans filtre ni recherche. Il est validé par
+ETag/Last-Modified (`agenda_validators`), et ses lignes journalières sont mises en
+cache sous une empreinte de leur contenu (`render_day_rows`).
+"""
+
+import hashlib
+from datetime import time, timedelta
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from user.models import StaffUser
+from .models import Appointment, Availability, WeeklySlotMask, BookedSlotMask
+from .slots import booking_mask, slot_index, slot_minutes
+
+HOURS = range(9, 19)  # Créneaux de 9h à 18h
+
+# Durée de conservation des fragments : leurs clés changent avec leur contenu, elle ne
+# sert qu'à libérer les fragments qui ne sont plus demandés
+FRAGMENT_TIMEOUT = 7 * 24 * 3600
+
+# Classes CSS des cellules de l'agenda personnel, par état
+CELL_CLASSES = {
+    "free": "bg-green-200 text-green-800",
+    "booked": "bg-red-200 text-red-800",
+}
+
+
+def week_start(value):
+    """
+    Retourne le lundi de la semaine contenant la date `value`.
+    """
+    return value - timedelta(days=value.weekday())
+
+
+def _hour_mask(hour):
+    """
+    Masque des créneaux de l'index compris dans l'heure `hour`.
+    """
+    first = slot_index(time(hour))
+    count = max(60 // slot_minutes(), 1)
+    return ((1 << count) - 1) << first
+
+
+def day_column(available, booked):
+    """
+    Calcule les états horaires d'une journée à partir des masques de l'index.
+
+    Retourne :
+    ---------
+    dict
+        `hours` : liste d'états ("", "free" ou "booked") pour chaque heure de `HOURS`,
+        `free` et `booked` : nombre d'heures libres et occupées.
+    """
+    hours = []
+    for hour in HOURS:
+        mask = _hour_mask(hour)
+        if booked & mask:
+            hours.append("booked")
+        elif available & mask:
+            hours.append("free")
+        else:
+            hours.append("")
+    return {
+        "hours": hours,
+        "free": hours.count("free"),
+        "booked": hours.count("booked"),
+    }
+
+
+def team_agenda(staff_users, first_week, weeks):
+    """
+    Construit les lignes de l'agenda d'équipe.
+
+    Paramètres :
+    ------------
+    staff_users : list
+        Conseillers à afficher (avec `user` déjà chargé).
+    first_week : date
+        Lundi de la première semaine affichée.
+    weeks : int
+        Nombre de semaines affichées.
+
+    Retourne :
+    ---------
+    list
+        Une ligne par conseiller : {"staff_user": ..., "weeks": [fragment HTML, ...]}.
+    """
+    week_starts = [first_week + timedelta(weeks=index) for index in range(weeks)]
+    weekly, booked = _index_masks(
+        [staff_user.pk for staff_user in staff_users],
+        first_week,
+        week_starts[-1] + timedelta(days=6),
+    )
+
+    # Clés des fragments : empreinte des masques lus en base, identique dans tous
+    # les processus et changeant avec l'index lui-même
+    masks, keys = {}, {}
+    for staff_user in staff_users:
+        for week in week_starts:
+            days = [
+                (
+                    weekly.get((staff_user.pk, offset), 0),
+                    booked.get((staff_user.pk, week + timedelta(days=offset)), 0),
+                )
+                for offset in range(7)
+            ]
+            digest = hashlib.md5(
+                f"{slot_minutes()}:{days}".encode(), usedforsecurity=False
+            ).hexdigest()
+            masks[(staff_user.pk, week)] = days
+            keys[(staff_user.pk, week)] = f"meetings:team-agenda:{digest}"
+    fragments = cache.get_many(set(keys.values()))
+
+    rendered = {
+        keys[slot]: render_to_string(
+            "meetings/team_agenda_week.html",
+            {"days": [day_column(*day) for day in days]},
+        )
+        for slot, days in masks.items()
+        if keys[slot] not in fragments
+    }
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+
+    return [
+        {
+            "staff_user": staff_user,
+            "weeks": [
+                mark_safe(fragments[keys[(staff_user.pk, week)]])
+                for week in week_starts
+            ],
+        }
+        for staff_user in staff_users
+    ]
+
+
+def _index_masks(staff_ids, first_day, last_day):
+    """
+    Lit les masques de l'index de créneaux des conseillers, en deux requêtes.
+
+    Retourne :
+    ---------
+    tuple
+        (masques hebdomadaires par (conseiller, jour de la semaine), masques
+        réservés par (conseiller, date) entre `first_day` et `last_day`).
+    """
+    weekly = {
+        (pk, day): int(mask, 16)
+        for pk, day, mask in WeeklySlotMask.objects.filter(
+            staff_user_id__in=staff_ids
+        ).values_list("staff_user_id", "day_of_week", "mask")
+    }
+    booked = {
+        (pk, date): int(mask, 16)
+        for pk, date, mask in BookedSlotMask.objects.filter(
+            staff_user_id__in=staff_ids, date__range=[first_day, last_day]
+        ).values_list("staff_user_id", "date", "mask")
+    }
+    return weekly, booked
+
+
+def week_grid(week_start_date, availability_masks, appointments):
+    """
+    Construit la grille de l'agenda hebdomadaire d'un membre du personnel.
+
+    Un rendez-vous occupe toutes les heures qu'il chevauche, quelle que soit sa durée.
+
+    Paramètres :
+    ------------
+    week_start_date : date
+        Lundi de la semaine affichée.
+    availability_masks : dict
+        Masques des disponibilités par jour de la semaine (`slots.weekly_masks`).
+    appointments : iterable
+        Des tuples (date, heure de début, heure de fin, libellé).
+
+    Retourne :
+    ---------
+    dict
+        `headers` : libellés des heures ; `rows` : une ligne par jour
+        {"day_name", "date", "cells"}, chaque cellule étant {"label", "css"}.
+    """
+    hour_masks = [_hour_mask(hour) for hour in HOURS]
+    free_cell = {"label": "Disponible", "css": CELL_CLASSES["free"]}
+    empty_cell = {"label": "", "css": ""}
+
+    # Libellé du rendez-vous occupant chaque (date, heure)
+    booked = {}
+    for date, start_time, end_time, label in appointments:
+        occupied = booking_mask(start_time, end_time)
+        for hour, mask in zip(HOURS, hour_masks):
+            if occupied & mask:
+                booked.setdefault((date, hour), label)
+
+    rows = []
+    for day, day_name in Availability.DAYS_OF_WEEK:
+        date = week_start_date + timedelta(days=day)
+        day_mask = availability_masks.get(day, 0)
+        cells = []
+        for hour, mask in zip(HOURS, hour_masks):
+            label = booked.get((date, hour))
+            if label:
+                cells.append({"label": label, "css": CELL_CLASSES["booked"]})
+            elif day_mask & mask:
+                cells.append(free_cell)
+            else:
+                cells.append(empty_cell)
+        rows.append({"day_name": day_name, "date": date, "cells": cells})
+
+    return {"headers": [f"{hour}:00" for hour in HOURS], "rows": rows}
+
+
+def _aggregate(queryset, expression):
+    """
+    Sous-requête scalaire d'un agrégat sur les lignes d'un membre du personnel.
+    """
+    return Subquery(
+        queryset.filter(staff_user=OuterRef("pk"))
+        .order_by()
+        .values("staff_user")
+        .annotate(value=expression)
+        .values("value")
+    )
+
+
+def agenda_validators(staff_user_id, first_day, last_day):
+    """
+    Calcule l'ETag et la date de dernière modification de l'agenda d'un membre du
+    personnel entre deux dates, en une seule requête d'agrégats.
+
+    Le nombre de lignes entre dans l'ETag : une suppression, qui ne laisse pas de
+    date de modification, change donc aussi l'ETag.
+
+    Retourne :
+    ---------
+    tuple
+        (ETag entre guillemets, datetime de dernière modification ou None).
+    """
+    appointments = Appointment.objects.filter(date__range=[first_day, last_day])
+    row = (
+        StaffUser.objects.filter(pk=staff_user_id)
+        .annotate(
+            appointments_updated=_aggregate(appointments, Max("updated_at")),
+            appointments_count=Coalesce(_aggregate(appointments, Count("pk")), 0),
+            availabilities_updated=_aggregate(
+                Availability.objects.all(), Max("updated_at")
+            ),
+            availabilities_count=Coalesce(
+                _aggregate(Availability.objects.all(), Count("pk")), 0
+            ),
+        )
+        .values_list(
+            "appointments_updated",
+            "appointments_count",
+            "availabilities_updated",
+            "availabilities_count",
+        )
+        .get()
+    )
+    digest = hashlib.md5(
+        f"{staff_user_id}:{first_day}:{row}".encode(), usedforsecurity=False
+    ).hexdigest()
+    updates = [value for value in (row[0], row[2]) if value is not None]
+    return f'"{digest}"', max(updates, default=None)
+
+
+def render_day_rows(staff_user_id, agenda):
+    """
+    Rend les lignes journalières de l'agenda d'un membre du personnel.
+
+    Chaque ligne est mise en cache sous une empreinte de son contenu : après une
+    réservation, seule la ligne du jour concerné est rendue de nouveau.
+
+    Paramètres :
+    ------------
+    agenda : list
+        Lignes de l'agenda construites par `week_grid`.
+
+    Retourne :
+    ---------
+    list
+        Les fragments HTML des lignes, dans l'ordre.
+    """
+    keys = []
+    for row in agenda:
+        digest = hashlib.md5(repr(row).encode(), usedforsecurity=False).hexdigest()
+        keys.append(f"meetings:agenda-day:{staff_user_id}:{digest}")
+    fragments = cache.get_many(keys)
+
+    rendered = {
+        key: render_to_string("meetings/agenda_day_row.html", {"row": row})
+        for key, row in zip(keys, agenda)
+        if key not in fragments
+    }
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+    return [mark_safe(fragments[key]) for key in keys]
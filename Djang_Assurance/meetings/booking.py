@@ -0,0 +1,123 @@
+"""
+Réservation des créneaux sans double réservation.
+
+La base de données arbitre les réservations concurrentes : la contrainte d'unicité
+de `Appointment` (membre du personnel, date, heure de début) et celle de
+`BookedSlotMask` (membre du personnel, date) font échouer la seconde écriture.
+Aucun verrou de table n'est pris : une transaction perdante est annulée, puis
+soit le créneau est signalé comme pris, soit la réservation est retentée.
+
+Les rendez-vous ont une durée variable : les chevauchements sont détectés avec
+l'index d'intervalles de la journée (`meetings.intervals`).
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, transaction
+from .intervals import IntervalIndex
+from .models import Appointment
+
+
+class SlotTaken(Exception):
+    """
+    Levée lorsque le créneau demandé a été réservé par quelqu'un d'autre.
+    """
+
+
+def end_time_for(start_time, minutes=60):
+    """
+    Retourne l'heure de fin d'un rendez-vous de `minutes` minutes commençant à
+    `start_time`, ou None s'il déborderait sur le lendemain.
+    """
+    start = datetime.combine(datetime.today(), start_time)
+    end = start + timedelta(minutes=minutes)
+    return end.time() if end.date() == start.date() and end > start else None
+
+
+def book_appointment(user, staff_user, date, start_time, end_time=None, attempts=3):
+    """
+    Réserve un créneau de façon atomique.
+
+    Paramètres :
+    ------------
+    user : CustomUser
+        Client qui prend le rendez-vous.
+    staff_user : StaffUser
+        Membre du personnel concerné.
+    date : date
+        Date du rendez-vous.
+    start_time : time
+        Heure de début du rendez-vous.
+    end_time : time, optionnel
+        Heure de fin (par défaut : une heure après le début).
+    attempts : int
+        Nombre de tentatives en cas de conflit d'écriture transitoire.
+
+    Retourne :
+    ---------
+    Appointment
+        Le rendez-vous créé.
+
+    Exceptions :
+    ------------
+    SlotTaken :
+        Si le créneau est déjà réservé, ou l'a été par une requête concurrente.
+    ValidationError :
+        Si le créneau est en dehors des disponibilités du membre du personnel, ou
+        si l'heure de fin ne suit pas l'heure de début.
+    """
+    appointment = Appointment(
+        user=user,
+        staff_user=staff_user,
+        date=date,
+        start_time=start_time,
+        end_time=end_time or end_time_for(start_time),
+    )
+
+    end_time = appointment.end_time
+
+    for attempt in range(1, attempts + 1):
+        try:
+            # Vérification préalable (disponibilités, chevauchements) : évite la
+            # plupart des écritures vouées à l'échec, sans rien garantir.
+            appointment.clean()
+        except ValidationError as error:
+            if IntervalIndex.for_day(staff_user.pk, date).overlaps(
+                start_time, end_time
+            ):
+                raise SlotTaken("Ce créneau est déjà réservé.") from error
+            raise
+
+        try:
+            with transaction.atomic():
+                appointment.save()
+                # L'enregistrement a verrouillé l'index des créneaux du jour : un
+                # rendez-vous concurrent de même début a échoué sur la contrainte
+                # d'unicité, un rendez-vous de début différent est visible ici.
+                index = IntervalIndex.for_day(
+                    staff_user.pk, date, exclude_pk=appointment.pk
+                )
+                if index.overlaps(start_time, end_time):
+                    raise SlotTaken("Ce créneau est déjà réservé.")
+            return appointment
+        except SlotTaken:
+            appointment.pk = None
+            raise
+        except IntegrityError as error:
+            appointment.pk = None
+            # Une réservation concurrente a été validée avant la nôtre
+            if IntervalIndex.for_day(staff_user.pk, date).overlaps(
+                start_time, end_time
+            ):
+                raise SlotTaken("Ce créneau est déjà réservé.") from error
+            # Conflit sur l'index de créneaux avec une autre réservation du même jour
+            if attempt == attempts:
+                raise
+        except OperationalError:
+            # Base momentanément verrouillée ou transaction sérialisée annulée
+            appointment.pk = None
+            if attempt == attempts:
+                raise
+        time.sleep(random.uniform(0, 0.05 * attempt))
@@ -0,0 +1,130 @@
+"""
+Mises en attente temporaires des créneaux pendant la prise de rendez-vous.
+
+Quand un client choisit un créneau, celui-ci lui est réservé pendant
+`settings.MEETINGS_SLOT_HOLD_SECONDS` secondes : il disparaît des créneaux libres
+proposés aux autres clients jusqu'à la confirmation du rendez-vous ou l'expiration
+de la mise en attente.
+
+Les mises en attente sont stockées dans le cache partagé par tous les processus
+serveur (cache "shared", en base, voir `settings.CACHES`), une clé par créneau
+couvert par le rendez-vous (un rendez-vous de 90 minutes en retient plusieurs),
+expirée par le cache lui-même. `cache.add` est atomique (clé primaire de la table),
+deux clients ne peuvent donc pas obtenir le même créneau, même s'ils sont servis
+par deux processus différents.
+"""
+
+import time
+from django.conf import settings
+from .slots import booking_mask, mask_slots, shared_cache
+
+
+def hold_seconds():
+    """
+    Retourne la durée d'une mise en attente, en secondes.
+    """
+    return settings.MEETINGS_SLOT_HOLD_SECONDS
+
+
+def hold_key(staff_user_id, date, start_time):
+    return f"meetings:hold:{staff_user_id}:{date:%Y-%m-%d}:{start_time:%H%M}"
+
+
+def _user_key(user_id):
+    return f"meetings:hold:user:{user_id}"
+
+
+def covered_slots(start_time, end_time):
+    """
+    Retourne les heures de début des créneaux touchés par un rendez-vous
+    [start_time, end_time[ : ce sont eux qui sont mis en attente.
+    """
+    return mask_slots(booking_mask(start_time, end_time))
+
+
+def take_hold(user, staff_user_id, date, start_time, end_time):
+    """
+    Met en attente, pour un client, tous les créneaux couverts par un rendez-vous.
+
+    Chaque créneau est pris par `cache.add` ; si l'un d'eux est déjà en attente pour
+    un autre client, ceux pris par cet appel sont libérés et rien n'est retenu.
+    Un client ne garde qu'une mise en attente à la fois : la précédente est libérée.
+    Reprendre des créneaux déjà en attente pour le même client en prolonge la durée.
+
+    Retourne :
+    ---------
+    float ou None
+        L'horodatage d'expiration de la mise en attente, ou None si l'un des
+        créneaux est déjà en attente pour un autre client.
+    """
+    keys = [
+        hold_key(staff_user_id, date, slot)
+        for slot in covered_slots(start_time, end_time)
+    ]
+    expires_at = time.time() + hold_seconds()
+    taken = []
+    for key in keys:
+        if shared_cache.add(key, (user.pk, expires_at), hold_seconds()):
+            taken.append(key)
+        elif (shared_cache.get(key) or (None,))[0] == user.pk:
+            shared_cache.set(key, (user.pk, expires_at), hold_seconds())
+        else:
+            shared_cache.delete_many(taken)
+            return None
+
+    previous = shared_cache.get(_user_key(user.pk)) or []
+    _release([key for key in previous if key not in keys], user.pk)
+    shared_cache.set(_user_key(user.pk), keys, hold_seconds())
+    return expires_at
+
+
+def holder(staff_user_id, date, start_time):
+    """
+    Retourne la clé du client qui détient la mise en attente du créneau, ou None.
+    """
+    current = shared_cache.get(hold_key(staff_user_id, date, start_time))
+    return current[0] if current else None
+
+
+def held_by_others(user, slots):
+    """
+    Filtre les créneaux en attente pour d'autres clients.
+
+    Paramètres :
+    ------------
+    user : CustomUser
+        Client qui consulte les créneaux.
+    slots : iterable
+        Des tuples (clé du membre du personnel, date, heure de début).
+
+    Retourne :
+    ---------
+    set
+        Les tuples de `slots` en attente pour un autre client (une seule lecture du cache).
+    """
+    keys = {hold_key(*slot): slot for slot in slots}
+    return {
+        keys[key]
+        for key, (user_id, _) in shared_cache.get_many(list(keys)).items()
+        if user_id != user.pk
+    }
+
+
+def release_hold(user, staff_user_id, date, start_time, end_time):
+    """
+    Libère les créneaux d'un rendez-vous mis en attente, s'ils appartiennent au client.
+    """
+    keys = [
+        hold_key(staff_user_id, date, slot)
+        for slot in covered_slots(start_time, end_time)
+    ]
+    _release(keys, user.pk)
+    if shared_cache.get(_user_key(user.pk)) == keys:
+        shared_cache.delete(_user_key(user.pk))
+
+
+def _release(keys, user_id):
+    current = shared_cache.get_many(keys)
+    shared_cache.delete_many(
+        [key for key, value in current.items() if value[0] == user_id]
+    )
@@ -0,0 +1,202 @@
+"""
+Flux iCalendar (RFC 5545) des rendez-vous, pour les agendas des conseillers et des
+clients (Google Agenda, Outlook, Apple Calendrier...).
+
+Les clients d'agenda interrogent un flux sans session : chaque flux est identifié
+par un jeton signé (`feed_token`) contenant le type de flux et la clé de son
+propriétaire. Le flux est produit en streaming, rendez-vous par rendez-vous, à partir
+d'une seule requête parcourue avec `.iterator()`. Son ETag fort est calculé par une
+requête d'agrégats (`feed_validators`) : un flux inchangé coûte une réponse 304.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core import signing
+from django.db.models import Count, Max
+from django.utils import timezone
+from .models import Appointment
+
+FEED_SALT = "meetings.ics-feed"
+
+# Types de flux : champ de filtrage, nom de l'agenda, préfixe du titre des événements
+# et champs du nom de l'interlocuteur
+FEEDS = {
+    "staff": {
+        "owner": "staff_user_id",
+        "name": "Rendez-vous clients",
+        "title": "Rendez-vous avec",
+        "names": ("user__prenom", "user__nom"),
+        "names_updated": "user__updated_at",
+    },
+    "user": {
+        "owner": "user_id",
+        "name": "Mes rendez-vous d'assurance",
+        "title": "Rendez-vous avec votre conseiller",
+        "names": ("staff_user__user__prenom", "staff_user__user__nom"),
+        "names_updated": "staff_user__user__updated_at",
+    },
+}
+
+
+def feed_token(kind, owner_id):
+    """
+    Retourne le jeton signé d'un flux ("staff" ou "user") pour son propriétaire.
+    """
+    return signing.Signer(salt=FEED_SALT).sign(f"{kind}:{owner_id}")
+
+
+def read_feed_token(token):
+    """
+    Vérifie un jeton de flux.
+
+    Retourne :
+    ---------
+    tuple ou None
+        (type de flux, clé du propriétaire), ou None si le jeton est invalide.
+    """
+    try:
+        kind, owner_id = signing.Signer(salt=FEED_SALT).unsign(token).split(":")
+    except (signing.BadSignature, ValueError):
+        return None
+    if kind not in FEEDS or not owner_id.isdigit():
+        return None
+    return kind, int(owner_id)
+
+
+def feed_since():
+    """
+    Premier jour des flux : les rendez-vous plus anciens que
+    `settings.MEETINGS_FEED_PAST_DAYS` jours n'y figurent pas.
+    """
+    return timezone.localdate() - timedelta(days=settings.MEETINGS_FEED_PAST_DAYS)
+
+
+def feed_queryset(kind, owner_id, since):
+    """
+    Rendez-vous d'un flux : ceux de son propriétaire à partir de la date `since`.
+    """
+    return Appointment.objects.filter(
+        **{FEEDS[kind]["owner"]: owner_id}, date__gte=since
+    ).order_by()
+
+
+def feed_validators(kind, owner_id, since):
+    """
+    Calcule l'ETag fort et la date de dernière modification d'un flux, en une seule
+    requête d'agrégats.
+
+    Le nombre de rendez-vous et la date de début de la période entrent dans l'ETag :
+    une suppression, ou un rendez-vous qui sort de la période, change donc l'ETag.
+    Les titres des événements contenant le nom de l'autre partie, la date de
+    modification de ces utilisateurs y entre aussi.
+
+    Retourne :
+    ---------
+    tuple
+        (ETag entre guillemets, datetime de dernière modification ou None).
+    """
+    row = feed_queryset(kind, owner_id, since).aggregate(
+        updated=Max("updated_at"),
+        names_updated=Max(FEEDS[kind]["names_updated"]),
+        count=Count("pk"),
+    )
+    digest = hashlib.md5(
+        f"{kind}:{owner_id}:{since}:{row['updated']}:{row['names_updated']}:"
+        f"{row['count']}".encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    updated = [value for value in (row["updated"], row["names_updated"]) if value]
+    return f'"{digest}"', max(updated, default=None)
+
+
+def escape_text(value):
+    """
+    Échappe une valeur texte iCalendar (barre oblique inverse, virgule, point-virgule,
+    retour à la ligne).
+    """
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """
+    Replie une ligne de contenu en lignes de 75 octets au plus, terminées par CRLF.
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    current = ""
+    size = 0
+    limit = 75
+    for character in line:
+        width = len(character.encode())
+        if size + width > limit:
+            parts.append(current)
+            current, size, limit = "", 0, 74  # Les suites commencent par un espace
+        current += character
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def utc_stamp(value):
+    """
+    Formate un datetime en UTC (AAAAMMJJTHHMMSSZ).
+    """
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def local_stamp(date, value):
+    """
+    Formate une date et une heure locales (fuseau `settings.TIME_ZONE`) en UTC.
+    """
+    return utc_stamp(timezone.make_aware(datetime.combine(date, value)))
+
+
+def feed_lines(kind, owner_id, since, host):
+    """
+    Génère le contenu d'un flux iCalendar, ligne par ligne.
+
+    Paramètres :
+    ------------
+    kind : str
+        Type de flux ("staff" ou "user").
+    owner_id : int
+        Clé du conseiller ou du client.
+    since : date
+        Premier jour du flux (`feed_since`).
+    host : str
+        Nom d'hôte du site, utilisé dans les identifiants des événements.
+    """
+    feed = FEEDS[kind]
+    yield fold("BEGIN:VCALENDAR")
+    yield fold("VERSION:2.0")
+    yield fold("PRODID:-//Djang_Assurance//Rendez-vous//FR")
+    yield fold("CALSCALE:GREGORIAN")
+    yield fold(f"X-WR-CALNAME:{escape_text(feed['name'])}")
+
+    appointments = feed_queryset(kind, owner_id, since).values_list(
+        "pk", "date", "start_time", "end_time", "updated_at", *feed["names"]
+    )
+    for pk, date, start_time, end_time, updated_at, *names in appointments.iterator(
+        chunk_size=500
+    ):
+        yield "".join(
+            [
+                fold("BEGIN:VEVENT"),
+                fold(f"UID:appointment-{pk}@{host}"),
+                fold(f"DTSTAMP:{utc_stamp(updated_at)}"),
+                fold(f"DTSTART:{local_stamp(date, start_time)}"),
+                fold(f"DTEND:{local_stamp(date, end_time)}"),
+                fold(f"SUMMARY:{escape_text(' '.join([feed['title'], *names]))}"),
+                fold("END:VEVENT"),
+            ]
+        )
+    yield fold("END:VCALENDAR")
@@ -0,0 +1,81 @@
+"""
+Index d'intervalles des rendez-vous d'un membre du personnel pour une date.
+
+Les rendez-vous ont une durée variable : deux rendez-vous [a, b[ et [c, d[ se
+chevauchent si a < d et c < b. L'index trie les rendez-vous par heure de début et
+conserve, pour chaque préfixe, l'heure de fin maximale : un nouvel intervalle
+[début, fin[ chevauche un rendez-vous si, parmi ceux qui commencent avant `fin`
+(trouvés par bisection), l'un finit après `début`. Chaque recherche est en O(log n),
+y compris si des rendez-vous existants se chevauchent déjà entre eux.
+"""
+
+from bisect import bisect_left
+from .models import Appointment
+
+
+class IntervalIndex:
+    """
+    Index des intervalles occupés d'une journée.
+
+    Attributs :
+    -----------
+    starts : list
+        Heures de début triées.
+    items : list
+        Tuples (début, fin, clé) dans le même ordre que `starts`.
+    """
+
+    def __init__(self, intervals=()):
+        """
+        Paramètres :
+        ------------
+        intervals : iterable
+            Des tuples (début, fin, clé) ; la clé identifie l'intervalle (par exemple
+            la clé primaire du rendez-vous).
+        """
+        self.items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.starts = [start for start, _, _ in self.items]
+        # _reach[i] : indice de l'intervalle qui finit le plus tard parmi items[:i + 1]
+        self._reach = []
+        best = None
+        for index, (_, end, _) in enumerate(self.items):
+            if best is None or end > self.items[best][1]:
+                best = index
+            self._reach.append(best)
+
+    @classmethod
+    def for_day(cls, staff_user_id, date, exclude_pk=None):
+        """
+        Construit l'index des rendez-vous d'un membre du personnel pour une date,
+        en une seule requête.
+        """
+        appointments = Appointment.objects.filter(
+            staff_user_id=staff_user_id, date=date
+        )
+        if exclude_pk is not None:
+            appointments = appointments.exclude(pk=exclude_pk)
+        return cls(
+            (start_time, end_time, pk)
+            for pk, start_time, end_time in appointments.values_list(
+                "pk", "start_time", "end_time"
+            )
+        )
+
+    def __len__(self):
+        return len(self.items)
+
+    def conflict(self, start, end):
+        """
+        Retourne un intervalle (début, fin, clé) chevauchant [start, end[, ou None.
+        """
+        count = bisect_left(self.starts, end)  # Intervalles commençant avant `end`
+        if not count:
+            return None
+        candidate = self.items[self._reach[count - 1]]
+        return candidate if candidate[1] > start else None
+
+    def overlaps(self, start, end):
+        """
+        Indique si [start, end[ chevauche un intervalle de l'index.
+        """
+        return self.conflict(start, end) is not None
@@ -0,0 +1,203 @@
+"""
+Mises à jour en direct de l'agenda des conseillers (Server-Sent Events).
+
+Chaque réservation, modification ou annulation est inscrite dans le journal
+`AgendaEvent`, dans la transaction du rendez-vous. Une fois la transaction validée,
+les connexions ouvertes du même processus sur l'agenda du conseiller sont réveillées
+immédiatement (abonnements en mémoire) ; celles des autres processus serveur voient
+l'entrée du journal à leur prochaine relecture, au plus tard après
+`settings.MEETINGS_LIVE_POLL_SECONDS` secondes.
+
+À chaque réveil, une connexion relit les entrées de sa semaine postérieures au
+dernier événement transmis, et envoie pour chaque date modifiée la ligne de
+l'agenda rendue de nouveau : la page remplace la ligne en place.
+"""
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .agenda import render_day_rows, week_grid
+from .models import AgendaEvent, Appointment
+from .slots import weekly_masks
+
+_subscriptions = defaultdict(set)
+_lock = threading.Lock()
+
+
+class Subscription:
+    """
+    Abonnement d'une connexion aux modifications de l'agenda d'un conseiller.
+
+    Attributs :
+    -----------
+    staff_user_id : int
+        Conseiller suivi.
+    loop : AbstractEventLoop
+        Boucle d'événements de la connexion (les publications peuvent venir d'un
+        autre fil d'exécution).
+    event : asyncio.Event
+        Levé quand l'agenda a changé.
+    """
+
+    def __init__(self, staff_user_id):
+        self.staff_user_id = staff_user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self, timeout):
+        """
+        Attend une modification, au plus `timeout` secondes.
+
+        Retourne :
+        ---------
+        bool
+            True si une modification a été publiée dans ce processus.
+        """
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def __enter__(self):
+        with _lock:
+            _subscriptions[self.staff_user_id].add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with _lock:
+            _subscriptions[self.staff_user_id].discard(self)
+            if not _subscriptions[self.staff_user_id]:
+                del _subscriptions[self.staff_user_id]
+
+
+def publish(staff_user_id):
+    """
+    Réveille les connexions de ce processus qui suivent l'agenda d'un conseiller.
+    """
+    with _lock:
+        subscriptions = list(_subscriptions.get(staff_user_id, ()))
+    for subscription in subscriptions:
+        subscription.notify()
+
+
+def record_agenda_event(staff_user_id, date, kind):
+    """
+    Inscrit une modification d'agenda dans le journal, puis la publie une fois la
+    transaction validée. Les entrées plus anciennes que
+    `settings.MEETINGS_LIVE_EVENT_RETENTION` secondes sont purgées au passage.
+    """
+    AgendaEvent.objects.create(staff_user_id=staff_user_id, date=date, kind=kind)
+    AgendaEvent.objects.filter(
+        created_at__lt=timezone.now()
+        - timedelta(seconds=settings.MEETINGS_LIVE_EVENT_RETENTION)
+    ).delete()
+    transaction.on_commit(lambda: publish(staff_user_id))
+
+
+async def last_event_id():
+    """
+    Retourne la clé de la dernière entrée du journal (0 s'il est vide).
+    """
+    latest = (
+        await AgendaEvent.objects.order_by("-pk").values_list("pk", flat=True).afirst()
+    )
+    return latest or 0
+
+
+async def pending_events(staff_user_id, first_day, last_day, after):
+    """
+    Retourne les entrées du journal d'une semaine d'agenda postérieures à `after`,
+    sous forme de tuples (clé, date, nature).
+    """
+    return [
+        row
+        async for row in AgendaEvent.objects.filter(
+            staff_user_id=staff_user_id,
+            date__range=[first_day, last_day],
+            pk__gt=after,
+        )
+        .order_by("pk")
+        .values_list("pk", "date", "kind")
+    ]
+
+
+def day_row(staff_user_id, week_start_date, date):
+    """
+    Rend de nouveau la ligne d'une date de l'agenda d'un conseiller.
+    """
+    appointments = Appointment.objects.filter(
+        staff_user_id=staff_user_id, date=date
+    ).values_list("date", "start_time", "end_time", "user__username")
+    rows = week_grid(week_start_date, weekly_masks(staff_user_id), appointments)
+    row = rows["rows"][(date - week_start_date).days]
+    return render_day_rows(staff_user_id, [row])[0]
+
+
+def format_event(event_id, name, data):
+    """
+    Formate un message Server-Sent Events.
+    """
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def agenda_stream(staff_user_id, week_start_date, after, live=True):
+    """
+    Génère le flux Server-Sent Events d'une semaine de l'agenda d'un conseiller.
+
+    Paramètres :
+    ------------
+    staff_user_id : int
+        Conseiller dont l'agenda est affiché.
+    week_start_date : date
+        Lundi de la semaine affichée.
+    after : int
+        Clé du dernier événement déjà reçu par la page.
+    live : bool
+        Si False (serveur WSGI, qui ne peut pas garder la connexion ouverte), le flux
+        envoie les événements en attente puis se ferme : le navigateur se reconnecte
+        après `retry` millisecondes.
+
+    Un message `agenda` est envoyé par date modifiée, avec la ligne de l'agenda
+    rendue de nouveau ; un commentaire est envoyé à chaque relecture sans
+    modification, pour maintenir la connexion. La connexion est fermée après
+    `settings.MEETINGS_LIVE_MAX_SECONDS` secondes ; le navigateur la rouvre en
+    transmettant le dernier identifiant reçu (`Last-Event-ID`).
+    """
+    last_day = week_start_date + timedelta(days=6)
+    poll = settings.MEETINGS_LIVE_POLL_SECONDS
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.MEETINGS_LIVE_MAX_SECONDS
+    yield f"retry: {poll * 1000}\n\n"
+
+    with Subscription(staff_user_id) as subscription:
+        while True:
+            events = await pending_events(
+                staff_user_id, week_start_date, last_day, after
+            )
+            if events:
+                after = events[-1][0]
+                kinds = {date: kind for _, date, kind in events}
+                for date, kind in sorted(kinds.items()):
+                    row = await sync_to_async(day_row)(
+                        staff_user_id, week_start_date, date
+                    )
+                    yield format_event(
+                        after,
+                        "agenda",
+                        {"date": f"{date:%Y-%m-%d}", "kind": kind, "row": row},
+                    )
+            if not live or loop.time() >= deadline:
+                return
+            if not await subscription.wait(poll):
+                yield ": ping\n\n"
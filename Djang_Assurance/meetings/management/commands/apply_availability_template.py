@@ -0,0 +1,112 @@
+import re
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from user.models import StaffUser
+from meetings.provisioning import TEMPLATES, apply_availability_template
+
+SLOT_PATTERN = re.compile(
+    r"^(?P<first>[0-6])(?:-(?P<last>[0-6]))?"
+    r"@(?P<start>\d{2}:\d{2})-(?P<end>\d{2}:\d{2})$"
+)
+
+
+class Command(BaseCommand):
+    """
+    Applique un modèle de disponibilités à plusieurs conseillers à la fois.
+
+    Le modèle est soit un modèle prédéfini (`--template`, voir
+    `meetings.provisioning.TEMPLATES`), soit une liste de plages `--slot`, au format
+    `JOURS@HH:MM-HH:MM` (jours de 0 = lundi à 6 = dimanche, par exemple
+    `0-4@09:00-12:00` ou `5@10:00-12:00`).
+
+    Toutes les disponibilités sont insérées en une requête groupée et l'index des
+    créneaux est recalculé une fois pour l'ensemble des conseillers.
+    """
+
+    help = "Applique un modèle de disponibilités hebdomadaires à des conseillers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "staff_users",
+            nargs="*",
+            help="Clés primaires ou noms d'utilisateur des conseillers.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Applique le modèle à tous les conseillers.",
+        )
+        parser.add_argument("--template", choices=sorted(TEMPLATES), default="default")
+        parser.add_argument(
+            "--slot",
+            action="append",
+            default=[],
+            help="Plage JOURS@HH:MM-HH:MM (remplace --template, répétable).",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Supprime les disponibilités existantes des conseillers avant.",
+        )
+
+    def parse_slot(self, value):
+        match = SLOT_PATTERN.match(value)
+        if not match:
+            raise CommandError(f"Plage invalide : {value} (attendu JOURS@HH:MM-HH:MM)")
+        try:
+            start_time = datetime.strptime(match["start"], "%H:%M").time()
+            end_time = datetime.strptime(match["end"], "%H:%M").time()
+        except ValueError:
+            raise CommandError(f"Heure invalide dans la plage : {value}")
+        first = int(match["first"])
+        last = int(match["last"] or first)
+        if last < first or end_time <= start_time:
+            raise CommandError(f"Plage vide : {value}")
+        return [(day, start_time, end_time) for day in range(first, last + 1)]
+
+    def get_staff_user_ids(self, options):
+        if options["all"]:
+            return list(StaffUser.objects.values_list("pk", flat=True))
+        identifiers = options["staff_users"]
+        if not identifiers:
+            raise CommandError("Indiquez des conseillers ou --all.")
+
+        pks = [int(value) for value in identifiers if value.isdigit()]
+        usernames = [value for value in identifiers if not value.isdigit()]
+        found = dict(
+            StaffUser.objects.filter(
+                Q(pk__in=pks) | Q(user__username__in=usernames)
+            ).values_list("pk", "user__username")
+        )
+        missing = [
+            value
+            for value in identifiers
+            if (
+                int(value) not in found
+                if value.isdigit()
+                else value not in found.values()
+            )
+        ]
+        if missing:
+            raise CommandError(f"Conseillers introuvables : {', '.join(missing)}")
+        return list(found)
+
+    def handle(self, *args, **options):
+        if options["slot"]:
+            template = [
+                slot for value in options["slot"] for slot in self.parse_slot(value)
+            ]
+        else:
+            template = TEMPLATES[options["template"]]
+        staff_user_ids = self.get_staff_user_ids(options)
+
+        count = apply_availability_template(
+            staff_user_ids, template, replace=options["replace"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Modèle appliqué à {len(staff_user_ids)} conseillers "
+                f"({count} plages, les plages déjà présentes sont ignorées)."
+            )
+        )
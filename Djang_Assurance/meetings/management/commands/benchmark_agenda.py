@@ -0,0 +1,103 @@
+import statistics
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from user.models import StaffUser
+from meetings.agenda import render_day_rows, week_grid, week_start
+from meetings.models import Appointment
+from meetings.slots import weekly_masks
+from meetings.views import StaffAgendaView
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmark du rendu de l'agenda hebdomadaire d'un membre du personnel.
+
+    Mesure séparément :
+    - la construction de la grille (`meetings.agenda.week_grid`) ;
+    - le rendu des lignes sans cache de fragments ;
+    - la vue complète (`StaffAgendaView`), cache de fragments chaud.
+
+    Les données sont lues une fois avant les mesures : seuls le calcul et le rendu
+    sont chronométrés, pas les requêtes SQL (sauf pour la vue complète).
+    """
+
+    help = "Mesure le temps de construction et de rendu de l'agenda hebdomadaire."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "staff_user", help="Clé primaire ou nom d'utilisateur du conseiller."
+        )
+        parser.add_argument("--week", help="Lundi de la semaine (AAAA-MM-JJ).")
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def get_staff_user(self, identifier):
+        lookup = (
+            {"pk": identifier}
+            if identifier.isdigit()
+            else {"user__username": identifier}
+        )
+        try:
+            return StaffUser.objects.select_related("user").get(**lookup)
+        except StaffUser.DoesNotExist:
+            raise CommandError(f"Conseiller introuvable : {identifier}")
+
+    def measure(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        staff_user = self.get_staff_user(options["staff_user"])
+        if options["week"]:
+            first_day = datetime.strptime(options["week"], "%Y-%m-%d").date()
+        else:
+            first_day = week_start(datetime.now().date())
+        repeat = options["repeat"]
+
+        masks = weekly_masks(staff_user.pk)
+        appointments = list(
+            Appointment.objects.filter(
+                staff_user=staff_user,
+                date__range=[first_day, first_day + timedelta(days=6)],
+            ).values_list("date", "start_time", "end_time", "user__username")
+        )
+        rows = week_grid(first_day, masks, appointments)["rows"]
+
+        def render_uncached():
+            for row in rows:
+                render_to_string("meetings/agenda_day_row.html", {"row": row})
+
+        request = RequestFactory().get(f"/meetings/agenda/{first_day:%Y-%m-%d}/")
+        request.user = staff_user.user
+        view = StaffAgendaView.as_view()
+
+        def full_view():
+            view(request, week_start_date=f"{first_day:%Y-%m-%d}").render()
+
+        render_day_rows(staff_user.pk, rows)  # Cache de fragments chaud
+
+        results = {
+            "grille": self.measure(
+                lambda: week_grid(first_day, masks, appointments), repeat
+            ),
+            "lignes (sans cache)": self.measure(render_uncached, repeat),
+            "vue complète": self.measure(full_view, repeat),
+        }
+
+        self.stdout.write(
+            f"Agenda de {staff_user.user.username}, semaine du {first_day:%d/%m/%Y} "
+            f"({len(appointments)} rendez-vous, {repeat} répétitions) :"
+        )
+        for name, timings in results.items():
+            timings.sort()
+            self.stdout.write(
+                f"  {name:<20} moyenne {statistics.mean(timings):7.3f} ms  "
+                f"p50 {timings[len(timings) // 2]:7.3f} ms  "
+                f"p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+            )
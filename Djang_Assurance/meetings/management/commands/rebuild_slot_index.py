@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from user.models import StaffUser
+from meetings.models import Availability, Appointment, WeeklySlotMask, BookedSlotMask
+from meetings.slots import availability_mask, booking_mask, bump_availability_version
+
+
+class Command(BaseCommand):
+    """
+    Reconstruit entièrement l'index des créneaux (`WeeklySlotMask` et `BookedSlotMask`).
+
+    À lancer après un changement de `MEETINGS_SLOT_MINUTES`, ou après des écritures
+    qui ne déclenchent pas les signaux (`bulk_create`, `update`, imports SQL).
+    """
+
+    help = "Reconstruit l'index des créneaux libres à partir des disponibilités et rendez-vous."
+
+    def handle(self, *args, **options):
+        weekly = {}
+        availabilities = Availability.objects.values_list(
+            "staff_user_id", "day_of_week", "start_time", "end_time"
+        )
+        for staff_user_id, day, start_time, end_time in availabilities.iterator():
+            key = (staff_user_id, day)
+            weekly[key] = weekly.get(key, 0) | availability_mask(start_time, end_time)
+
+        booked = {}
+        appointments = Appointment.objects.values_list(
+            "staff_user_id", "date", "start_time", "end_time"
+        )
+        for staff_user_id, date, start_time, end_time in appointments.iterator():
+            key = (staff_user_id, date)
+            booked[key] = booked.get(key, 0) | booking_mask(start_time, end_time)
+
+        with transaction.atomic():
+            WeeklySlotMask.objects.all().delete()
+            WeeklySlotMask.objects.bulk_create(
+                (
+                    WeeklySlotMask(
+                        staff_user_id=staff_user_id,
+                        day_of_week=day,
+                        mask=format(mask, "x"),
+                    )
+                    for (staff_user_id, day), mask in weekly.items()
+                    if mask
+                ),
+                batch_size=1000,
+            )
+            BookedSlotMask.objects.all().delete()
+            BookedSlotMask.objects.bulk_create(
+                (
+                    BookedSlotMask(
+                        staff_user_id=staff_user_id, date=date, mask=format(mask, "x")
+                    )
+                    for (staff_user_id, date), mask in booked.items()
+                ),
+                batch_size=1000,
+            )
+
+        for staff_user_id in StaffUser.objects.values_list("pk", flat=True):
+            bump_availability_version(staff_user_id)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Index reconstruit : {len(weekly)} jours de disponibilité, "
+                f"{len(booked)} jours de rendez-vous."
+            )
+        )
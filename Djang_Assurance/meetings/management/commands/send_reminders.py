@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from meetings.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    """
+    Envoie par e-mail les rappels des rendez-vous des prochaines heures.
+
+    À lancer périodiquement (par exemple toutes les 15 minutes, via cron) : chaque
+    rendez-vous ne reçoit qu'un rappel par délai, quel que soit le nombre
+    d'exécutions (voir `meetings.reminders`).
+    """
+
+    help = "Envoie les rappels des rendez-vous à venir."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            help="Délai couvert, en heures (défaut : MEETINGS_REMINDER_HOURS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        sent, failed = send_reminders(options["hours"], options["batch_size"])
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f"{sent} rappels envoyés, {failed} échecs."))
@@ -18,6 +18,8 @@ class Availability(models.Model):
         Heure de début de la disponibilité (exemple : 13:00).
     end_time : TimeField
         Heure de fin de la disponibilité (exemple : 16:00).
+    updated_at : DateTimeField
+        Date de dernière modification.
 
     Méta :
     ------
@@ -50,6 +52,9 @@ class Availability(models.Model):
         models.TimeField()
     )  # Heure de début de la disponibilité (exemple : 13:00).
     end_time = models.TimeField()  # Heure de fin de la disponibilité (exemple : 16:00).
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )  # Date de dernière modification (validation des agendas en cache).
 
     class Meta:
         unique_together = (
@@ -83,18 +88,27 @@ class Appointment(models.Model):
         Heure de début du rendez-vous.
     end_time : TimeField
         Heure de fin du rendez-vous.
+    updated_at : DateTimeField
+        Date de dernière modification.
 
     Méta :
     ------
-    unique_together : tuple
-        Garantit qu'une combinaison unique de `staff_user`, `date`, `start_time` et `end_time` existe.
+    constraints : list
+        Garantit qu'un membre du personnel n'a qu'un rendez-vous commençant à une heure
+        donnée : c'est cette contrainte qui arbitre les réservations concurrentes
+        (voir `meetings.booking`).
+    indexes : list
+        Index sur (`user`, `date`, `start_time`) pour lister les rendez-vous d'un client,
+        et sur (`date`, `start_time`) pour sélectionner une fenêtre de rendez-vous
+        (rappels).
 
     Méthodes :
     ----------
     __str__():
         Retourne une représentation lisible du rendez-vous (membre du personnel, date et plage horaire).
     clean():
-        Vérifie si le rendez-vous respecte les disponibilités du membre du personnel.
+        Vérifie si le rendez-vous respecte les disponibilités du membre du personnel
+        et n'en chevauche pas un autre.
     """
 
     user = models.ForeignKey(
@@ -106,14 +120,25 @@ class Appointment(models.Model):
     date = models.DateField()  # Date du rendez-vous.
     start_time = models.TimeField()  # Heure de début du rendez-vous.
     end_time = models.TimeField()  # Heure de fin du rendez-vous.
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )  # Date de dernière modification (validation des agendas en cache).
 
     class Meta:
-        unique_together = (
-            "staff_user",
-            "date",
-            "start_time",
-            "end_time",
-        )  # Contrainte d'unicité.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["staff_user", "date", "start_time"],
+                name="unique_appointment_start",
+            )
+        ]  # Contrainte d'unicité.
+        indexes = [
+            models.Index(
+                fields=["user", "date", "start_time"], name="appointment_user_date_idx"
+            ),  # Rendez-vous d'un client, triés par date (voir `UserListView`).
+            models.Index(
+                fields=["date", "start_time"], name="appointment_date_idx"
+            ),  # Fenêtre de rendez-vous (voir `meetings.reminders`).
+        ]
 
     def __str__(self):
         """
@@ -124,27 +149,164 @@ class Appointment(models.Model):
 
     def clean(self):
         """
-        Vérifie si le rendez-vous respecte les disponibilités du membre du personnel.
+        Vérifie si le rendez-vous respecte les disponibilités du membre du personnel
+        et n'en chevauche pas un autre.
 
         Lève une ValidationError si :
+        - L'heure de fin ne suit pas l'heure de début.
         - Le rendez-vous est en dehors des plages de disponibilité du membre du personnel.
+        - Le rendez-vous chevauche un autre rendez-vous, quelle que soit sa durée.
+
+        Les disponibilités sont vérifiées avec l'index de créneaux (`meetings.slots`),
+        les chevauchements avec l'index d'intervalles de la journée (`meetings.intervals`).
 
         Exceptions :
         ------------
         ValidationError :
-            Si le rendez-vous ne correspond pas aux disponibilités du membre du personnel.
+            Si le rendez-vous ne correspond pas aux disponibilités du membre du personnel
+            ou si le créneau est déjà réservé.
         """
         from django.core.exceptions import ValidationError
+        from .intervals import IntervalIndex
+        from .slots import booking_mask, weekly_mask
+
+        if self.end_time is None or self.end_time <= self.start_time:
+            raise ValidationError("The appointment must end after it starts.")
 
-        # Recherche une disponibilité correspondant au jour, à l'heure de début et à l'heure de fin.
-        availability = Availability.objects.filter(
-            staff_user=self.staff_user,
-            day_of_week=self.date.weekday(),  # Convertit la date en jour de la semaine (0 = lundi).
-            start_time__lte=self.start_time,  # Vérifie que l'heure de début est dans la plage.
-            end_time__gte=self.end_time,  # Vérifie que l'heure de fin est dans la plage.
-        )
-        if not availability.exists():
+        requested = booking_mask(self.start_time, self.end_time)
+
+        # Vérifie que tous les créneaux demandés sont couverts par les disponibilités.
+        available = weekly_mask(self.staff_user_id, self.date.weekday())
+        if requested & ~available:
             # Lève une erreur si aucune disponibilité ne correspond.
             raise ValidationError(
                 "This appointment is outside the staff user's availability."
             )
+
+        # Vérifie qu'aucun autre rendez-vous ne chevauche celui-ci
+        # (le rendez-vous modifié ne doit pas entrer en conflit avec lui-même).
+        index = IntervalIndex.for_day(self.staff_user_id, self.date, exclude_pk=self.pk)
+        if index.overlaps(self.start_time, self.end_time):
+            raise ValidationError("This time slot is already booked.")
+
+
+class WeeklySlotMask(models.Model):
+    """
+    Index des disponibilités hebdomadaires d'un membre du personnel (voir `meetings.slots`).
+
+    Attributs :
+    -----------
+    staff_user : ForeignKey
+        Membre du personnel concerné.
+    day_of_week : IntegerField
+        Jour de la semaine (0 = lundi, 6 = dimanche).
+    mask : CharField
+        Masque hexadécimal des créneaux couverts par ses disponibilités ce jour-là.
+    """
+
+    staff_user = models.ForeignKey(
+        StaffUser, on_delete=models.CASCADE, related_name="weekly_slot_masks"
+    )
+    day_of_week = models.IntegerField(choices=Availability.DAYS_OF_WEEK)
+    mask = models.CharField(max_length=96)
+
+    class Meta:
+        unique_together = ("staff_user", "day_of_week")
+
+
+class BookedSlotMask(models.Model):
+    """
+    Index des créneaux réservés d'un membre du personnel pour une date (voir `meetings.slots`).
+
+    Attributs :
+    -----------
+    staff_user : ForeignKey
+        Membre du personnel concerné.
+    date : DateField
+        Date des rendez-vous.
+    mask : CharField
+        Masque hexadécimal des créneaux occupés par des rendez-vous ce jour-là.
+    """
+
+    staff_user = models.ForeignKey(
+        StaffUser, on_delete=models.CASCADE, related_name="booked_slot_masks"
+    )
+    date = models.DateField()
+    mask = models.CharField(max_length=96)
+
+    class Meta:
+        unique_together = ("staff_user", "date")
+
+
+class AgendaEvent(models.Model):
+    """
+    Journal des modifications d'agenda, diffusé en direct aux agendas ouverts
+    (voir `meetings.live`).
+
+    Chaque processus serveur relit ce journal : c'est lui qui transmet les
+    modifications faites dans un autre processus que celui de la connexion.
+
+    Attributs :
+    -----------
+    staff_user : ForeignKey
+        Membre du personnel dont l'agenda a changé.
+    date : DateField
+        Date modifiée.
+    kind : CharField
+        Nature de la modification (réservation, modification ou annulation).
+    created_at : DateTimeField
+        Date de la modification (les entrées anciennes sont purgées).
+    """
+
+    KINDS = [
+        ("booked", "Booked"),
+        ("updated", "Updated"),
+        ("cancelled", "Cancelled"),
+    ]
+
+    staff_user = models.ForeignKey(
+        StaffUser, on_delete=models.CASCADE, related_name="agenda_events"
+    )
+    date = models.DateField()
+    kind = models.CharField(max_length=10, choices=KINDS)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["staff_user", "date"], name="agenda_event_staff_idx")
+        ]  # Événements d'une semaine d'agenda, lus par clé croissante.
+
+
+class ReminderLog(models.Model):
+    """
+    Journal des rappels de rendez-vous envoyés (voir `meetings.reminders`).
+
+    Une ligne est réservée avant l'envoi et supprimée si l'envoi échoue : la
+    contrainte d'unicité garantit qu'un rappel n'est envoyé qu'une fois, même si
+    plusieurs exécutions se chevauchent.
+
+    Attributs :
+    -----------
+    appointment : ForeignKey
+        Rendez-vous rappelé.
+    kind : CharField
+        Type de rappel (délai avant le rendez-vous, par exemple "24h").
+    batch : CharField
+        Identifiant de l'exécution qui a réservé le rappel.
+    sent_at : DateTimeField
+        Date de l'envoi.
+    """
+
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.CASCADE, related_name="reminders"
+    )
+    kind = models.CharField(max_length=10)
+    batch = models.CharField(max_length=32)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["appointment", "kind"], name="unique_reminder"
+            )
+        ]
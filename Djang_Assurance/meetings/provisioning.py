@@ -0,0 +1,98 @@
+"""
+Application de modèles de disponibilités (plages hebdomadaires) aux conseillers.
+
+Les disponibilités de tous les conseillers visés sont insérées en une seule requête
+groupée (`bulk_create(ignore_conflicts=True)` : une plage déjà présente est ignorée
+grâce à la contrainte d'unicité de `Availability`). `bulk_create` ne déclenche pas
+les signaux de `meetings.signals` : l'index des créneaux est donc recalculé ici, en
+une fois pour tous les conseillers, puis les versions en cache (partagées par tous
+les processus, voir `meetings.slots`) sont invalidées une fois la transaction
+validée.
+"""
+
+from datetime import time
+from django.db import transaction
+from .models import Availability
+from .slots import (
+    bump_availability_version,
+    bump_directory_version,
+    rebuild_weekly_masks_for,
+)
+
+# Modèles prédéfinis : des tuples (jour de la semaine, heure de début, heure de fin)
+TEMPLATES = {
+    "default": tuple((day, time(13), time(16)) for day in range(5)),
+    "matin": tuple((day, time(9), time(12)) for day in range(5)),
+    "journee": tuple(
+        (day, start, end)
+        for day in range(5)
+        for start, end in ((time(9), time(12)), (time(14), time(17)))
+    ),
+}
+
+DEFAULT_TEMPLATE = TEMPLATES["default"]
+
+
+def apply_availability_template(
+    staff_user_ids, template=DEFAULT_TEMPLATE, replace=False
+):
+    """
+    Applique un modèle de disponibilités à plusieurs conseillers.
+
+    Paramètres :
+    ------------
+    staff_user_ids : iterable
+        Clés des conseillers concernés.
+    template : iterable
+        Des tuples (jour de la semaine, heure de début, heure de fin).
+    replace : bool
+        Si True, les disponibilités existantes des conseillers sont supprimées
+        avant l'application du modèle.
+
+    Retourne :
+    ---------
+    int
+        Nombre de plages proposées à l'insertion (les plages déjà présentes sont
+        ignorées par la base).
+    """
+    staff_user_ids = list(staff_user_ids)
+    template = list(template)
+    if not staff_user_ids:
+        return 0
+
+    with transaction.atomic():
+        if replace:
+            # Les signaux de suppression mettent l'index à jour au fil de l'eau ; il
+            # est de toute façon recalculé ci-dessous après l'insertion groupée
+            Availability.objects.filter(staff_user_id__in=staff_user_ids).delete()
+        Availability.objects.bulk_create(
+            [
+                Availability(
+                    staff_user_id=staff_user_id,
+                    day_of_week=day,
+                    start_time=start_time,
+                    end_time=end_time,
+                )
+                for staff_user_id in staff_user_ids
+                for day, start_time, end_time in template
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        rebuild_weekly_masks_for(staff_user_ids)
+
+    def bump_versions():
+        for staff_user_id in staff_user_ids:
+            bump_availability_version(staff_user_id)
+        bump_directory_version()
+
+    transaction.on_commit(bump_versions)
+    return len(staff_user_ids) * len(template)
+
+
+def provision_default_availability(staff_user_ids):
+    """
+    Crée les disponibilités par défaut (du lundi au vendredi, de 13:00 à 16:00)
+    de conseillers nouvellement créés.
+    """
+    return apply_availability_template(staff_user_ids, DEFAULT_TEMPLATE)
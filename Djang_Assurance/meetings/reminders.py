@@ -0,0 +1,132 @@
+"""
+Rappels par e-mail des rendez-vous à venir.
+
+Une exécution (`manage.py send_reminders`, lancée périodiquement) sélectionne les
+rendez-vous des prochaines heures en une requête sur l'index (`date`, `start_time`),
+avec leurs clients et conseillers, et les parcourt par lots :
+
+1. les rappels du lot sont réservés dans `ReminderLog` par une insertion groupée
+   (`bulk_create(ignore_conflicts=True)`) ; seuls ceux que l'exécution a réellement
+   réservés sont envoyés, ce qui rend les exécutions concurrentes sans danger ;
+2. les messages sont rendus avec un template chargé une seule fois, puis envoyés
+   par une connexion e-mail unique, ouverte pour toute l'exécution ;
+3. la réservation des rappels dont l'envoi a échoué est supprimée : ils seront
+   retentés à l'exécution suivante. Un arrêt brutal pendant l'envoi d'un lot laisse
+   en revanche ses rappels réservés sans les envoyer : un rappel n'est jamais
+   envoyé deux fois.
+"""
+
+import logging
+import uuid
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+from .models import Appointment, ReminderLog
+
+logger = logging.getLogger(__name__)
+
+
+def window_filter(start, end):
+    """
+    Filtre des rendez-vous commençant entre les datetimes locaux `start` (inclus) et
+    `end` (exclu), exprimé sur (`date`, `start_time`) pour utiliser l'index.
+    """
+    if start.date() == end.date():
+        return Q(date=start.date(), start_time__gte=start.time()) & Q(
+            start_time__lt=end.time()
+        )
+    return (
+        Q(date=start.date(), start_time__gte=start.time())
+        | Q(date__gt=start.date(), date__lt=end.date())
+        | Q(date=end.date(), start_time__lt=end.time())
+    )
+
+
+def due_appointments(kind, start, end):
+    """
+    Rendez-vous de la fenêtre [start, end[ dont le rappel `kind` n'a pas été envoyé,
+    avec leur client et leur conseiller (une seule requête).
+    """
+    return (
+        Appointment.objects.filter(window_filter(start, end))
+        .exclude(user__email="")
+        .exclude(reminders__kind=kind)
+        .select_related("user", "staff_user__user")
+        .order_by("date", "start_time")
+    )
+
+
+def send_reminders(hours=None, batch_size=500, connection=None):
+    """
+    Envoie les rappels des rendez-vous des `hours` prochaines heures.
+
+    Paramètres :
+    ------------
+    hours : int, optionnel
+        Délai couvert (par défaut `settings.MEETINGS_REMINDER_HOURS`) ; il identifie
+        aussi le type de rappel ("24h") dans le journal.
+    batch_size : int
+        Nombre de rendez-vous lus, réservés et envoyés à la fois.
+    connection : BaseEmailBackend, optionnel
+        Connexion e-mail à utiliser (par défaut : `get_connection()`).
+
+    Retourne :
+    ---------
+    tuple
+        (nombre de rappels envoyés, nombre d'échecs).
+    """
+    hours = hours or settings.MEETINGS_REMINDER_HOURS
+    kind = f"{hours}h"
+    start = timezone.localtime().replace(tzinfo=None)
+    appointments = due_appointments(
+        kind, start, start + timedelta(hours=hours)
+    ).iterator(chunk_size=batch_size)
+
+    batch = uuid.uuid4().hex
+    template = get_template("meetings/email/reminder.txt")
+    connection = connection or get_connection()
+    sent = failed = 0
+    with connection:
+        while chunk := list(islice(appointments, batch_size)):
+            ReminderLog.objects.bulk_create(
+                [
+                    ReminderLog(appointment_id=appointment.pk, kind=kind, batch=batch)
+                    for appointment in chunk
+                ],
+                ignore_conflicts=True,
+            )
+            claimed = set(
+                ReminderLog.objects.filter(
+                    batch=batch, appointment_id__in=[item.pk for item in chunk]
+                ).values_list("appointment_id", flat=True)
+            )
+
+            failures = []
+            for appointment in chunk:
+                if appointment.pk not in claimed:
+                    continue  # Réservé par une autre exécution
+                message = EmailMessage(
+                    f"Rappel : votre rendez-vous du {appointment.date:%d/%m/%Y}",
+                    template.render({"appointment": appointment}),
+                    settings.DEFAULT_FROM_EMAIL,
+                    [appointment.user.email],
+                    connection=connection,
+                )
+                try:
+                    connection.send_messages([message])
+                except Exception:
+                    logger.exception(
+                        "Échec du rappel du rendez-vous %s.", appointment.pk
+                    )
+                    failures.append(appointment.pk)
+            if failures:
+                ReminderLog.objects.filter(
+                    batch=batch, appointment_id__in=failures
+                ).delete()
+            sent += len(claimed) - len(failures)
+            failed += len(failures)
+    return sent, failed
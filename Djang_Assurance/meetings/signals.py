@@ -1,12 +1,23 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
-from user.models import StaffUser
-from .models import Availability
-from datetime import time, datetime
+from user.models import CustomUser, StaffUser
+from .models import Availability, Appointment
+from .live import record_agenda_event
+from .provisioning import provision_default_availability
+from .slots import (
+    bump_availability_version,
+    bump_directory_version,
+    rebuild_weekly_masks,
+    rebuild_booked_mask,
+)
+
+# Champs du compte d'un conseiller affichés dans l'annuaire
+DIRECTORY_USER_FIELDS = {"username", "prenom", "nom"}
 
 
 @receiver(post_save, sender=StaffUser)
-def create_default_availability(sender, instance, created, **kwargs):
+def create_default_availability(sender, instance, created, raw=False, **kwargs):
     """
     Crée des disponibilités par défaut pour un StaffUser nouvellement créé.
 
@@ -23,23 +34,89 @@ def create_default_availability(sender, instance, created, **kwargs):
 
     Action :
     --------
-    Crée des disponibilités du lundi au vendredi (13:00 à 16:00) si elles n'existent pas déjà.
-    """
-    if (
-        created
-    ):  # Nous ne créons les disponibilités que si le StaffUser vient d'être créé
-        for day in range(5):  # Lundi à Vendredi
-            # Vérifier si la disponibilité existe déjà pour ce StaffUser et ce jour de la semaine
-            if not Availability.objects.filter(
-                staff_user=instance,
-                day_of_week=day,
-                start_time=time(13, 0),  # 13:00
-                end_time=time(16, 0),  # 16:00
-            ).exists():
-                # Créer la disponibilité uniquement si elle n'existe pas déjà
-                Availability.objects.create(
-                    staff_user=instance,
-                    day_of_week=day,
-                    start_time=time(13, 0),  # 13:00
-                    end_time=time(16, 0),  # 16:00
-                )
+    Crée des disponibilités du lundi au vendredi (13:00 à 16:00) en une seule
+    insertion groupée ; les plages qui existent déjà sont ignorées.
+    """
+    if created and not raw:
+        provision_default_availability([instance.pk])
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def update_weekly_slot_masks(sender, instance, **kwargs):
+    """
+    Met à jour l'index des disponibilités hebdomadaires du membre du personnel concerné,
+    puis invalide son cache une fois la transaction validée (avant, un autre processus
+    pourrait remettre en cache les anciens masques sous la nouvelle version).
+    """
+    rebuild_weekly_masks(instance.staff_user_id)
+    staff_user_id = instance.staff_user_id
+    transaction.on_commit(lambda: bump_availability_version(staff_user_id))
+    transaction.on_commit(bump_directory_version)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_previous_slot(sender, instance, **kwargs):
+    """
+    Mémorise le membre du personnel et la date d'un rendez-vous modifié, afin de
+    libérer ses anciens créneaux dans l'index s'ils changent.
+    """
+    if instance.pk is not None:
+        instance._previous_slot = (
+            Appointment.objects.filter(pk=instance.pk)
+            .values_list("staff_user_id", "date")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def update_booked_slot_mask(sender, instance, created=None, **kwargs):
+    """
+    Met à jour l'index des créneaux réservés pour la date du rendez-vous
+    (et pour son ancienne date s'il a été déplacé), puis invalide l'annuaire une
+    fois la transaction validée. La modification est inscrite au journal des
+    agendas en direct (`meetings.live`).
+    """
+    current = (instance.staff_user_id, instance.date)
+    rebuild_booked_mask(*current)
+    transaction.on_commit(bump_directory_version)
+    if created is None:  # post_delete
+        record_agenda_event(*current, "cancelled")
+    else:
+        record_agenda_event(*current, "booked" if created else "updated")
+    previous = getattr(instance, "_previous_slot", None)
+    if previous and previous != current:
+        rebuild_booked_mask(*previous)
+        record_agenda_event(*previous, "cancelled")
+
+
+@receiver(post_save, sender=StaffUser)
+@receiver(post_delete, sender=StaffUser)
+def update_directory_for_staff(sender, instance, **kwargs):
+    """
+    Invalide l'annuaire des conseillers en cache après la modification d'un profil.
+    """
+    transaction.on_commit(bump_directory_version)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_directory_for_user(
+    sender, instance, created=False, update_fields=None, **kwargs
+):
+    """
+    Invalide l'annuaire des conseillers en cache après la modification du compte
+    d'un conseiller, sans requête SQL.
+
+    Sont ignorées : les créations (le profil StaffUser créé ensuite invalide
+    l'annuaire), les sauvegardes partielles sans champ affiché
+    (`DIRECTORY_USER_FIELDS` ; une connexion ne met à jour que `last_login`) et les
+    comptes qui ne sont pas membres du personnel, ni à la lecture ni après la
+    modification.
+    """
+    if created:
+        return
+    if update_fields is not None and not DIRECTORY_USER_FIELDS & set(update_fields):
+        return
+    if instance.is_staff or getattr(instance, "_loaded_is_staff", False):
+        transaction.on_commit(bump_directory_version)
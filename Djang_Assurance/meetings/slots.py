@@ -0,0 +1,439 @@
+"""
+Index des créneaux libres sous forme de masques de bits.
+
+Une journée est découpée en créneaux de `settings.MEETINGS_SLOT_MINUTES` minutes
+(15, 30 ou 60) : le bit k d'un masque représente le créneau qui commence à
+k * MEETINGS_SLOT_MINUTES minutes après minuit.
+
+- `WeeklySlotMask` contient, par membre du personnel et par jour de la semaine,
+  l'union de ses disponibilités.
+- `BookedSlotMask` contient, par membre du personnel et par date, les créneaux
+  occupés par des rendez-vous.
+
+Les créneaux libres d'une date sont alors `hebdomadaire & ~réservé`.
+Les deux tables sont maintenues par les signaux de `meetings.signals`.
+
+Les masques hebdomadaires, qui ne changent presque jamais, sont mis en cache
+(cache LRU du processus, puis cache `default`) sous une clé contenant un numéro de
+version par membre du personnel, changé à chaque modification de ses
+disponibilités : une version obsolète n'est simplement plus jamais lue. Les numéros
+de version sont lus dans le cache `shared`, commun à tous les processus.
+"""
+
+import logging
+import time as clock
+from datetime import time, timedelta
+from functools import lru_cache
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import DatabaseError, transaction
+from django.utils.connection import ConnectionProxy
+from .models import Availability, Appointment, WeeklySlotMask, BookedSlotMask
+
+# Cache partagé par tous les processus (en base, voir `settings.CACHES`) : numéros de
+# version et mises en attente (`meetings.holds`). Ses lectures sont des requêtes SQL,
+# à faire hors de la boucle d'événements.
+shared_cache = ConnectionProxy(caches, "shared")
+
+logger = logging.getLogger(__name__)
+
+
+def slot_minutes():
+    """
+    Retourne la durée d'un créneau, en minutes.
+    """
+    return settings.MEETINGS_SLOT_MINUTES
+
+
+def slot_index(value):
+    """
+    Retourne l'indice du créneau contenant l'heure `value`.
+    """
+    return (value.hour * 60 + value.minute) // slot_minutes()
+
+
+def slot_time(index):
+    """
+    Retourne l'heure de début du créneau d'indice `index`.
+    """
+    minutes = index * slot_minutes()
+    return time(minutes // 60, minutes % 60)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def availability_mask(start_time, end_time):
+    """
+    Masque des créneaux entièrement compris dans une disponibilité [start_time, end_time[.
+    """
+    size = slot_minutes()
+    first = -(-_minutes(start_time) // size)  # Arrondi supérieur
+    last = _minutes(end_time) // size
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def booking_mask(start_time, end_time):
+    """
+    Masque des créneaux touchés, même partiellement, par un rendez-vous [start_time, end_time[.
+    """
+    size = slot_minutes()
+    first = _minutes(start_time) // size
+    last = max(-(-_minutes(end_time) // size), first + 1)
+    return ((1 << (last - first)) - 1) << first
+
+
+def mask_slots(mask):
+    """
+    Retourne les heures de début des créneaux présents dans le masque, dans l'ordre.
+    """
+    slots = []
+    index = 0
+    while mask:
+        if mask & 1:
+            slots.append(slot_time(index))
+        mask >>= 1
+        index += 1
+    return slots
+
+
+def slot_is_set(mask, value):
+    """
+    Indique si le créneau contenant l'heure `value` est présent dans le masque.
+    """
+    return bool(mask >> slot_index(value) & 1)
+
+
+# Maintenance de l'index
+
+
+def rebuild_weekly_masks(staff_user_id):
+    """
+    Recalcule les masques hebdomadaires d'un membre du personnel à partir de ses disponibilités.
+    """
+    rebuild_weekly_masks_for([staff_user_id])
+
+
+def rebuild_weekly_masks_for(staff_user_ids):
+    """
+    Recalcule les masques hebdomadaires de plusieurs membres du personnel en trois
+    requêtes, quel que soit leur nombre (lecture des disponibilités, suppression et
+    insertion groupée des masques).
+    """
+    staff_user_ids = list(staff_user_ids)
+    masks = {}
+    for staff_user_id, start_time, end_time, day in Availability.objects.filter(
+        staff_user_id__in=staff_user_ids
+    ).values_list("staff_user_id", "start_time", "end_time", "day_of_week"):
+        key = (staff_user_id, day)
+        masks[key] = masks.get(key, 0) | availability_mask(start_time, end_time)
+
+    with transaction.atomic():
+        WeeklySlotMask.objects.filter(staff_user_id__in=staff_user_ids).delete()
+        WeeklySlotMask.objects.bulk_create(
+            (
+                WeeklySlotMask(
+                    staff_user_id=staff_user_id,
+                    day_of_week=day,
+                    mask=format(mask, "x"),
+                )
+                for (staff_user_id, day), mask in masks.items()
+                if mask
+            ),
+            batch_size=1000,
+        )
+
+
+def rebuild_booked_mask(staff_user_id, date):
+    """
+    Recalcule le masque des créneaux réservés d'un membre du personnel pour une date.
+
+    La ligne de l'index est verrouillée avant de relire les rendez-vous : deux
+    réservations concurrentes du même jour ne peuvent pas écraser le masque l'une
+    de l'autre. Si la ligne n'existe pas encore, la contrainte d'unicité fait
+    échouer la seconde création (IntegrityError), que `meetings.booking` retente.
+    """
+    with transaction.atomic():
+        existing = (
+            BookedSlotMask.objects.select_for_update()
+            .filter(staff_user_id=staff_user_id, date=date)
+            .first()
+        )
+        mask = 0
+        for start_time, end_time in Appointment.objects.filter(
+            staff_user_id=staff_user_id, date=date
+        ).values_list("start_time", "end_time"):
+            mask |= booking_mask(start_time, end_time)
+
+        if existing is None:
+            if mask:
+                BookedSlotMask.objects.create(
+                    staff_user_id=staff_user_id, date=date, mask=format(mask, "x")
+                )
+        elif mask:
+            existing.mask = format(mask, "x")
+            existing.save(update_fields=["mask"])
+        else:
+            existing.delete()
+
+
+# Requêtes sur l'index
+
+
+def _versions(keys):
+    """
+    Lit des numéros de version dans le cache partagé par tous les processus
+    (`shared_cache`), en une seule lecture.
+
+    Une version absente du cache (première lecture, éviction) est initialisée avec
+    l'horloge, pour ne jamais réutiliser une version déjà en cache dans un processus.
+    """
+    versions = shared_cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            shared_cache.add(key, clock.time_ns(), None)
+        versions.update(shared_cache.get_many(missing))
+    return versions
+
+
+def _bump(key):
+    # Une seule écriture, sans lecture préalable (`incr` lit puis réécrit la valeur
+    # dans un cache en base) : toute nouvelle valeur invalide les anciennes
+    try:
+        shared_cache.set(key, clock.time_ns(), None)
+    except DatabaseError:
+        # Table du cache pas encore créée (données initiales écrites pendant
+        # `migrate`, avant `createcachetable`) : aucune version à invalider
+        logger.warning("Cache partagé indisponible, version '%s' inchangée.", key)
+
+
+def _availability_key(staff_user_id):
+    return f"meetings:availability-version:{staff_user_id}"
+
+
+def availability_version(staff_user_id):
+    """
+    Retourne le numéro de version des disponibilités d'un membre du personnel.
+    """
+    key = _availability_key(staff_user_id)
+    return _versions([key])[key]
+
+
+def bump_availability_version(staff_user_id):
+    """
+    Invalide les masques hebdomadaires en cache d'un membre du personnel.
+    """
+    _bump(_availability_key(staff_user_id))
+
+
+def directory_version():
+    """
+    Retourne le numéro de version de l'annuaire des conseillers.
+    """
+    return _versions(["meetings:directory-version"])["meetings:directory-version"]
+
+
+def bump_directory_version():
+    """
+    Invalide l'annuaire des conseillers en cache (profils, disponibilités ou
+    rendez-vous modifiés).
+    """
+    _bump("meetings:directory-version")
+
+
+@lru_cache(maxsize=1024)
+def _cached_weekly_masks(staff_user_id, version):
+    key = f"meetings:weekly-masks:{staff_user_id}:{version}"
+    masks = cache.get(key)
+    if masks is None:
+        masks = {
+            day: int(mask, 16)
+            for day, mask in WeeklySlotMask.objects.filter(
+                staff_user_id=staff_user_id
+            ).values_list("day_of_week", "mask")
+        }
+        cache.set(key, masks, None)
+    return masks
+
+
+def weekly_masks(staff_user_id):
+    """
+    Retourne les masques des disponibilités d'un membre du personnel, par jour de la semaine.
+
+    Seule la version est lue dans le cache partagé ; la base n'est interrogée qu'après
+    une modification des disponibilités.
+    """
+    return dict(
+        _cached_weekly_masks(staff_user_id, availability_version(staff_user_id))
+    )
+
+
+def weekly_mask(staff_user_id, day_of_week):
+    """
+    Retourne le masque des disponibilités d'un membre du personnel pour un jour de la semaine.
+    """
+    return _cached_weekly_masks(staff_user_id, availability_version(staff_user_id)).get(
+        day_of_week, 0
+    )
+
+
+def booked_mask(staff_user_id, date):
+    """
+    Retourne le masque des créneaux réservés d'un membre du personnel pour une date.
+    """
+    mask = (
+        BookedSlotMask.objects.filter(staff_user_id=staff_user_id, date=date)
+        .values_list("mask", flat=True)
+        .first()
+    )
+    return int(mask, 16) if mask else 0
+
+
+def free_mask(staff_user_id, date):
+    """
+    Retourne le masque des créneaux libres d'un membre du personnel pour une date.
+    """
+    return weekly_mask(staff_user_id, date.weekday()) & ~booked_mask(
+        staff_user_id, date
+    )
+
+
+def free_slots(staff_user_id, date):
+    """
+    Retourne les heures de début des créneaux libres d'un membre du personnel pour une date.
+    """
+    return mask_slots(free_mask(staff_user_id, date))
+
+
+async def afree_slots(staff_user_id, date):
+    """
+    Version asynchrone de `free_slots`, pour les vues asynchrones.
+
+    Le masque réservé est lu avec l'ORM asynchrone ; les masques hebdomadaires,
+    presque toujours en cache, sont lus dans le fil des opérations synchrones.
+    """
+    available = await sync_to_async(weekly_mask)(staff_user_id, date.weekday())
+    mask = (
+        await BookedSlotMask.objects.filter(staff_user_id=staff_user_id, date=date)
+        .values_list("mask", flat=True)
+        .afirst()
+    )
+    return mask_slots(available & ~(int(mask, 16) if mask else 0))
+
+
+def _daily_free_masks(start_date, weeks, after=None):
+    """
+    Parcourt les masques des créneaux libres de tout le personnel, date par date.
+
+    L'index est lu en deux requêtes (masques hebdomadaires de tout le personnel et
+    masques réservés de la période), quel que soit le nombre de dates parcourues.
+
+    Produit :
+    ---------
+    tuple
+        (date, clé du membre du personnel, masque des créneaux libres), par date
+        croissante.
+    """
+    end_date = start_date + timedelta(weeks=weeks)
+
+    # Masques hebdomadaires de tout le personnel, regroupés par jour de la semaine
+    by_weekday = {day: [] for day in range(7)}
+    for staff_user_id, day, mask in WeeklySlotMask.objects.values_list(
+        "staff_user_id", "day_of_week", "mask"
+    ):
+        by_weekday[day].append((staff_user_id, int(mask, 16)))
+
+    booked = {
+        (staff_user_id, date): int(mask, 16)
+        for staff_user_id, date, mask in BookedSlotMask.objects.filter(
+            date__gte=start_date, date__lt=end_date
+        ).values_list("staff_user_id", "date", "mask")
+    }
+
+    current = start_date
+    while current < end_date:
+        # Masque des créneaux déjà passés le premier jour
+        past = 0
+        if after and current == start_date:
+            past = (1 << (slot_index(after) + 1)) - 1
+        for staff_user_id, mask in by_weekday[current.weekday()]:
+            yield current, staff_user_id, mask & ~booked.get(
+                (staff_user_id, current), 0
+            ) & ~past
+        current += timedelta(days=1)
+
+
+def earliest_free_slots(start_date, weeks, limit, after=None):
+    """
+    Recherche les premiers créneaux libres, tous membres du personnel confondus.
+
+    Les dates sont parcourues dans l'ordre jusqu'à obtenir `limit` créneaux.
+
+    Paramètres :
+    ------------
+    start_date : date
+        Première date examinée.
+    weeks : int
+        Nombre de semaines examinées à partir de `start_date`.
+    limit : int
+        Nombre maximal de créneaux renvoyés.
+    after : time, optionnel
+        Heure à partir de laquelle les créneaux de `start_date` sont proposés.
+
+    Retourne :
+    ---------
+    list
+        Des tuples (date, heure de début, clé du membre du personnel), triés par
+        date puis par heure.
+    """
+    results = []
+    day_slots = []
+    current = None
+    for date, staff_user_id, free in _daily_free_masks(start_date, weeks, after):
+        if date != current:
+            # Nouvelle date : les créneaux de la précédente sont complets
+            day_slots.sort()
+            results.extend(
+                (current, slot, pk) for slot, pk in day_slots[: limit - len(results)]
+            )
+            if len(results) >= limit:
+                return results
+            current, day_slots = date, []
+        day_slots.extend((slot, staff_user_id) for slot in mask_slots(free))
+    day_slots.sort()
+    results.extend(
+        (current, slot, pk) for slot, pk in day_slots[: limit - len(results)]
+    )
+    return results
+
+
+def next_free_slots(start_date, weeks, after=None):
+    """
+    Recherche le prochain créneau libre de chaque membre du personnel.
+
+    Paramètres :
+    ------------
+    start_date : date
+        Première date examinée.
+    weeks : int
+        Nombre de semaines examinées à partir de `start_date`.
+    after : time, optionnel
+        Heure à partir de laquelle les créneaux de `start_date` sont proposés.
+
+    Retourne :
+    ---------
+    dict
+        (date, heure de début) par clé de membre du personnel ; les membres du
+        personnel sans créneau libre sur la période sont absents.
+    """
+    results = {}
+    for date, staff_user_id, free in _daily_free_masks(start_date, weeks, after):
+        if free and staff_user_id not in results:
+            # Bit de poids faible : premier créneau libre de la journée
+            results[staff_user_id] = (date, slot_time((free & -free).bit_length() - 1))
+    return results
@@ -1,3 +1,567 @@
-from django.test import TestCase
+import random
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from io import StringIO
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends import locmem
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import Client, LiveServerTestCase, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from user.models import CustomUser, StaffUser
+from .agenda import team_agenda
+from .booking import SlotTaken, book_appointment
+from .ics import feed_token
+from .holds import holder, release_hold, take_hold
+from .provisioning import TEMPLATES, apply_availability_template
+from .intervals import IntervalIndex
+from .reminders import send_reminders
+from .models import Appointment, BookedSlotMask, ReminderLog
+from .slots import (
+    availability_mask,
+    booking_mask,
+    directory_version,
+    free_slots,
+    weekly_mask,
+)
+from .utilization import utilization_report
 
-# Create your tests here.
+
+class ConcurrentBookingTests(LiveServerTestCase):
+    """
+    Réservations simultanées du même créneau sur un serveur local.
+    """
+
+    clients = 12
+    csrf_token = "a" * 32
+
+    def setUp(self):
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller", password="password"
+        )
+        self.staff_user = StaffUser.objects.create(user=adviser)
+        self.date = timezone.localdate() + timedelta(days=1)
+        while self.date.weekday() >= 5:  # Disponibilités par défaut : lundi-vendredi
+            self.date += timedelta(days=1)
+
+        self.cookies = []
+        for index in range(self.clients):
+            customer = CustomUser.objects.create_user(
+                username=f"client{index}", prenom="Client", nom=str(index)
+            )
+            client = Client()
+            client.force_login(customer)
+            self.cookies.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+
+    def book(self, session, barrier):
+        url = (
+            f"{self.live_server_url}/meetings/staff/{self.staff_user.pk}"
+            f"/select_timeslot/{self.date:%Y-%m-%d}/"
+        )
+        data = urllib.parse.urlencode(
+            {"start_time": "14:00", "csrfmiddlewaretoken": self.csrf_token}
+        ).encode()
+        request = urllib.request.Request(
+            url,
+            data=data,
+            headers={
+                "Cookie": f"{settings.SESSION_COOKIE_NAME}={session}; "
+                f"{settings.CSRF_COOKIE_NAME}={self.csrf_token}"
+            },
+        )
+        opener = urllib.request.build_opener(NoRedirect)
+        barrier.wait()
+        try:
+            return opener.open(request, timeout=30).status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def test_exactly_one_concurrent_booking_wins(self):
+        barrier = threading.Barrier(self.clients)
+        with ThreadPoolExecutor(self.clients) as executor:
+            statuses = list(
+                executor.map(lambda session: self.book(session, barrier), self.cookies)
+            )
+
+        self.assertEqual(statuses.count(302), 1, statuses)
+        self.assertEqual(statuses.count(409), self.clients - 1, statuses)
+        self.assertEqual(
+            Appointment.objects.filter(
+                staff_user=self.staff_user, date=self.date, start_time=time(14)
+            ).count(),
+            1,
+        )
+        # L'index de créneaux reflète l'unique réservation
+        self.assertTrue(
+            BookedSlotMask.objects.filter(
+                staff_user=self.staff_user, date=self.date
+            ).exists()
+        )
+        self.assertNotIn(time(14), free_slots(self.staff_user.pk, self.date))
+
+
+def minutes(value):
+    return time(value // 60, value % 60)
+
+
+class IntervalIndexTests(SimpleTestCase):
+    """
+    Détection des chevauchements par l'index d'intervalles.
+    """
+
+    def test_back_to_back_intervals_do_not_overlap(self):
+        # Journée pleine de rendez-vous de 5 minutes, de 08:00 à 20:00
+        index = IntervalIndex(
+            (minutes(start), minutes(start + 5), start)
+            for start in range(8 * 60, 20 * 60, 5)
+        )
+        self.assertFalse(index.overlaps(minutes(7 * 60), minutes(8 * 60)))
+        self.assertFalse(index.overlaps(minutes(20 * 60), minutes(21 * 60)))
+        self.assertEqual(
+            index.conflict(minutes(12 * 60 + 7), minutes(12 * 60 + 8))[2], 725
+        )
+        self.assertTrue(index.overlaps(minutes(7 * 60 + 59), minutes(8 * 60 + 1)))
+
+    def test_long_interval_is_found_behind_shorter_ones(self):
+        index = IntervalIndex(
+            [
+                (time(9), time(17), "journée"),
+                (time(10), time(10, 15), "court"),
+                (time(11), time(11, 15), "court"),
+            ]
+        )
+        self.assertEqual(index.conflict(time(16), time(16, 30))[2], "journée")
+        self.assertIsNone(index.conflict(time(17), time(18)))
+        self.assertIsNone(IntervalIndex().conflict(time(9), time(10)))
+
+    def test_matches_brute_force_on_dense_random_calendars(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            intervals = []
+            for key in range(rng.randint(0, 200)):
+                start = rng.randrange(0, 23 * 60)
+                intervals.append(
+                    (minutes(start), minutes(start + rng.randint(1, 59)), key)
+                )
+            index = IntervalIndex(intervals)
+            for _ in range(50):
+                start = rng.randrange(0, 23 * 60)
+                end = start + rng.randint(1, 59)
+                expected = any(
+                    s < minutes(end) and minutes(start) < e for s, e, _ in intervals
+                )
+                self.assertEqual(index.overlaps(minutes(start), minutes(end)), expected)
+
+
+class VariableLengthBookingTests(TestCase):
+    """
+    Réservation de rendez-vous de durées variables dans un agenda chargé.
+    """
+
+    def setUp(self):
+        cache.clear()  # Masques hebdomadaires en cache d'un test précédent
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller", password="password"
+        )
+        self.staff_user = StaffUser.objects.create(user=adviser)  # 13:00 - 16:00
+        self.customer = CustomUser.objects.create_user(
+            username="client", prenom="Client", nom="Un"
+        )
+        self.date = timezone.localdate() + timedelta(days=1)
+        while self.date.weekday() >= 5:
+            self.date += timedelta(days=1)
+
+    def book(self, start, end):
+        return book_appointment(
+            self.customer, self.staff_user, self.date, minutes(start), minutes(end)
+        )
+
+    def test_dense_afternoon_of_short_appointments(self):
+        for start in range(13 * 60, 16 * 60, 15):
+            self.book(start, start + 15)
+        self.assertEqual(Appointment.objects.filter(date=self.date).count(), 12)
+
+        for start, end in [(13 * 60 + 5, 13 * 60 + 10), (14 * 60 + 50, 15 * 60 + 20)]:
+            with self.assertRaises(SlotTaken):
+                self.book(start, end)
+        self.assertEqual(free_slots(self.staff_user.pk, self.date), [])
+
+    def test_long_appointment_blocks_every_overlapping_start(self):
+        self.book(13 * 60 + 30, 15 * 60)
+        with self.assertRaises(SlotTaken):
+            self.book(14 * 60, 14 * 60 + 30)
+        with self.assertRaises(SlotTaken):
+            self.book(13 * 60, 14 * 60)
+        self.book(15 * 60, 16 * 60)
+        self.book(13 * 60, 13 * 60 + 30)
+
+    def test_clean_rejects_overlap_but_not_the_appointment_itself(self):
+        appointment = self.book(13 * 60, 14 * 60 + 30)
+        appointment.end_time = minutes(15 * 60)
+        appointment.clean()
+
+        other = Appointment(
+            user=self.customer,
+            staff_user=self.staff_user,
+            date=self.date,
+            start_time=minutes(14 * 60),
+            end_time=minutes(16 * 60),
+        )
+        with self.assertRaises(ValidationError):
+            other.clean()
+
+    def test_duration_outside_availability_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.book(15 * 60, 16 * 60 + 30)
+
+
+class ReminderTests(TestCase):
+    """
+    Envoi groupé et idempotent des rappels de rendez-vous (backend e-mail locmem).
+    """
+
+    def setUp(self):
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller"
+        )
+        self.staff_user = StaffUser.objects.create(user=adviser)
+        self.now = timezone.localtime().replace(tzinfo=None, second=0, microsecond=0)
+
+    def create(self, count, delay, email="client@example.com"):
+        """
+        Crée `count` rendez-vous d'une minute, à la suite, à partir de `delay` après
+        maintenant, sans passer par les signaux (index de créneaux inutile ici).
+        """
+        start = self.now + delay
+        customers = CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f"client-{delay}-{index}",
+                prenom="Client",
+                nom=str(index),
+                email=email,
+            )
+            for index in range(count)
+        )
+        Appointment.objects.bulk_create(
+            Appointment(
+                user=customer,
+                staff_user=self.staff_user,
+                date=(start + timedelta(minutes=index)).date(),
+                start_time=(start + timedelta(minutes=index)).time(),
+                end_time=(start + timedelta(minutes=index + 1)).time(),
+            )
+            for index, customer in enumerate(customers)
+        )
+
+    def test_each_appointment_is_reminded_once(self):
+        self.create(25, timedelta(hours=2))
+        self.create(3, timedelta(hours=30))  # Hors de la fenêtre de 24 h
+        self.create(2, timedelta(hours=3), email="")  # Sans adresse e-mail
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("send_reminders", batch_size=10, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertEqual(ReminderLog.objects.filter(kind="24h").count(), 25)
+        self.assertIn("Con Seiller", mail.outbox[0].body)
+        # Une lecture et deux écritures/lectures du journal par lot de 10
+        self.assertLessEqual(len(queries), 3 * 3 + 1)
+
+        call_command("send_reminders", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 25)
+
+    def test_failed_sends_are_retried(self):
+        self.create(4, timedelta(hours=1))
+
+        class FailingBackend(LocmemBackend):
+            failures = 1
+
+            def send_messages(self, messages):
+                if self.failures:
+                    self.failures -= 1
+                    raise OSError("SMTP indisponible")
+                return super().send_messages(messages)
+
+        sent, failed = send_reminders(connection=FailingBackend())
+        self.assertEqual((sent, failed), (3, 1))
+        self.assertEqual(send_reminders(), (1, 0))
+        self.assertEqual(len(mail.outbox), 4)
+
+
+class FeedTests(TestCase):
+    """
+    Réponses conditionnelles du flux iCalendar d'un client.
+    """
+
+    def setUp(self):
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller"
+        )
+        self.staff_user = StaffUser.objects.create(user=adviser)
+        self.customer = CustomUser.objects.create_user(
+            username="client", prenom="Cli", nom="Ent"
+        )
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        Appointment.objects.bulk_create(
+            [
+                Appointment(
+                    user=self.customer,
+                    staff_user=self.staff_user,
+                    date=tomorrow,
+                    start_time=time(10),
+                    end_time=time(11),
+                )
+            ]
+        )
+        self.url = reverse(
+            "appointment_feed", args=[feed_token("user", self.customer.pk)]
+        )
+
+    def test_renaming_the_adviser_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        adviser = self.staff_user.user
+        adviser.nom = "Renommé"
+        adviser.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Con Renommé", b"".join(response.streaming_content).decode())
+
+
+class HoldTests(TestCase):
+    """
+    Mises en attente des créneaux, partagées par tous les processus serveur.
+    """
+
+    def setUp(self):
+        cache.clear()
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller", is_staff=True
+        )
+        self.staff_user = StaffUser.objects.get(user=adviser)
+        self.first = CustomUser.objects.create_user(username="premier")
+        self.second = CustomUser.objects.create_user(username="second")
+        self.date = timezone.localdate() + timedelta(days=1)
+
+    def process_cache(self):
+        """
+        Ouvre le cache comme un autre processus serveur : sans partager la mémoire du
+        processus courant (un cache en mémoire y serait vide).
+        """
+        with mock.patch.multiple(locmem, _caches={}, _expire_info={}, _locks={}):
+            return caches.create_connection("shared")
+
+    def test_holds_are_shared_between_processes(self):
+        worker_a, worker_b = self.process_cache(), self.process_cache()
+
+        with mock.patch("meetings.holds.shared_cache", worker_a):
+            self.assertIsNotNone(self.hold(self.first, time(10), time(11)))
+        with mock.patch("meetings.holds.shared_cache", worker_b):
+            self.assertIsNone(self.hold(self.second, time(10), time(11)))
+            self.assertEqual(
+                holder(self.staff_user.pk, self.date, time(10)), self.first.pk
+            )
+            release_hold(self.first, self.staff_user.pk, self.date, time(10), time(11))
+        with mock.patch("meetings.holds.shared_cache", worker_a):
+            self.assertIsNone(holder(self.staff_user.pk, self.date, time(10)))
+
+    def test_booking_page_hides_slots_held_by_others(self):
+        monday = self.date + timedelta(days=(7 - self.date.weekday()) % 7 or 7)
+        self.date = monday  # Disponibilités par défaut : 13h-16h en semaine
+        self.hold(self.first, time(13), time(14))
+        client = Client()
+        client.force_login(self.second)
+        response = client.get(
+            f"/meetings/staff/{self.staff_user.pk}/select_timeslot/{monday:%Y-%m-%d}/"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["available_timeslots"], [time(14), time(15)])
+
+    def hold(self, user, start_time, end_time):
+        return take_hold(user, self.staff_user.pk, self.date, start_time, end_time)
+
+    def test_long_appointment_holds_every_covered_slot(self):
+        self.assertIsNotNone(self.hold(self.first, time(10), time(11, 30)))
+        for start in (time(11), time(11, 15)):
+            self.assertIsNone(self.hold(self.second, start, time(12)))
+        self.assertEqual(holder(self.staff_user.pk, self.date, time(11)), self.first.pk)
+
+        # Chevauchement par le début : les créneaux déjà pris sont rendus
+        self.assertIsNone(self.hold(self.second, time(9), time(10, 30)))
+        self.assertIsNone(holder(self.staff_user.pk, self.date, time(9)))
+        self.assertIsNotNone(self.hold(self.second, time(9), time(10)))
+        self.assertIsNotNone(self.hold(self.second, time(12), time(13)))
+
+    def test_new_hold_releases_the_previous_one(self):
+        self.hold(self.first, time(10), time(12))
+        self.hold(self.first, time(14), time(15))
+        self.assertIsNotNone(self.hold(self.second, time(10), time(12)))
+
+
+class TeamAgendaTests(TestCase):
+    """
+    Fragments de l'agenda d'équipe, mis en cache sous l'empreinte de l'index.
+    """
+
+    def setUp(self):
+        cache.clear()
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller", is_staff=True
+        )
+        self.staff_user = StaffUser.objects.get(user=adviser)
+        today = timezone.localdate()
+        self.week = today - timedelta(days=today.weekday())
+
+    def fragment(self):
+        return team_agenda([self.staff_user], self.week, 1)[0]["weeks"][0]
+
+    def test_fragment_follows_changes_made_without_signals(self):
+        before = self.fragment()
+        with mock.patch("meetings.agenda.render_to_string") as render:
+            self.assertEqual(self.fragment(), before)
+        render.assert_not_called()
+
+        # Écriture directe dans l'index, comme une insertion groupée ou un autre
+        # processus : aucune version n'est incrémentée
+        BookedSlotMask.objects.create(
+            staff_user=self.staff_user,
+            date=self.week,
+            mask=format(booking_mask(time(13), time(14)), "x"),
+        )
+        self.assertNotEqual(self.fragment(), before)
+        self.assertIn("bg-red-400", self.fragment())
+
+
+class AvailabilityTemplateTests(TestCase):
+    """
+    Application d'un modèle de disponibilités à des conseillers.
+    """
+
+    def test_replace_swaps_the_availability_and_the_index(self):
+        adviser = CustomUser.objects.create_user(username="conseiller", is_staff=True)
+        staff_user = StaffUser.objects.get(user=adviser)
+        self.assertEqual(staff_user.availabilities.count(), 5)  # Modèle par défaut
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_availability_template([staff_user.pk], TEMPLATES["matin"], True)
+        self.assertEqual(
+            set(staff_user.availabilities.values_list("start_time", flat=True)),
+            {time(9)},
+        )
+        self.assertEqual(
+            weekly_mask(staff_user.pk, 0), availability_mask(time(9), time(12))
+        )
+
+
+class DirectorySignalTests(TestCase):
+    """
+    Invalidation de l'annuaire des conseillers après la modification d'un compte.
+    """
+
+    def test_customer_save_runs_no_extra_query(self):
+        customer = CustomUser.objects.create_user(username="client")
+        customer = CustomUser.objects.get(pk=customer.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(1):  # La mise à jour seule
+                customer.save()
+        self.assertEqual(callbacks, [])
+
+    def test_adviser_rename_invalidates_the_directory(self):
+        adviser = CustomUser.objects.create_user(username="conseiller", is_staff=True)
+        adviser = CustomUser.objects.get(pk=adviser.pk)
+        version = directory_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            adviser.save(update_fields=["last_login"])
+        self.assertEqual(directory_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            adviser.username = "conseillere"
+            adviser.save(update_fields=["username"])
+        self.assertNotEqual(directory_version(), version)
+
+
+class UtilizationTests(TestCase):
+    """
+    Taux d'occupation par conseiller et par semaine, et cache par signature.
+    """
+
+    def setUp(self):
+        cache.clear()
+        adviser = CustomUser.objects.create_user(
+            username="conseiller", prenom="Con", nom="Seiller", is_staff=True
+        )
+        self.staff_user = StaffUser.objects.get(user=adviser)
+        today = timezone.localdate()
+        self.closed_week = today - timedelta(days=today.weekday(), weeks=1)
+
+    def book(self, start, end):
+        Appointment.objects.create(
+            user=CustomUser.objects.create_user(username=f"client-{start}"),
+            staff_user=self.staff_user,
+            date=self.closed_week,
+            start_time=time(start),
+            end_time=time(end),
+        )
+
+    def test_weeks_are_cached_until_their_data_changes(self):
+        self.book(13, 15)
+        report = utilization_report([self.staff_user], self.closed_week, 2)
+        self.assertEqual(
+            report["rows"][0]["cells"][0],
+            {"available": 15.0, "booked": 2.0, "appointments": 1, "rate": 13},
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            utilization_report([self.staff_user], self.closed_week, 1)
+        self.assertEqual(len(queries), 2)  # Seules les signatures des semaines
+
+        # Insertion groupée, sans signal : la signature de la semaine change
+        Appointment.objects.bulk_create(
+            [
+                Appointment(
+                    user=CustomUser.objects.create_user(username="client-groupe"),
+                    staff_user=self.staff_user,
+                    date=self.closed_week,
+                    start_time=time(15),
+                    end_time=time(16),
+                )
+            ]
+        )
+        report = utilization_report([self.staff_user], self.closed_week, 1)
+        self.assertEqual(report["rows"][0]["total"]["booked"], 3.0)
+
+    def test_csv_export(self):
+        self.book(13, 14)
+        client = Client()
+        client.force_login(self.staff_user.user)
+        response = client.get(
+            f"/meetings/reports/utilization/{self.closed_week:%Y-%m-%d}/",
+            {"weeks": 1, "format": "csv"},
+        )
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn(
+            f"Con Seiller,{self.closed_week:%Y-%m-%d},15.0,1.0,1,7",
+            response.content.decode().splitlines(),
+        )
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """
+    Renvoie la réponse de redirection au lieu de la suivre.
+    """
+
+    def redirect_request(self, *args, **kwargs):
+        return None
@@ -1,15 +1,25 @@
 from django.urls import path, include
 from .views import (
     StaffAgendaView,
+    AgendaEventsView,
+    TeamAgendaView,
+    UtilizationReportView,
     StaffUserListView,
     SelectDateView,
     SelectTimeslotView,
+    HoldTimeslotView,
     UserListView,
+    EarliestSlotView,
+    AppointmentFeedView,
 )
 
 urlpatterns = [
     path("staff/", StaffUserListView.as_view(), name="staff_list"),
     path("user/", UserListView.as_view(), name="user_meeting_list"),
+    path("earliest/", EarliestSlotView.as_view(), name="earliest_slots"),
+    path(
+        "feeds/<str:token>.ics", AppointmentFeedView.as_view(), name="appointment_feed"
+    ),
     path(
         "staff/<int:staff_user_id>/select_date/",
         SelectDateView.as_view(),
@@ -20,7 +30,33 @@ urlpatterns = [
         SelectTimeslotView.as_view(),
         name="select_timeslot",
     ),
+    path(
+        "staff/<int:staff_user_id>/hold_timeslot/<str:date>/",
+        HoldTimeslotView.as_view(),
+        name="hold_timeslot",
+    ),
     path("agenda/", StaffAgendaView.as_view(), name="agenda"),
+    path("agenda/team/", TeamAgendaView.as_view(), name="team_agenda"),
+    path(
+        "agenda/team/<str:week_start_date>/",
+        TeamAgendaView.as_view(),
+        name="team_agenda_by_date",
+    ),
+    path(
+        "reports/utilization/",
+        UtilizationReportView.as_view(),
+        name="utilization_report",
+    ),
+    path(
+        "reports/utilization/<str:week_start_date>/",
+        UtilizationReportView.as_view(),
+        name="utilization_report_by_date",
+    ),
+    path(
+        "agenda/<str:week_start_date>/events/",
+        AgendaEventsView.as_view(),
+        name="agenda_events",
+    ),
     path(
         "agenda/<str:week_start_date>/",
         StaffAgendaView.as_view(),
@@ -0,0 +1,194 @@
+"""
+Taux d'occupation des conseillers : heures réservées et heures disponibles, par
+conseiller et par semaine.
+
+Les deux grandeurs sont calculées par la base, par des agrégats groupés :
+
+- la capacité hebdomadaire d'un conseiller est la somme des durées de ses
+  disponibilités (`Availability`, une plage par jour de la semaine) ;
+- les heures réservées sont la somme des durées des rendez-vous (`Appointment`),
+  groupées par conseiller et par semaine (`TruncWeek`).
+
+Le résultat de chaque semaine est mis en cache sous une signature lue en base
+(`week_signatures` : nombre, dernière modification et durée totale des rendez-vous
+de la semaine et des disponibilités) : toute modification, faite par un autre
+processus, une commande ou une insertion groupée, change la clé. Les entrées
+expirent après `settings.MEETINGS_UTILIZATION_CACHE_SECONDS`. Un rapport de
+plusieurs mois ne recalcule donc que ses semaines modifiées.
+"""
+
+import hashlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import TruncWeek
+from .models import Appointment, Availability
+
+DURATION = ExpressionWrapper(
+    F("end_time") - F("start_time"), output_field=DurationField()
+)
+
+
+def _week_key(week, signature):
+    digest = hashlib.md5(str(signature).encode(), usedforsecurity=False).hexdigest()
+    return f"meetings:utilization:{week:%Y-%m-%d}:{digest}"
+
+
+def _signature(queryset):
+    return tuple(
+        queryset.aggregate(
+            count=Count("pk"), updated=Max("updated_at"), total=Sum(DURATION)
+        ).values()
+    )
+
+
+def week_signatures(weeks):
+    """
+    Signature des données de chaque semaine, en deux requêtes d'agrégats.
+
+    Paramètres :
+    ------------
+    weeks : list
+        Lundis des semaines, dans l'ordre.
+
+    Retourne :
+    ---------
+    dict
+        Par semaine, un tuple qui change avec ses rendez-vous ou avec les
+        disponibilités des conseillers.
+    """
+    availability = _signature(Availability.objects.all())
+    appointments = {
+        week: (count, updated, total)
+        for week, count, updated, total in Appointment.objects.filter(
+            date__range=[weeks[0], weeks[-1] + timedelta(days=6)]
+        )
+        .annotate(week=TruncWeek("date"))
+        .values("week")
+        .annotate(count=Count("pk"), updated=Max("updated_at"), total=Sum(DURATION))
+        .values_list("week", "count", "updated", "total")
+        .order_by()
+    }
+    return {week: (appointments.get(week), availability) for week in weeks}
+
+
+def capacity_hours():
+    """
+    Capacité hebdomadaire de chaque conseiller, en heures (une requête d'agrégat).
+    """
+    return {
+        staff_user_id: minutes.total_seconds() / 3600
+        for staff_user_id, minutes in Availability.objects.values("staff_user_id")
+        .annotate(total=Sum(DURATION))
+        .values_list("staff_user_id", "total")
+        if minutes
+    }
+
+
+def booked_hours(first_week, last_week):
+    """
+    Heures réservées et nombre de rendez-vous par (conseiller, semaine), pour les
+    semaines de `first_week` à `last_week` incluses (une requête d'agrégat).
+    """
+    rows = (
+        Appointment.objects.filter(
+            date__range=[first_week, last_week + timedelta(days=6)]
+        )
+        .annotate(week=TruncWeek("date"))
+        .values("staff_user_id", "week")
+        .annotate(total=Sum(DURATION), count=Count("pk"))
+        .values_list("staff_user_id", "week", "total", "count")
+        .order_by()
+    )
+    return {
+        (staff_user_id, week): (total.total_seconds() / 3600 if total else 0, count)
+        for staff_user_id, week, total, count in rows
+    }
+
+
+def weekly_utilization(weeks):
+    """
+    Calcule l'occupation de chaque conseiller pour les semaines demandées.
+
+    Paramètres :
+    ------------
+    weeks : list
+        Lundis des semaines, dans l'ordre.
+
+    Retourne :
+    ---------
+    dict
+        Par semaine, un dictionnaire {clé du conseiller: (heures disponibles,
+        heures réservées, nombre de rendez-vous)}.
+    """
+    keys = {
+        week: _week_key(week, signature)
+        for week, signature in week_signatures(weeks).items()
+    }
+    cached = cache.get_many(list(keys.values()))
+    results = {week: cached[keys[week]] for week in weeks if keys[week] in cached}
+    missing = [week for week in weeks if week not in results]
+    if not missing:
+        return results
+
+    capacity = capacity_hours()
+    booked = booked_hours(min(missing), max(missing))
+    for week in missing:
+        staff_ids = set(capacity) | {pk for pk, day in booked if day == week}
+        results[week] = {
+            pk: (capacity.get(pk, 0), *booked.get((pk, week), (0, 0)))
+            for pk in staff_ids
+        }
+    cache.set_many(
+        {keys[week]: results[week] for week in missing},
+        settings.MEETINGS_UTILIZATION_CACHE_SECONDS,
+    )
+    return results
+
+
+def utilization_report(staff_users, first_week, weeks):
+    """
+    Construit le rapport d'occupation de plusieurs semaines.
+
+    Paramètres :
+    ------------
+    staff_users : list
+        Conseillers à afficher (avec `user` déjà chargé).
+    first_week : date
+        Lundi de la première semaine.
+    weeks : int
+        Nombre de semaines.
+
+    Retourne :
+    ---------
+    dict
+        `weeks` : lundis des semaines ; `rows` : une ligne par conseiller
+        {"staff_user", "cells", "total"}, chaque cellule et le total étant
+        {"available", "booked", "appointments", "rate"} (taux en %, ou None).
+    """
+    week_starts = [first_week + timedelta(weeks=index) for index in range(weeks)]
+    utilization = weekly_utilization(week_starts)
+
+    rows = []
+    for staff_user in staff_users:
+        cells = [
+            _cell(*utilization[week].get(staff_user.pk, (0, 0, 0)))
+            for week in week_starts
+        ]
+        total = _cell(
+            sum(cell["available"] for cell in cells),
+            sum(cell["booked"] for cell in cells),
+            sum(cell["appointments"] for cell in cells),
+        )
+        rows.append({"staff_user": staff_user, "cells": cells, "total": total})
+    return {"weeks": week_starts, "rows": rows}
+
+
+def _cell(available, booked, appointments):
+    return {
+        "available": round(available, 1),
+        "booked": round(booked, 1),
+        "appointments": appointments,
+        "rate": round(100 * booked / available) if available else None,
+    }
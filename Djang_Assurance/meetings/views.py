@@ -1,19 +1,73 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import csv
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, get_object_or_404, redirect
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.views.generic import TemplateView, ListView
-from .models import Availability, Appointment
+from .models import AgendaEvent, Appointment
 from datetime import datetime, timedelta
 from django.views import View
 from user.models import StaffUser
 from django.core.exceptions import ValidationError
 from django.contrib.auth.mixins import LoginRequiredMixin
-from user.permissions import StaffRequiredMixin
+from user.permissions import AsyncUserMixin, StaffRequiredMixin
+from .agenda import (
+    agenda_validators,
+    render_day_rows,
+    team_agenda,
+    week_grid,
+    week_start,
+)
+from .booking import SlotTaken, book_appointment, end_time_for
+from .holds import covered_slots, held_by_others, release_hold, take_hold
+from .live import agenda_stream, last_event_id
+from .utilization import utilization_report
+from .ics import feed_lines, feed_since, feed_token, feed_validators, read_feed_token
+from .slots import (
+    afree_slots,
+    booking_mask,
+    directory_version,
+    earliest_free_slots,
+    free_mask,
+    free_slots,
+    next_free_slots,
+    slot_index,
+    weekly_masks,
+)
+
+
+def feed_url(request, kind, owner_id):
+    """
+    Retourne l'adresse absolue du flux iCalendar ("staff" ou "user") d'un propriétaire.
+    """
+    return request.build_absolute_uri(
+        reverse("appointment_feed", args=[feed_token(kind, owner_id)])
+    )
 
 
 class StaffAgendaView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
     """
     Vue pour afficher l'agenda hebdomadaire d'un StaffUser.
 
+    La réponse porte un ETag et une date Last-Modified calculés par une requête
+    d'agrégats (`meetings.agenda.agenda_validators`) : une semaine inchangée depuis
+    le dernier affichage reçoit une réponse 304 sans que l'agenda soit reconstruit.
+
     Attributs :
     -----------
     template_name : str
@@ -21,99 +75,287 @@ class StaffAgendaView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
 
     Méthodes :
     ----------
+    get(request, *args, **kwargs):
+        Répond 304 si l'agenda de la semaine n'a pas changé, sinon l'affiche.
     get_context_data(**kwargs):
         Prépare les données nécessaires pour afficher l'agenda.
     """
 
     template_name = "meetings/meetings_list.html"
 
-    def get_context_data(self, **kwargs):
-        """
-        Prépare le contexte pour afficher l'agenda hebdomadaire.
-
-        Paramètres :
-        ------------
-        **kwargs : dict
-            Arguments supplémentaires passés à la vue.
-
-        Retourne :
-        ---------
-        dict
-            Contexte contenant les informations sur l'agenda.
-        """
-        context = super().get_context_data(**kwargs)
-
+    def get(self, request, *args, **kwargs):
         # Récupérer l'utilisateur authentifié
-        staff_user = StaffUser.objects.get(user=self.request.user)
+        self.staff_user = get_object_or_404(StaffUser, user=request.user)
 
         # Récupérer la date de début de la semaine
         week_start_date = kwargs.get("week_start_date")
 
         if not week_start_date:
             # Si pas de date dans l'URL, on prend la date de la semaine en cours
-            week_start_date = timezone.now().date() - timedelta(
+            self.week_start_date = timezone.now().date() - timedelta(
                 days=timezone.now().weekday()
             )
         else:
             # Convertir la date de début de semaine en objet date
-            week_start_date = timezone.datetime.strptime(
+            self.week_start_date = timezone.datetime.strptime(
                 week_start_date, "%Y-%m-%d"
             ).date()
 
         # Calculer la fin de la semaine
-        week_end_date = week_start_date + timedelta(days=6)
+        self.week_end_date = self.week_start_date + timedelta(days=6)
+
+        etag, last_modified = agenda_validators(
+            self.staff_user.pk, self.week_start_date, self.week_end_date
+        )
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response.headers["ETag"] = etag
+        if last_modified:
+            response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+        # Le navigateur garde la page mais la revalide à chaque affichage
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
-        # Récupérer les disponibilités du StaffUser pour la semaine
-        availabilities = Availability.objects.filter(staff_user=staff_user)
+    def get_context_data(self, **kwargs):
+        """
+        Prépare le contexte pour afficher l'agenda hebdomadaire.
 
-        # Récupérer les rendez-vous déjà pris pour le StaffUser sur la semaine
+        Paramètres :
+        ------------
+        **kwargs : dict
+            Arguments supplémentaires passés à la vue.
+
+        Retourne :
+        ---------
+        dict
+            Contexte contenant les informations sur l'agenda.
+        """
+        context = super().get_context_data(**kwargs)
+        staff_user = self.staff_user
+        week_start_date = self.week_start_date
+        week_end_date = self.week_end_date
+
+        # Récupérer les rendez-vous de la semaine avec leur client (une seule requête)
         appointments = Appointment.objects.filter(
             staff_user=staff_user, date__range=[week_start_date, week_end_date]
-        )
+        ).values_list("date", "start_time", "end_time", "user__username")
 
-        # Préparer le contexte pour le template
-        week_days = [0, 1, 2, 3, 4, 5, 6]  # Lundi à Dimanche
-        time_slots = [f"{hour}:00" for hour in range(9, 19)]  # Créneaux de 9h à 18h
-
-        # Initialiser une liste pour l'agenda
-        agenda = []
-
-        # Remplir l'agenda avec les disponibilités
-        for day in week_days:
-            for slot in time_slots:
-                # Initialiser l'état à "Disponible"
-                state = ""
-
-                # Vérifier si ce créneau correspond à une disponibilité
-                availability = availabilities.filter(
-                    day_of_week=day,
-                    start_time__lte=slot,
-                    end_time__gte=slot,
-                ).first()
-                if availability:
-                    state = "Disponible"
-
-                # Vérifier si un rendez-vous a été pris
-                appointment = appointments.filter(
-                    date__week_day=day
-                    + 1,  # Django utilise 1 pour Lundi, 7 pour Dimanche
-                    start_time=slot,
-                ).first()
-                if appointment:
-                    state = appointment.user.username  # Afficher le username du client
-
-                agenda.append({"day": day, "slot": slot, "state": state})
+        # Construire la grille : disponibilités (index de créneaux) et rendez-vous
+        grid = week_grid(week_start_date, weekly_masks(staff_user.pk), appointments)
 
         # Ajouter les variables au contexte
-        context["agenda"] = agenda
-        context["days_of_week"] = Availability.DAYS_OF_WEEK
-        context["time_slots"] = time_slots
+        context["agenda"] = render_day_rows(staff_user.pk, grid["rows"])
+        context["time_slots"] = grid["headers"]
         context["week_start_date"] = week_start_date
         context["previous_week"] = week_start_date - timedelta(days=7)
         context["next_week"] = week_start_date + timedelta(days=7)
+        context["feed_url"] = feed_url(self.request, "staff", staff_user.pk)
+        context["live_after"] = (
+            AgendaEvent.objects.order_by("-pk").values_list("pk", flat=True).first()
+            or 0
+        )
         return context
 
 
+class AgendaEventsView(View):
+    """
+    Flux Server-Sent Events des modifications d'une semaine de l'agenda du membre du
+    personnel connecté (vue asynchrone, voir `meetings.live`).
+
+    Sous un serveur ASGI, la connexion reste ouverte et reçoit les réservations et
+    annulations au fil de l'eau ; sous WSGI, chaque connexion transmet les
+    événements en attente puis se ferme, et le navigateur se reconnecte.
+
+    Méthodes :
+    ----------
+    get(request, week_start_date):
+        Ouvre le flux de la semaine commençant le lundi `week_start_date`.
+    """
+
+    async def get(self, request, week_start_date):
+        user = await request.auser()
+        if not user.is_authenticated or not user.is_staff:
+            return HttpResponseForbidden()
+        staff_user_id = (
+            await StaffUser.objects.filter(user=user)
+            .values_list("pk", flat=True)
+            .afirst()
+        )
+        if staff_user_id is None:
+            raise Http404("Membre du personnel introuvable.")
+        try:
+            week_start_date = week_start(
+                datetime.strptime(week_start_date, "%Y-%m-%d").date()
+            )
+        except ValueError:
+            raise Http404("Date invalide.")
+
+        after = request.headers.get("Last-Event-ID") or request.GET.get("after")
+        after = int(after) if after and after.isdigit() else await last_event_id()
+        response = StreamingHttpResponse(
+            agenda_stream(
+                staff_user_id,
+                week_start_date,
+                after,
+                live=isinstance(request, ASGIRequest),
+            ),
+            content_type="text/event-stream",
+        )
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"  # Pas de mise en tampon (proxy)
+        return response
+
+
+class TeamAgendaView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
+    """
+    Vue pour afficher l'agenda de tous les conseillers côte à côte, sur une semaine
+    ou plusieurs (`?weeks=4` pour un mois), afin d'équilibrer la charge.
+
+    Attributs :
+    -----------
+    template_name : str
+        Chemin vers le template utilisé pour afficher l'agenda d'équipe.
+    max_weeks : int
+        Nombre maximal de semaines affichées.
+
+    Méthodes :
+    ----------
+    get_context_data(**kwargs):
+        Prépare les lignes de l'agenda (voir `meetings.agenda`).
+    """
+
+    template_name = "meetings/team_agenda.html"
+    max_weeks = 5
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        if kwargs.get("week_start_date"):
+            first_week = week_start(
+                datetime.strptime(kwargs["week_start_date"], "%Y-%m-%d").date()
+            )
+        else:
+            first_week = week_start(timezone.localdate())
+        try:
+            weeks = min(max(int(self.request.GET.get("weeks", 1)), 1), self.max_weeks)
+        except ValueError:
+            weeks = 1
+
+        staff_users = list(
+            StaffUser.objects.select_related("user").order_by(
+                "user__nom", "user__prenom"
+            )
+        )
+
+        context["rows"] = team_agenda(staff_users, first_week, weeks)
+        context["days"] = [first_week + timedelta(days=day) for day in range(7 * weeks)]
+        context["weeks"] = weeks
+        context["week_start_date"] = first_week
+        context["end_date"] = first_week + timedelta(days=7 * weeks - 1)
+        context["previous_week"] = first_week - timedelta(weeks=weeks)
+        context["next_week"] = first_week + timedelta(weeks=weeks)
+        return context
+
+
+class UtilizationReportView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
+    """
+    Vue du taux d'occupation des conseillers : heures réservées et heures disponibles
+    par conseiller et par semaine (`meetings.utilization`), exportable en CSV
+    (`?format=csv`).
+
+    Attributs :
+    -----------
+    template_name : str
+        Chemin vers le template utilisé pour afficher le rapport.
+    default_weeks : int
+        Nombre de semaines affichées par défaut (jusqu'à la semaine en cours).
+    max_weeks : int
+        Nombre maximal de semaines d'un rapport (`?weeks=`).
+
+    Méthodes :
+    ----------
+    get_context_data(**kwargs):
+        Prépare le rapport de la période demandée.
+    render_to_response(context, **response_kwargs):
+        Rend le rapport en HTML, ou en CSV si `?format=csv`.
+    """
+
+    template_name = "meetings/utilization_report.html"
+    default_weeks = 8
+    max_weeks = 53
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        try:
+            weeks = int(self.request.GET.get("weeks", self.default_weeks))
+        except ValueError:
+            weeks = self.default_weeks
+        weeks = min(max(weeks, 1), self.max_weeks)
+        if kwargs.get("week_start_date"):
+            try:
+                first_week = week_start(
+                    datetime.strptime(kwargs["week_start_date"], "%Y-%m-%d").date()
+                )
+            except ValueError:
+                raise Http404("Date invalide.")
+        else:
+            first_week = week_start(timezone.localdate()) - timedelta(weeks=weeks - 1)
+
+        staff_users = list(
+            StaffUser.objects.select_related("user").order_by(
+                "user__nom", "user__prenom"
+            )
+        )
+        context.update(utilization_report(staff_users, first_week, weeks))
+        context["weeks_count"] = weeks
+        context["week_start_date"] = first_week
+        context["end_date"] = first_week + timedelta(days=7 * weeks - 1)
+        context["previous_week"] = first_week - timedelta(weeks=weeks)
+        context["next_week"] = first_week + timedelta(weeks=weeks)
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get("format") != "csv":
+            return super().render_to_response(context, **response_kwargs)
+
+        response = HttpResponse(content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = (
+            "attachment; filename="
+            f'"occupation-{context["week_start_date"]:%Y-%m-%d}.csv"'
+        )
+        writer = csv.writer(response)
+        writer.writerow(
+            [
+                "conseiller",
+                "semaine",
+                "heures_disponibles",
+                "heures_reservees",
+                "rendez_vous",
+                "taux_occupation",
+            ]
+        )
+        for row in context["rows"]:
+            name = f"{row['staff_user'].user.prenom} {row['staff_user'].user.nom}"
+            for week, cell in zip(context["weeks"], row["cells"]):
+                writer.writerow(
+                    [
+                        name,
+                        f"{week:%Y-%m-%d}",
+                        cell["available"],
+                        cell["booked"],
+                        cell["appointments"],
+                        "" if cell["rate"] is None else cell["rate"],
+                    ]
+                )
+        return response
+
+
 class StaffUserListView(LoginRequiredMixin, ListView):
     """
     Vue pour afficher la liste des StaffUsers.
@@ -126,11 +368,108 @@ class StaffUserListView(LoginRequiredMixin, ListView):
         Chemin vers le template utilisé pour afficher la liste.
     context_object_name : str
         Nom de la variable de contexte contenant les objets.
+    weeks : int
+        Nombre de semaines examinées pour trouver le prochain créneau libre.
+
+    Méthodes :
+    ----------
+    get_queryset():
+        Charge les conseillers avec leur compte utilisateur (une seule requête).
+    get_context_data(**kwargs):
+        Fournit l'annuaire rendu, depuis le cache s'il est à jour.
     """
 
     model = StaffUser
     template_name = "meetings/staff_user_list.html"
     context_object_name = "staff_users"
+    weeks = 8
+
+    def get_queryset(self):
+        return StaffUser.objects.select_related("user").order_by("pk")
+
+    def get_context_data(self, **kwargs):
+        """
+        L'annuaire rendu est mis en cache sous la version de l'annuaire (incrémentée
+        à chaque modification d'un profil, d'une disponibilité ou d'un rendez-vous) et
+        le créneau en cours : il est recalculé dès qu'un prochain créneau libre est passé.
+        """
+        context = super().get_context_data(**kwargs)
+        now = timezone.localtime()
+        key = (
+            f"meetings:directory:{directory_version()}:"
+            f"{now:%Y-%m-%d}:{slot_index(now.time())}"
+        )
+        directory = cache.get(key)
+        if directory is None:
+            # Prochain créneau libre de chaque conseiller, lu dans l'index en deux requêtes
+            next_slots = next_free_slots(now.date(), self.weeks, after=now.time())
+            directory = render_to_string(
+                "meetings/staff_user_directory.html",
+                {
+                    "staff_users": [
+                        (staff_user, next_slots.get(staff_user.pk))
+                        for staff_user in self.object_list
+                    ]
+                },
+            )
+            cache.set(key, directory, 24 * 3600)
+        context["directory"] = mark_safe(directory)
+        return context
+
+
+class EarliestSlotView(LoginRequiredMixin, TemplateView):
+    """
+    Vue pour afficher les premiers créneaux libres, tous conseillers confondus.
+
+    Attributs :
+    -----------
+    template_name : str
+        Chemin vers le template utilisé pour afficher les créneaux.
+    limit : int
+        Nombre de créneaux proposés.
+    max_weeks : int
+        Nombre maximal de semaines examinées.
+
+    Méthodes :
+    ----------
+    get_context_data(**kwargs):
+        Recherche les créneaux dans l'index de créneaux et charge leurs conseillers.
+    """
+
+    template_name = "meetings/earliest_slots.html"
+    limit = 10
+    max_weeks = 26
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            weeks = min(max(int(self.request.GET.get("weeks", 4)), 1), self.max_weeks)
+        except ValueError:
+            weeks = 4
+
+        now = timezone.localtime()
+        slots = earliest_free_slots(now.date(), weeks, self.limit * 2, after=now.time())
+        # Écarter les créneaux en attente pour d'autres clients
+        held = held_by_others(
+            self.request.user,
+            [(staff_user_id, date, slot) for date, slot, staff_user_id in slots],
+        )
+        slots = [
+            (date, slot, staff_user_id)
+            for date, slot, staff_user_id in slots
+            if (staff_user_id, date, slot) not in held
+        ][: self.limit]
+
+        # Charger les conseillers concernés en une seule requête
+        staff_users = StaffUser.objects.select_related("user").in_bulk(
+            {staff_user_id for _, _, staff_user_id in slots}
+        )
+        context["slots"] = [
+            {"date": date, "start_time": start_time, "staff_user": staff_users[pk]}
+            for date, start_time, pk in slots
+        ]
+        context["weeks"] = weeks
+        return context
 
 
 class SelectDateView(LoginRequiredMixin, View):
@@ -167,122 +506,245 @@ class SelectDateView(LoginRequiredMixin, View):
         )
 
 
-class SelectTimeslotView(LoginRequiredMixin, View):
+class SelectTimeslotView(AsyncUserMixin, LoginRequiredMixin, View):
     """
     Vue pour sélectionner un créneau horaire pour un rendez-vous.
 
+    Les créneaux mis en attente par d'autres clients (voir `meetings.holds`) ne sont
+    pas proposés.
+
+    Vue asynchrone : l'affichage des créneaux utilise l'ORM asynchrone. La
+    réservation (transactions et verrous, voir `meetings.booking`) reste synchrone
+    et s'exécute dans le fil des opérations synchrones.
+
     Méthodes :
     ----------
     get(request, staff_user_id, date):
         Affiche les créneaux horaires disponibles pour une date donnée.
     post(request, staff_user_id, date):
-        Traite le créneau sélectionné et crée un rendez-vous.
+        Exécute `submit` hors de la boucle d'événements.
+    submit(request, staff_user_id, date):
+        Confirme le créneau mis en attente et crée un rendez-vous.
     """
 
-    def get(self, request, staff_user_id, date):
-        staff_user = get_object_or_404(StaffUser, user__id=staff_user_id)
+    async def get(self, request, staff_user_id, date):
+        staff_user = await aget_object_or_404(
+            StaffUser.objects.select_related("user"), user__id=staff_user_id
+        )
         selected_date = datetime.strptime(date, "%Y-%m-%d").date()
 
-        # Récupérer toutes les disponibilités du StaffUser pour cette date
-        availabilities = Availability.objects.filter(staff_user=staff_user)
-
-        # Créer une liste de créneaux horaires disponibles pour cette date
-        available_timeslots = []
-        for availability in availabilities:
-            start_time = availability.start_time
-            end_time = availability.end_time
-
-            # Ajouter tous les créneaux horaires disponibles entre start_time et end_time pour la date sélectionnée
-            current_time = start_time
-            while current_time < end_time:
-                available_timeslots.append(current_time)
-                current_time = (
-                    datetime.combine(datetime.today(), current_time)
-                    + timedelta(hours=1)
-                ).time()
-
-        # Vérifier les rendez-vous existants pour cette date spécifique et exclure les créneaux réservés
-        booked_timeslots = Appointment.objects.filter(
-            staff_user=staff_user, date=selected_date  # Filtrer par la date spécifiée
-        ).values_list("start_time", flat=True)
-
-        # Exclure les créneaux déjà réservés
-        available_timeslots = [
-            slot for slot in available_timeslots if slot not in booked_timeslots
-        ]
-
+        slots = await afree_slots(staff_user.pk, selected_date)
+        # Les mises en attente sont lues dans le cache partagé, en base : hors de la
+        # boucle d'événements
+        available_timeslots = await sync_to_async(self.without_held)(
+            staff_user, selected_date, slots
+        )
         return render(
             request,
             "meetings/select_timeslot.html",
             {
                 "staff_user": staff_user,
                 "available_timeslots": available_timeslots,
+                "durations": settings.MEETINGS_APPOINTMENT_DURATIONS,
                 "selected_date": selected_date.strftime("%Y-%m-%d"),
             },
         )
 
-    def post(self, request, staff_user_id, date):
-        staff_user = get_object_or_404(StaffUser, user__id=staff_user_id)
-        start_time_str = request.POST.get("start_time")
-
-        # Convertir le start_time (string) en objet time
-        start_time = datetime.strptime(start_time_str, "%H:%M").time()
+    async def post(self, request, staff_user_id, date):
+        return await sync_to_async(self.submit)(request, staff_user_id, date)
 
-        # Convertir la date (string) en objet date
+    def submit(self, request, staff_user_id, date):
+        staff_user = get_object_or_404(StaffUser, user__id=staff_user_id)
         selected_date = datetime.strptime(date, "%Y-%m-%d").date()
+        start_time, end_time = self.parse_slot(request)
+        if end_time is None:
+            return self.render_error(
+                request, staff_user, selected_date, "Créneau invalide.", status=400
+            )
 
-        # Vérifier si le créneau est déjà réservé
-        if Appointment.objects.filter(
-            staff_user=staff_user, date=selected_date, start_time=start_time
-        ).exists():
-            return render(
+        # Aucun créneau couvert ne doit être en attente pour un autre client
+        if held_by_others(
+            request.user,
+            [
+                (staff_user.pk, selected_date, slot)
+                for slot in covered_slots(start_time, end_time)
+            ],
+        ):
+            return self.render_error(
                 request,
-                "meetings/select_timeslot.html",
-                {
-                    "staff_user": staff_user,
-                    "error": "Ce créneau est déjà réservé.",
-                    "available_timeslots": available_timeslots,
-                    "selected_date": date,
-                },
+                staff_user,
+                selected_date,
+                "Ce créneau est momentanément réservé par un autre client.",
             )
 
-        # Calculer l'end_time (1 heure après le start_time)
-        end_time = (
-            datetime.combine(datetime.today(), start_time) + timedelta(hours=1)
-        ).time()
-
-        # Créer le rendez-vous
-        Appointment.objects.create(
-            user=request.user,
-            staff_user=staff_user,
-            date=selected_date,
-            start_time=start_time,
-            end_time=end_time,  # Calculer la fin
-        )
+        # Réservation atomique : la contrainte d'unicité arbitre les requêtes concurrentes
+        try:
+            book_appointment(
+                request.user, staff_user, selected_date, start_time, end_time
+            )
+        except SlotTaken:
+            return self.render_error(
+                request, staff_user, selected_date, "Ce créneau est déjà réservé."
+            )
+        except ValidationError:
+            return self.render_error(
+                request,
+                staff_user,
+                selected_date,
+                "Ce créneau ne fait pas partie des disponibilités du conseiller.",
+                status=400,
+            )
+        finally:
+            release_hold(
+                request.user, staff_user.pk, selected_date, start_time, end_time
+            )
 
         return redirect(
             "user_meeting_list"
         )  # Redirection vers la liste des rendez-vous
 
+    def parse_slot(self, request):
+        """
+        Convertit le start_time (string) et la durée (minutes) du formulaire en
+        heures de début et de fin, ou (None, None) s'ils sont invalides.
+        """
+        try:
+            start_time = datetime.strptime(
+                request.POST.get("start_time", ""), "%H:%M"
+            ).time()
+            duration = int(request.POST.get("duration", 60))
+        except ValueError:
+            return None, None
+        if duration not in settings.MEETINGS_APPOINTMENT_DURATIONS:
+            return None, None
+        return start_time, end_time_for(start_time, duration)
+
+    def available_timeslots(self, staff_user, selected_date):
+        """
+        Créneaux libres de la date (index de créneaux), moins ceux en attente pour
+        d'autres clients.
+        """
+        return self.without_held(
+            staff_user, selected_date, free_slots(staff_user.pk, selected_date)
+        )
+
+    def without_held(self, staff_user, selected_date, slots):
+        """
+        Retire des créneaux `slots` ceux en attente pour d'autres clients.
+        """
+        held = held_by_others(
+            self.request.user, [(staff_user.pk, selected_date, slot) for slot in slots]
+        )
+        return [
+            slot for slot in slots if (staff_user.pk, selected_date, slot) not in held
+        ]
+
+    def render_error(self, request, staff_user, selected_date, error, status=409):
+        """
+        Réaffiche les créneaux libres avec un message d'erreur.
+        """
+        return render(
+            request,
+            "meetings/select_timeslot.html",
+            {
+                "staff_user": staff_user,
+                "error": error,
+                "available_timeslots": self.available_timeslots(
+                    staff_user, selected_date
+                ),
+                "durations": settings.MEETINGS_APPOINTMENT_DURATIONS,
+                "selected_date": selected_date.strftime("%Y-%m-%d"),
+            },
+            status=status,
+        )
+
+
+class HoldTimeslotView(SelectTimeslotView):
+    """
+    Vue pour mettre un créneau en attente avant la confirmation du rendez-vous.
+
+    Méthodes :
+    ----------
+    submit(request, staff_user_id, date):
+        Met le créneau choisi en attente et affiche la page de confirmation.
+    """
+
+    def submit(self, request, staff_user_id, date):
+        staff_user = get_object_or_404(StaffUser, user__id=staff_user_id)
+        selected_date = datetime.strptime(date, "%Y-%m-%d").date()
+        start_time, end_time = self.parse_slot(request)
+        if end_time is None:
+            return self.render_error(
+                request, staff_user, selected_date, "Créneau invalide.", status=400
+            )
+
+        # Tous les créneaux couverts par le rendez-vous doivent être libres
+        if booking_mask(start_time, end_time) & ~free_mask(
+            staff_user.pk, selected_date
+        ):
+            return self.render_error(
+                request, staff_user, selected_date, "Ce créneau n'est plus disponible."
+            )
+        expires_at = take_hold(
+            request.user, staff_user.pk, selected_date, start_time, end_time
+        )
+        if expires_at is None:
+            return self.render_error(
+                request,
+                staff_user,
+                selected_date,
+                "Ce créneau est momentanément réservé par un autre client.",
+            )
+
+        return render(
+            request,
+            "meetings/select_timeslot.html",
+            {
+                "staff_user": staff_user,
+                "held_time": start_time,
+                "held_end_time": end_time,
+                "duration": int(request.POST.get("duration", 60)),
+                "hold_expires": datetime.fromtimestamp(
+                    expires_at, tz=timezone.get_current_timezone()
+                ),
+                "selected_date": selected_date.strftime("%Y-%m-%d"),
+            },
+        )
+
 
-class UserListView(LoginRequiredMixin, TemplateView):
+class UserListView(AsyncUserMixin, LoginRequiredMixin, TemplateView):
     """
     Vue pour afficher la liste des rendez-vous de l'utilisateur connecté.
 
+    Les rendez-vous à venir et passés sont séparés par la base, qui les parcourt
+    dans l'ordre de l'index (`user`, `date`, `start_time`) : le coût ne dépend pas
+    de l'ancienneté du compte. Les rendez-vous passés sont paginés.
+
+    Vue asynchrone : les rendez-vous sont lus avec l'ORM asynchrone.
+
     Attributs :
     -----------
     template_name : str
         Chemin vers le template utilisé pour afficher la liste des rendez-vous.
+    past_per_page : int
+        Nombre de rendez-vous passés par page.
 
     Méthodes :
     ----------
-    get_context_data(**kwargs):
+    get(request, *args, **kwargs):
+        Affiche les rendez-vous de l'utilisateur.
+    aget_context_data(**kwargs):
         Prépare les données nécessaires pour afficher les rendez-vous de l'utilisateur.
     """
 
     template_name = "meetings/user_list.html"
+    past_per_page = 10
 
-    def get_context_data(self, **kwargs):
+    async def get(self, request, *args, **kwargs):
+        context = await self.aget_context_data(**kwargs)
+        return self.render_to_response(context)
+
+    async def aget_context_data(self, **kwargs):
         """
         Prépare le contexte pour afficher les rendez-vous de l'utilisateur.
 
@@ -294,17 +756,75 @@ class UserListView(LoginRequiredMixin, TemplateView):
         Retourne :
         ---------
         dict
-            Contexte contenant les rendez-vous de l'utilisateur.
+            Contexte contenant les rendez-vous à venir et une page des rendez-vous passés.
         """
         context = super().get_context_data(**kwargs)
 
-        # Récupérer tous les rendez-vous de l'utilisateur connecté
-        user_appointments = Appointment.objects.filter(user=self.request.user)
-
-        # Ajouter ces rendez-vous au contexte
-        context["user_appointments"] = user_appointments
+        # Rendez-vous de l'utilisateur connecté, avec leur conseiller (sans requête par ligne)
+        now = timezone.localtime()
+        appointments = Appointment.objects.filter(
+            user=self.request.user
+        ).select_related("staff_user__user")
+        upcoming = Q(date__gt=now.date()) | Q(date=now.date(), end_time__gt=now.time())
+
+        # Ajouter ces rendez-vous au contexte, lus avant le rendu du template
+        context["user_appointments"] = [
+            appointment
+            async for appointment in appointments.filter(upcoming).order_by(
+                "date", "start_time"
+            )
+        ]
+        past = appointments.exclude(upcoming).order_by("-date", "-start_time")
+        paginator = Paginator(past, self.past_per_page)
+        paginator.count = await past.acount()  # Remplace la propriété en cache
+        page = paginator.get_page(self.request.GET.get("page"))
+        page.object_list = [appointment async for appointment in page.object_list]
+        context["past_appointments"] = page
 
         # Ajouter un lien vers la liste des StaffUser pour prendre un rendez-vous
         context["staff_list_url"] = "staff_list"
+        context["feed_url"] = feed_url(self.request, "user", self.request.user.pk)
 
         return context
+
+
+class AppointmentFeedView(View):
+    """
+    Flux iCalendar des rendez-vous d'un conseiller ou d'un client.
+
+    Les clients d'agenda n'ont pas de session : l'accès est contrôlé par le jeton
+    signé contenu dans l'adresse (`meetings.ics.feed_token`). Les clients d'agenda
+    interrogeant le flux très souvent, la réponse porte un ETag fort et une date
+    Last-Modified calculés par une requête d'agrégats : un flux inchangé reçoit une
+    réponse 304. Sinon, le flux est produit en streaming depuis la base.
+
+    Méthodes :
+    ----------
+    get(request, token):
+        Répond 304 si le flux n'a pas changé, sinon le transmet.
+    """
+
+    def get(self, request, token):
+        feed = read_feed_token(token)
+        if feed is None:
+            raise Http404("Flux introuvable.")
+        kind, owner_id = feed
+
+        since = feed_since()
+        etag, last_modified = feed_validators(kind, owner_id, since)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+        if response is None:
+            response = StreamingHttpResponse(
+                feed_lines(kind, owner_id, since, request.get_host()),
+                content_type="text/calendar; charset=utf-8",
+            )
+            response.headers["Content-Disposition"] = 'inline; filename="agenda.ics"'
+        response.headers["ETag"] = etag
+        if last_modified:
+            response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
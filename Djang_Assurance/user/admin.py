@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import CustomUser, StaffUser
+from .models import CustomUser, StaffUser, ApiToken
 
 # Enregistrement des modèles dans l'interface d'administration
 admin.site.register(
     CustomUser
 )  # Permet de gérer les utilisateurs personnalisés via l'admin
 admin.site.register(StaffUser)  # Permet de gérer les membres du personnel via l'admin
+admin.site.register(ApiToken)  # Permet de gérer les jetons d'API des partenaires
@@ -1,3 +1,4 @@
+import secrets
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
@@ -18,12 +19,26 @@ class CustomUser(AbstractUser):
         Âge de l'utilisateur (optionnel).
     adresse : TextField
         Adresse physique de l'utilisateur (optionnelle).
+    updated_at : DateTimeField
+        Date de dernière modification, utilisée par l'ETag des flux d'agenda qui
+        affichent le nom de l'utilisateur (meetings/ics.py).
     """
 
     prenom = models.CharField(max_length=30, null=False)
     nom = models.CharField(max_length=30, null=False)
     age = models.PositiveIntegerField(null=True, blank=True)
     adresse = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Mémorise le statut `is_staff` lu en base, pour que `user.signals` ne crée le
+        profil StaffUser qu'au passage effectif au statut de membre du personnel.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_staff = instance.__dict__.get("is_staff")
+        return instance
 
 
 class StaffUser(models.Model):
@@ -61,3 +76,44 @@ class StaffUser(models.Model):
     class Meta:
         verbose_name = "Staff User"
         verbose_name_plural = "Staff Users"
+
+
+def generate_api_key():
+    """
+    Génère une clé d'API aléatoire de 40 caractères hexadécimaux.
+    """
+    return secrets.token_hex(20)
+
+
+class ApiToken(models.Model):
+    """
+    Jeton d'authentification des partenaires (courtiers) pour l'API JSON de devis.
+
+    Attributs :
+    -----------
+    key : CharField
+        Clé secrète transmise dans l'en-tête `Authorization: Token <key>`.
+    user : ForeignKey
+        Utilisateur propriétaire du jeton.
+    name : CharField
+        Nom du client partenaire, utilisé pour le suivi et les limites de débit.
+    is_active : BooleanField
+        Permet de révoquer un jeton sans le supprimer.
+    created_at : DateTimeField
+        Date de création du jeton.
+    """
+
+    key = models.CharField(max_length=40, unique=True, default=generate_api_key)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="api_tokens"
+    )
+    name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "API Token"
+        verbose_name_plural = "API Tokens"
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
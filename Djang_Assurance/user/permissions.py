@@ -1,5 +1,34 @@
+import inspect
+import time
+from django.conf import settings
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.core.cache import cache
+from django.http import JsonResponse
 from django.shortcuts import redirect
+from .models import ApiToken
+
+
+class AsyncUserMixin:
+    """
+    Mixin à placer en tête des vues asynchrones qui utilisent les mixins d'accès
+    synchrones (`LoginRequiredMixin`, `StaffRequiredMixin`, `UserRequiredMixin`).
+
+    L'utilisateur est chargé avec `request.auser()` avant les vérifications d'accès :
+    ni ces vérifications ni le rendu des templates (`request.user`) n'interrogent
+    ensuite la base depuis la boucle d'événements.
+
+    Méthodes :
+    ----------
+    dispatch(request, *args, **kwargs):
+        Charge l'utilisateur, applique les vérifications d'accès puis la méthode HTTP.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        response = super().dispatch(request, *args, **kwargs)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
 
 
 class StaffRequiredMixin(UserPassesTestMixin):
@@ -38,3 +67,79 @@ class UserRequiredMixin(UserPassesTestMixin):
 
     def handle_no_permission(self):
         return redirect("profil")
+
+
+class ApiTokenRequiredMixin:
+    """
+    Mixin pour authentifier les partenaires de l'API par jeton.
+
+    Le jeton est lu dans l'en-tête `Authorization: Token <key>`. En cas de succès,
+    le jeton est disponible dans `self.api_token`.
+
+    Méthodes :
+    ----------
+    dispatch(request, *args, **kwargs):
+        Renvoie une réponse JSON 401 si le jeton est absent, inconnu ou révoqué.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+        if keyword != "Token" or not key:
+            return JsonResponse(
+                {"error": "Jeton d'authentification manquant."}, status=401
+            )
+        try:
+            self.api_token = ApiToken.objects.select_related("user").get(
+                key=key.strip(), is_active=True
+            )
+        except ApiToken.DoesNotExist:
+            return JsonResponse(
+                {"error": "Jeton d'authentification invalide."}, status=401
+            )
+        return super().dispatch(request, *args, **kwargs)
+
+
+class RateLimitMixin:
+    """
+    Mixin limitant le nombre de requêtes par client sur une fenêtre de temps fixe.
+
+    Les compteurs sont stockés dans le cache local : la limite s'applique donc
+    par processus serveur.
+
+    Attributs :
+    -----------
+    rate_limit : tuple
+        (nombre de requêtes autorisées, durée de la fenêtre en secondes).
+        Par défaut : `settings.QUOTE_API_RATE_LIMIT`.
+
+    Méthodes :
+    ----------
+    get_rate_limit_key():
+        Identifiant du client utilisé pour le compteur.
+    """
+
+    rate_limit = None
+
+    def get_rate_limit_key(self):
+        return self.api_token.pk
+
+    def dispatch(self, request, *args, **kwargs):
+        limit, window = self.rate_limit or settings.QUOTE_API_RATE_LIMIT
+        current_window = int(time.time() // window)
+        key = f"ratelimit:{self.get_rate_limit_key()}:{current_window}"
+        # `add` n'écrit la clé que si elle n'existe pas encore : initialisation atomique
+        cache.add(key, 0, timeout=window)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # La clé a expiré entre `add` et `incr`
+            cache.set(key, 1, timeout=window)
+            count = 1
+        if count > limit:
+            response = JsonResponse(
+                {"error": "Limite de requêtes atteinte, veuillez réessayer plus tard."},
+                status=429,
+            )
+            response["Retry-After"] = str(window - int(time.time()) % window)
+            return response
+        return super().dispatch(request, *args, **kwargs)
@@ -5,7 +5,7 @@ from .models import CustomUser, StaffUser
 
 # Signal post-save pour créer automatiquement un StaffUser
 @receiver(post_save, sender=CustomUser)
-def create_staff_user(sender, instance, created, **kwargs):
+def create_staff_user(sender, instance, created, update_fields=None, **kwargs):
     """
     Signal pour créer automatiquement un StaffUser lorsqu'un CustomUser avec le statut 'is_staff' est sauvegardé.
 
@@ -17,19 +17,23 @@ def create_staff_user(sender, instance, created, **kwargs):
         L'instance de CustomUser qui a été sauvegardée.
     created : bool
         Indique si l'instance a été créée (True) ou mise à jour (False).
+    update_fields : frozenset ou None
+        Champs explicitement sauvegardés, le cas échéant.
     **kwargs : dict
         Arguments supplémentaires.
 
     Action :
     --------
-    Si l'utilisateur est un membre du staff (is_staff=True), un StaffUser correspondant est créé
-    automatiquement s'il n'existe pas déjà.
+    Si l'utilisateur devient membre du staff (création avec is_staff=True, ou passage
+    de is_staff de False à True), un StaffUser correspondant est créé s'il n'existe
+    pas déjà. Les autres sauvegardes (connexion, modification du profil) ne font
+    aucune requête.
     """
-    if instance.is_staff:
-        # Vérifie si un StaffUser correspondant existe déjà
-        StaffUser.objects.get_or_create(
-            user=instance,  # Utilise le champ OneToOneField pour la liaison
-            defaults={
-                # Les champs supplémentaires peuvent être initialisés ici
-            },
-        )
+    if update_fields is not None and "is_staff" not in update_fields:
+        return
+    # Statut précédent inconnu (instance construite sans lecture en base) : None,
+    # et `get_or_create` vérifie alors en base
+    was_staff = not created and getattr(instance, "_loaded_is_staff", None)
+    instance._loaded_is_staff = instance.is_staff
+    if instance.is_staff and not was_staff:
+        StaffUser.objects.get_or_create(user=instance)